@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'courses.instrumentation.InstrumentationMiddleware',
+    'courses.routing.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,7 +66,8 @@ ROOT_URLCONF = 'course_registration.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates مع قياس زمن الرسم لكل طلب (courses.instrumentation)
+        'BACKEND': 'courses.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,17 +87,92 @@ WSGI_APPLICATION = 'course_registration.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# مهلة الاستعلام (ميلي ثانية) لكل فئة صفحات: default لكل الطلبات (تُضبط عند فتح الاتصال)،
+# والصفحات الثقيلة تأخذ فئتها بـ courses.database.statement_timeout. 0 = بلا حد.
+STATEMENT_TIMEOUTS = {
+    'default': int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000')),
+    'reporting': int(os.environ.get('DB_REPORTING_TIMEOUT_MS', '60000')),
+    'bulk': int(os.environ.get('DB_BULK_TIMEOUT_MS', '0')),
+}
+
+# الاتصال من متغيرات البيئة. CONN_MAX_AGE يبقي اتصال كل عملية مفتوحًا بين الطلبات بدل
+# فتح اتصال جديد لكل طلب، و CONN_HEALTH_CHECKS يتأكد منه قبل إعادة استخدامه.
+# DB_POOL=1 يستخدم pool الخاص بـ psycopg 3، وهو مدعوم من Django 5.1 فقط؛ في الإصدارات
+# الأقدم يُتجاهل (تحذير courses.W001) ويبقى CONN_MAX_AGE، أو استخدم PgBouncer أمام Postgres.
+# DB_ENGINE=django.db.backends.sqlite3 مع DB_NAME=<ملف> للتطوير والاختبارات بدون Postgres.
+DB_POOL = os.environ.get('DB_POOL', '') == '1'
+DB_POOL_SUPPORTED = django.VERSION >= (5, 1)
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.postgresql')
+DB_IS_POSTGRES = DB_ENGINE == 'django.db.backends.postgresql'
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'courseruniversty',
-        'USER': 'abdalla',
-        'PASSWORD': 'mysecretpassword',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'courseruniversty'),
+        'USER': os.environ.get('DB_USER', 'abdalla'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'mysecretpassword'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+            'options': f"-c statement_timeout={STATEMENT_TIMEOUTS['default']}",
+        } if DB_IS_POSTGRES else {},
     }
 }
+if DB_POOL and DB_POOL_SUPPORTED and DB_IS_POSTGRES:
+    # مع الـ pool يُعاد الاتصال إليه بعد كل طلب، فلا معنى لـ CONN_MAX_AGE
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }
+
+# نسخة قراءة (replica) اختيارية لصفحات العرض والتقارير (courses.routing). تُعرّف بـ
+# DB_REPLICA_HOST، وباقي القيم من default ما لم تُحدد. بعد أي طلب يكتب تقرأ صفحات نفس
+# المتصفح من default لمدة REPLICA_STICKY_SECONDS حتى يصل التعديل للنسخة.
+REPLICA_DATABASE = 'replica'
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '5'))
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['courses.routing.ReplicaRouter']
+
+# trigram_similar في بحث المواد. التطبيق يحتاج psycopg، فيُضاف مع Postgres فقط حتى يعمل
+# المشروع والاختبارات على SQLite
+if DB_IS_POSTGRES:
+    INSTALLED_APPS.append('django.contrib.postgres')
 # 'NAME': 'courserUniversty',
+
+# الكاش: locmem (افتراضي، لكل عملية) أو file أو redis (أي خادم متوافق مع Redis)
+# CACHE_LOCATION: مجلد الملفات أو رابط الخادم مثل redis://127.0.0.1:6379/1
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'course-registration'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('CACHE_LOCATION', _cache_location),
+    }
+}
+
+# مدة بقاء الأقسام والمواد والأسبقيات في الكاش؛ التعديل يبطلها فورًا عبر الإشارات
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# مدة بقاء الصفحات وأجزاء القوالب المخزنة؛ تعديل نماذجها يبطلها فورًا
+PAGE_CACHE_TIMEOUT = 60 * 60
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -135,3 +216,66 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Redirect unauthenticated users to this login path when using @login_required
 LOGIN_URL = '/login/'
+
+# خط TTF يدعم العربية لكشوف الدرجات PDF (مثل Amiri أو DejaVuSans)، وبدونه يُستخدم Helvetica
+TRANSCRIPT_FONT = os.environ.get('TRANSCRIPT_FONT', '')
+
+# مدة بقاء معدلات الطالب في الكاش (ثانية)؛ أي تعديل على درجاته يحذفها قبل ذلك
+GPA_CACHE_TIMEOUT = 300
+
+# سجلات منظمة (سطر JSON لكل طلب) في logs/requests.log؛ المجلد يُنشأ عند أول سطر
+LOGS_DIR = BASE_DIR / 'logs'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '{"time": "%(asctime)s", "level": "%(levelname)s", "request": %(message)s}'},
+    },
+    'handlers': {
+        'requests_file': {
+            'class': 'courses.log_handlers.RotatingFileHandler',
+            'filename': str(LOGS_DIR / 'requests.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'json_line',
+        },
+    },
+    'loggers': {
+        'courses.instrumentation': {
+            'handlers': ['requests_file'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# أقصى عدد استعلامات لكل صفحة (اسم الرابط)، بالكاش فارغًا ومع استعلامي الجلسة والمستخدم.
+# التجاوز يُسجل تحذيرًا، ومع QUERY_BUDGETS_ENFORCE=1 (الاختبارات و CI) يفشل الطلب.
+QUERY_BUDGETS = {
+    'materials_page': 6,
+    'material_autocomplete': 4,
+    'material_detail': 6,
+    'students_page': 6,
+    'student_detail': 10,
+    'student_timetable': 6,
+    'section_timetable_conflicts': 8,
+    'reports_page': 10,
+    'grades_entry': 10,
+    'materials_download_page': 6,
+    'student_material_download': 6,
+    'edit_student_downloads': 6,
+    'manage_material_prerequisites': 5,
+    'timetable_page': 8,
+    'validate_timetable': 4,
+}
+QUERY_BUDGETS_ENFORCE = os.environ.get('QUERY_BUDGETS_ENFORCE', '') == '1'
+
+# مقاييس Prometheus على /metrics. مع عدة عمليات (gunicorn) يجب ضبط METRICS_DIR لمجلد
+# مشترك يُفرّغ عند كل تشغيل للخدمة، وإلا يرى كل طلب قيم العملية التي أجابته فقط.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1'))  # ثوانٍ بين كتابات ملف العملية
+# الوصول بـ METRICS_TOKEN (Authorization: Bearer) أو لمستخدم إداري. METRICS_ALLOWED_IPS فارغة افتراضيًا:
+# خلف proxy يصبح كل طلب من 127.0.0.1، لذلك لا يُقبل العنوان إذا وصل الطلب بـ X-Forwarded-For
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
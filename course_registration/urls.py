@@ -30,16 +30,22 @@ urlpatterns = [
     path('students/', views.students_page, name='students_page'),
     path('students/<int:student_id>/',
          views.student_detail, name='student_detail'),
+    path('students/<int:student_id>/timetable/',
+         views.student_timetable_page, name='student_timetable'),
     path('sections/', views.sections_page, name='sections_page'),
     path('reports/', views.reports_page, name='reports_page'),
     path('students/add/', views.add_student, name='add_student'),
     path('sections/add/', views.add_section, name='add_section'),
     path('materials/add/', views.add_material_page, name='add_material_page'),
+    path('materials/autocomplete/', views.material_autocomplete, name='material_autocomplete'),
     path('sections/<int:id>/edit/', views.edit_section, name='edit_section'),
+    path('sections/<int:id>/timetable_conflicts/',
+         views.section_timetable_conflicts, name='section_timetable_conflicts'),
     path('materials/<int:material_id>/',
          views.material_detail, name='material_detail'),
     path('grades_entry/', views.grades_entry, name='grades_entry'),
     path('add_grade_entry/', views.add_grade_entry, name='add_grade_entry'),
+    path('grades_entry/import/', views.import_grades, name='import_grades'),
     path('procedures/', views.procedures_page, name='procedures_page'),
     path('materials_download/', views.materials_download_page,
          name='materials_download_page'),
@@ -51,6 +57,14 @@ urlpatterns = [
          views.manage_material_prerequisites, name='manage_material_prerequisites'),
     path('procedures/timetable/', views.timetable_page, name='timetable_page'),
     path('procedures/timetable/save/', views.save_lecture, name='save_lecture'),
+    path('procedures/timetable/validate/', views.validate_timetable, name='validate_timetable'),
+    path('procedures/timetable/generate/', views.generate_timetable, name='generate_timetable'),
+    path('registration/reserve/', views.reserve_seat, name='reserve_seat'),
+    path('exports/<str:kind>/', views.export_records, name='export_records'),
+    path('procedures/cache/reference/', views.reference_cache_stats, name='reference_cache_stats'),
+    path('procedures/cache/pages/', views.page_cache_stats, name='page_cache_stats'),
+    path('procedures/diagnostics/', views.diagnostics_page, name='diagnostics_page'),
+    path('metrics', views.metrics_view, name='metrics'),
 
 ]
 
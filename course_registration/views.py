@@ -1,16 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from courses.models import Lecture, Student, Section, Material, Enrollment , GradeRecord , MaterialPrerequisite    
+from courses.models import Lecture, Student, Section, Material, Enrollment , GradeRecord , MaterialPrerequisite , SemesterGPA, \
+    LectureGroup, SectionTermReport, MaterialTermReport, GPADistributionReport
+from courses import clashes, database, exports, gpa, grading, instrumentation, metrics, page_cache, reference, registration, reports, routing, scheduling, student_timetable, timetable, transcripts
+from courses.enrollment import enroll_materials
+from courses.grade_import import GradeImportError, import_grades as import_grades_file
+from courses.pagination import estimated_count, keyset_page
+from courses.search import filter_materials, search_materials
+from django.conf import settings
 from django.contrib import messages
-from django.db import IntegrityError
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
 from datetime import date
 from datetime import datetime
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.core.paginator import Paginator
 import json
 
 
+GRADES_ENTRY_PAGE_SIZE = 50
+STUDENTS_PAGE_SIZE = 50
+MATERIALS_PAGE_SIZE = 50
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+REPORTS_TOP_N = 15
+MATERIALS_DOWNLOAD_PAGE_SIZE = 50
+STUDENTS_ORDERING = ('-created_at', 'id_student')
+
+
 
 # --- صفحة رئيسية
 def root_redirect(request):
@@ -49,33 +69,70 @@ def admin_dashbord(request):
 
 # --- صفحة المواد
 @login_required
+@routing.read_from_replica
+@page_cache.cache_view(Material)
 def materials_page(request):
     if not request.user.is_staff:
         return redirect('login')
 
-    materials = Material.objects.all()
+    materials = Material.objects.order_by('code')
 
     code = request.GET.get('code', '').strip()
     name = request.GET.get('name', '').strip()
     hours = request.GET.get('hours', '').strip()
 
+    # الرمز ببدايته (فهرس materials_code_upper_prefix_idx)، والاسم في النص الموحّد (بدون
+    # تشكيل وبأشكال موحدة للحروف) الذي يخدمه فهرس trigram، بدل icontains بلا فهرس
     if code:
-        materials = materials.filter(code__icontains=code)
+        materials = materials.filter(code__istartswith=code)
     if name:
-        materials = materials.filter(name__icontains=name)
+        materials = filter_materials(materials, name)
     if hours:
-        materials = materials.filter(hours=hours)
+        try:
+            materials = materials.filter(hours=int(hours))
+        except ValueError:
+            materials = materials.none()
+
+    page_obj = Paginator(materials, MATERIALS_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+
+    return render(request, 'materials.html', {
+        'materials': page_obj,
+        'page_obj': page_obj,
+        'querystring': query_params.urlencode(),
+        **page_cache.fragment_context(Material),
+    })
+
+
+# --- بحث المواد (JSON) للإكمال التلقائي
+@login_required
+def material_autocomplete(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+
+    query = request.GET.get('q', request.GET.get('term', '')).strip()
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
 
-    return render(request, 'materials.html', {'materials': materials})
+    results = [
+        {'id': m.id, 'code': m.code, 'name': m.name, 'hours': m.hours, 'rank': m.rank}
+        for m in search_materials(query, limit=max(limit, 1))
+    ]
+    return JsonResponse({'results': results})
 
 
 # --- صفحة الطلاب
 @login_required
+@routing.read_from_replica
 def students_page(request):
     if not request.user.is_staff:
         return redirect('login')
 
-    students = Student.objects.all()
+    students = Student.objects.select_related('section')
 
     # قراءة الفلاتر
     id_student = request.GET.get('id_student', '').strip()
@@ -96,11 +153,27 @@ def students_page(request):
         except ValueError:
             pass  # إذا القيمة غير صالحة نتجاهلها
 
-    sections = Section.objects.all()  # لملء dropdown
-    return render(request, 'students.html', {'students': students, 'sections': sections})
+    # ترقيم بالمؤشر: تكلفة الصفحة ثابتة مهما كان عدد الطلاب
+    page = keyset_page(
+        students, STUDENTS_ORDERING, STUDENTS_PAGE_SIZE,
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
+
+    query_params = request.GET.copy()
+    query_params.pop('after', None)
+    query_params.pop('before', None)
+
+    sections = reference.sections()  # لملء dropdown (من كاش البيانات المرجعية)
+    return render(request, 'students.html', {
+        'students': page,
+        'sections': sections,
+        'total_count': estimated_count(students),
+        'querystring': query_params.urlencode(),
+    })
 
 
 # --- صفحة الأقسام
+@page_cache.cache_view(Section)
 def sections_page(request):
     if not request.user.is_staff:
         return redirect('login')
@@ -125,14 +198,60 @@ def sections_page(request):
     if description:
         sections = sections.filter(description__icontains=description)
 
-    return render(request, 'sections.html', {'sections': sections})
+    return render(request, 'sections.html', {'sections': sections, **page_cache.fragment_context(Section)})
 
 # --- صفحة التقارير
 @login_required
+@routing.read_from_replica
+@database.statement_timeout('reporting', methods=('POST',))
 def reports_page(request):
     if not request.user.is_staff:
         return redirect('login')
-    return render(request, 'reports.html')
+
+    if request.method == 'POST' and request.POST.get('refresh'):
+        refresh = reports.refresh_reports()
+        messages.success(request, f"تم تحديث التقارير ({refresh.rows} صف في {refresh.duration:.1f} ثانية)")
+        return redirect('reports_page')
+
+    # كل ما في هذه الصفحة يُقرأ من جداول report_* المحسوبة مسبقًا فقط
+    terms = reports.available_terms()
+    term = request.GET.get('term', '')
+    year, _, semester = term.partition('|')
+    if (year, semester) not in terms:
+        year, semester = terms[0] if terms else ('', '')
+    section_id = request.GET.get('section', '')
+    section_id = int(section_id) if section_id.isdigit() else None
+
+    section_rows = SectionTermReport.objects.filter(year=year, semester=semester).order_by('section_name')
+    material_rows = MaterialTermReport.objects.filter(year=year, semester=semester)
+    distribution = GPADistributionReport.objects.filter(year=year, semester=semester)
+    if section_id:
+        material_rows = material_rows.filter(section_id=section_id)
+        distribution = distribution.filter(section_id=section_id)
+
+    most_demanded = material_rows.order_by('-enrolled_count', 'material_name')[:REPORTS_TOP_N]
+    graded = [row for row in material_rows.filter(graded_count__gt=0)]
+    graded.sort(key=lambda row: (row.pass_rate, row.material_name))
+    buckets = dict(distribution.values('bucket').annotate(n=Sum('students_count')).values_list('bucket', 'n'))
+    gpa_distribution = [
+        {'bucket': b, 'label': f"{b}-{b + reports.GPA_BUCKET}", 'count': buckets.get(b, 0)}
+        for b in range(0, 100, reports.GPA_BUCKET)
+    ]
+    peak = max([row['count'] for row in gpa_distribution] + [1])
+    for row in gpa_distribution:
+        row['width'] = round(100 * row['count'] / peak)
+
+    context = {
+        'terms': [{'value': f"{y}|{sm}", 'label': f"{sm} ({y})"} for y, sm in terms],
+        'term': f"{year}|{semester}",
+        'section_rows': section_rows,
+        'section_id': section_id,
+        'most_demanded': most_demanded,
+        'lowest_pass': graded[:REPORTS_TOP_N],
+        'gpa_distribution': gpa_distribution,
+        'last_refresh': reports.last_refresh(),
+    }
+    return render(request, 'reports.html', context)
 
 
 # --- صفحة تفاصيل الطالب
@@ -142,7 +261,7 @@ def student_detail(request, student_id):
         return redirect('login')
 
     student = get_object_or_404(Student, id_student=student_id)
-    sections = Section.objects.all()
+    sections = reference.sections()
 
     # حفظ تعديل البيانات الشخصية أو الدرجات
     if request.method == 'POST':
@@ -152,55 +271,91 @@ def student_detail(request, student_id):
         student.email = request.POST.get('email', student.email)
         student.save()
 
+        grades = {}
         for key, value in request.POST.items():
-            if key.startswith('grade_'):
-                enrollment_id = key.split('_')[1]
-                try:
-                    enrollment = Enrollment.objects.get(id=enrollment_id)
-                    enrollment.grade = float(value) if value else None
-                    enrollment.save()
-                except Enrollment.DoesNotExist:
-                    pass
+            if key.startswith('grade_') and key[len('grade_'):].isdigit():
+                grades[int(key[len('grade_'):])] = value
+        try:
+            # الدرجات تُكتب في GradeRecord (مع نسخة في Enrollment.grade) والمعدلات تُحدّث مرة لكل سمستر
+            grading.submit_grades(student, grades, clear_blank=True)
+        except grading.GradeValidationError as exc:
+            for msg in exc.errors.values():
+                messages.error(request, msg)
+        else:
+            messages.success(request, "تم حفظ البيانات والدرجات ✅")
         return redirect('student_detail', student_id=student.id_student)
 
-    # جلب جميع التنزيلات للطالب
+    # جلب جميع التنزيلات للطالب، والدرجة من سجلات الدرجات (المصدر الوحيد) باستعلام واحد
     enrollments = Enrollment.objects.filter(student=student).select_related('material').order_by('year', 'semester')
+    recorded = {
+        (material_id, semester, year): grade
+        for material_id, semester, year, grade in GradeRecord.objects.filter(student=student)
+        .values_list('material_id', 'semester', 'year', 'grade')
+    }
+
+    # المعدلات من خدمة المعدلات (مخزنة مسبقًا ومحفوظة في الكاش)
+    student_gpa = gpa.get_student_gpa(student.id_student)
 
     # تنظيم المواد حسب السمستر
     semesters = {}
     for e in enrollments:
-        sem_name = f"{e.semester} ({e.year})"
-        if sem_name not in semesters:
-            semesters[sem_name] = []
-        semesters[sem_name].append(e)
-
-    # حساب المعدل لكل سمستر والمعدل التراكمي
-    semester_gpa = {}
-    total_points = 0
-    total_hours = 0
-    for sem, courses in semesters.items():
-        sem_points = sum([c.grade * c.material.hours for c in courses if c.grade is not None])
-        sem_hours = sum([c.material.hours for c in courses if c.grade is not None])
-        semester_gpa[sem] = round(sem_points / sem_hours, 2) if sem_hours > 0 else 0
-        total_points += sem_points
-        total_hours += sem_hours
-
-    cumulative_gpa = round(total_points / total_hours, 2) if total_hours > 0 else 0
+        # درجة قديمة بلا سجل (قبل ترحيل 0017) تظهر من Enrollment.grade حتى لا تُمسح عند الحفظ
+        e.recorded_grade = recorded.get((e.material_id, e.semester, e.year), e.grade)
+        term = semesters.get((e.semester, e.year))
+        if term is None:
+            term = semesters[(e.semester, e.year)] = {
+                'name': f"{e.semester} ({e.year})",
+                'gpa': student_gpa.semester(e.semester, e.year),
+                'courses': [],
+            }
+        term['courses'].append(e)
 
     context = {
         'student': student,
         'sections': sections,
-        'semesters': semesters,
-        'semester_gpa': semester_gpa,
-        'cumulative_gpa': cumulative_gpa
+        'semesters': list(semesters.values()),
+        'cumulative_gpa': student_gpa.cumulative,
     }
 
     return render(request, 'student_detail.html', context)
 
 
+@login_required
+def student_timetable_page(request, student_id):
+    """الجدول الأسبوعي للطالب حسب تنزيلاته في السمستر، مع تعارضات المواد"""
+    if not request.user.is_staff:
+        return redirect('login')
+
+    student = get_object_or_404(Student, id_student=student_id)
+    semester = request.GET.get('semester') or None
+    year = request.GET.get('year') or None
+    schedule = student_timetable.student_timetable(student, semester, year)
+    context = {
+        'student': student,
+        'schedule': schedule,
+        'grid': schedule.grid,
+        'day_labels': [timetable.DAY_LABELS[d] for d in timetable.DAYS],
+        'readonly': True,
+    }
+    return render(request, 'student_timetable.html', context)
+
+
+@login_required
+def section_timetable_conflicts(request, id):
+    """تقرير تعارضات الجدول لكل طلاب القسم (JSON)"""
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "error": "غير مصرح"}, status=403)
+
+    section = get_object_or_404(Section, id=id)
+    report = student_timetable.section_conflict_report(
+        section.id, request.GET.get('semester') or None, request.GET.get('year') or None,
+    )
+    return JsonResponse({"success": True, "section": section.name, **report})
+
+
 @login_required
 def add_student(request):
-    sections = Section.objects.all()
+    sections = reference.sections()
     if request.method == 'POST':
         id_student = request.POST.get('id_student')
         name = request.POST.get('name')
@@ -240,7 +395,7 @@ def add_material_page(request):
     if not request.user.is_staff:
         return redirect('login')
 
-    sections = Section.objects.all()
+    sections = reference.sections()
     field_errors = {}  # لتخزين الأخطاء الخاصة بكل حقل
 
     if request.method == 'POST':
@@ -323,7 +478,7 @@ def edit_section(request, id):
 
 def material_detail(request, material_id):
     material = get_object_or_404(Material, id=material_id)
-    sections = Section.objects.all()
+    sections = reference.sections()
     field_errors = {}
     form_data = {}
 
@@ -362,24 +517,77 @@ def material_detail(request, material_id):
 
 
 @login_required
+@routing.read_from_replica
 def grades_entry(request):
-    # نجيب كل الطلاب اللي لهم سجلات رصد درجات
-    students_with_grades = Student.objects.filter(grade_records__isnull=False).distinct()
+    # الطلاب اللي لهم سجلات رصد درجات (بدون join يكرر الطالب لكل درجة)
+    students = Student.objects.filter(
+        id_student__in=GradeRecord.objects.values('student_id')
+    ).select_related('section').order_by('id_student')
+
+    # قراءة الفلاتر
+    student_id = request.GET.get('student_id', '').strip()
+    student_name = request.GET.get('student_name', '').strip()
+    section = request.GET.get('section', '').strip()
+    semester = request.GET.get('semester', '').strip()
+
+    if student_id:
+        try:
+            students = students.filter(id_student=int(student_id))
+        except ValueError:
+            students = students.none()
+    if student_name:
+        students = students.filter(name__icontains=student_name)
+    if section:
+        try:
+            students = students.filter(section_id=int(section))
+        except ValueError:
+            pass
+    if semester:
+        students = students.filter(
+            id_student__in=GradeRecord.objects.filter(semester=semester).values('student_id')
+        )
 
-    grade_data = []
+    paginator = Paginator(students, GRADES_ENTRY_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    for student in students_with_grades:
-        # نجيب السمسترات اللي رصد فيها الطالب درجاته
-        semesters = GradeRecord.objects.filter(student=student)\
-            .values_list('semester', flat=True).distinct()
+    # استعلام واحد يجيب سمسترات كل طلاب الصفحة بدل استعلام لكل طالب
+    semesters_by_student = {}
+    student_semesters = GradeRecord.objects.filter(student_id__in=[s.id_student for s in page_obj])\
+        .values_list('student_id', 'semester').distinct().order_by('student_id', 'semester')
+    for sid, sem in student_semesters:
+        semesters_by_student.setdefault(sid, []).append(sem)
 
-        grade_data.append({
+    # معدلات كل طلاب الصفحة من خدمة المعدلات دفعة واحدة
+    gpas = gpa.gpas_for_students([s.id_student for s in page_obj])
+
+    grade_data = [
+        {
             'student': student,
-            'semesters': semesters,
-        })
+            'semesters': semesters_by_student.get(student.id_student, []),
+            'cumulative_gpa': gpas[student.id_student].cumulative,
+        }
+        for student in page_obj
+    ]
+
+    # قائمة السمسترات للفلتر من جدول الملخص (أصغر بكثير من سجلات الدرجات)
+    semester_choices = SemesterGPA.objects.exclude(semester__isnull=True)\
+        .values_list('semester', flat=True).distinct().order_by('semester')
+
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
 
     context = {
-        'grade_data': grade_data
+        'grade_data': grade_data,
+        'page_obj': page_obj,
+        'sections': reference.sections(),
+        'semester_choices': semester_choices,
+        'filters': {
+            'student_id': student_id,
+            'student_name': student_name,
+            'section': section,
+            'semester': semester,
+        },
+        'querystring': query_params.urlencode(),
     }
     return render(request, 'grades_entry.html', context)
 
@@ -394,25 +602,24 @@ def add_grade_entry(request):
             # نجيب الطالب حسب رقم القيد
             student = Student.objects.get(id_student=student_id)
             # نجيب المواد اللي مسجلها الطالب
-            materials = Enrollment.objects.filter(student=student)
+            materials = Enrollment.objects.filter(student=student).select_related('material')
 
             # لما المستخدم يحفظ الدرجات
             if 'save_grades' in request.POST:
-                for enrollment in materials:
-                    grade_value = request.POST.get(f'grade_{enrollment.id}')
-                    if grade_value:
-                        grade_value = float(grade_value)
-
-                        GradeRecord.objects.update_or_create(
-                            student=student,
-                            material=enrollment.material,
-                            semester=enrollment.semester,
-                            year=enrollment.year,
-                            defaults={'grade': grade_value}
-                        )
-
-                messages.success(request, "تم حفظ الدرجات وحساب المعدلات بنجاح ✅")
-                return redirect('add_grade_entry')
+                grades = {}
+                for key, value in request.POST.items():
+                    if key.startswith('grade_') and key[len('grade_'):].isdigit():
+                        grades[int(key[len('grade_'):])] = value
+
+                try:
+                    # كل الدرجات تُحفظ دفعة واحدة والمعدلات تُحسب مرة لكل سمستر
+                    grading.submit_grades(student, grades)
+                except grading.GradeValidationError as exc:
+                    for msg in exc.errors.values():
+                        messages.error(request, msg)
+                else:
+                    messages.success(request, "تم حفظ الدرجات وحساب المعدلات بنجاح ✅")
+                    return redirect('add_grade_entry')
 
         except Student.DoesNotExist:
             messages.error(request, "رقم القيد غير موجود ❌")
@@ -426,35 +633,84 @@ def add_grade_entry(request):
     return render(request, 'add_grade_entry.html', context)
 
 
+@login_required
+@database.statement_timeout('bulk', methods=('POST',))
+def import_grades(request):
+    if not request.user.is_staff:
+        return redirect('login')
+
+    report = None
+    error = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            error = "يرجى اختيار ملف"
+        else:
+            try:
+                report = import_grades_file(upload, upload.name)
+            except GradeImportError as exc:
+                error = str(exc)
+
+    return render(request, 'import_grades.html', {'report': report, 'error': error})
+
+
 def procedures_page(request):
     return render(request, 'Procedures.html')
 
 
 
 @login_required
+@routing.read_from_replica
 def materials_download_page(request):
     if not request.user.is_staff:
         return redirect('login')
 
-    # جلب كل التنزيلات
-    # نرتبها حسب الطالب والسمستر والسنة
-    enrollments = Enrollment.objects.select_related('student', 'material').order_by('student__id_student', 'year', 'semester')
+    # التجميع في قاعدة البيانات: صف واحد لكل (طالب، سمستر، سنة) مع عدد المواد
+    downloads = Enrollment.objects.values(
+        'student_id', 'student__name', 'student__section__name', 'semester', 'year',
+    ).annotate(materials_count=Count('id')).order_by('-year', '-semester', 'student_id')
 
-    # تنظيم البيانات: لكل طالب نعرض السمستر والسنة وعدد المواد
-    downloads = {}
-    for e in enrollments:
-        key = (e.student.id_student, e.semester, e.year)
-        if key not in downloads:
-            downloads[key] = {
-                'student': e.student,
-                'semester': e.semester,
-                'year': e.year,
-                'materials_count': 0
-            }
-        downloads[key]['materials_count'] += 1
+    filters = {
+        key: request.GET.get(key, '').strip()
+        for key in ('student_id', 'student_name', 'section', 'semester', 'year')
+    }
+    if filters['student_id']:
+        if filters['student_id'].isdigit():
+            downloads = downloads.filter(student_id=int(filters['student_id']))
+        else:
+            downloads = downloads.none()
+    if filters['student_name']:
+        downloads = downloads.filter(student__name__icontains=filters['student_name'])
+    if filters['section'].isdigit():
+        downloads = downloads.filter(student__section_id=int(filters['section']))
+    if filters['semester']:
+        downloads = downloads.filter(semester=filters['semester'])
+    if filters['year']:
+        downloads = downloads.filter(year=filters['year'])
+
+    if request.GET.get('export') == 'csv':
+        rows = (
+            (d['student_id'], d['student__name'], d['student__section__name'] or '', d['semester'] or '',
+             d['year'] or '', d['materials_count'])
+            for d in downloads.iterator(chunk_size=exports.CHUNK_SIZE)
+        )
+        return exports.csv_response(
+            'materials_downloads.csv', ['رقم القيد', 'الاسم', 'القسم', 'السمستر', 'السنة', 'عدد المواد'], rows,
+        )
+
+    paginator = Paginator(downloads, MATERIALS_DOWNLOAD_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+    query_params.pop('export', None)
 
     context = {
-        'downloads': downloads.values()
+        'downloads': page_obj,
+        'page_obj': page_obj,
+        'sections': reference.sections(),
+        'filters': filters,
+        'querystring': query_params.urlencode(),
     }
 
     return render(request, 'materials_download.html', context)
@@ -462,10 +718,47 @@ def materials_download_page(request):
 
 
 
+@login_required
+@database.statement_timeout('reporting')
+def export_records(request, kind):
+    """
+    كشوف الدرجات أو قوائم التنزيل لقسم و/أو سنة كملف CSV أو XLSX يُرسل أثناء قراءته
+    من قاعدة البيانات، فلا يتجاوز الطلب المهلة ولا يكبر استهلاك الذاكرة.
+    """
+    if not request.user.is_staff:
+        return redirect('login')
+    if kind not in transcripts.EXPORTS:
+        raise Http404
+
+    section = request.GET.get('section', '').strip()
+    section_id = int(section) if section.isdigit() else None
+    year = request.GET.get('year', '').strip() or None
+    fmt = 'xlsx' if request.GET.get('format') == 'xlsx' else 'csv'
+
+    header, rows = transcripts.EXPORTS[kind]
+    basename = '_'.join(str(part) for part in (kind, section_id, year) if part)
+    return exports.file_response(fmt, basename, header, rows(section_id, year))
+
+
+def _report_enrollment_result(request, result):
+    if result.enrolled:
+        messages.success(request, f"تم تنزيل {len(result.enrolled)} مادة ✅")
+    if not result.blocked:
+        return
+    ids = set(result.blocked) | {p for missing in result.blocked.values() for p in missing}
+    names = dict(Material.objects.filter(id__in=ids).values_list('id', 'name'))
+    for material_id, missing in result.blocked.items():
+        messages.error(
+            request,
+            f"لا يمكن تنزيل {names.get(material_id, material_id)}: "
+            f"يجب اجتياز {'، '.join(names.get(p, str(p)) for p in missing)} أولًا",
+        )
+
+
 @login_required
 def student_material_download(request):
     student = None
-    materials = Material.objects.all()
+    materials = reference.materials()
 
     # البحث عن الطالب
     student_id = request.GET.get('student_id')
@@ -477,29 +770,9 @@ def student_material_download(request):
         student = get_object_or_404(Student, id_student=student_id)
         selected_materials = request.POST.getlist('materials')
 
-        today = datetime.today().date()  # التاريخ الكامل
-        current_year = today.year
-        current_month = today.month
-
-        for material_id in selected_materials:
-            material = Material.objects.get(id=material_id)
-
-            # تحقق إذا الطالب لم ينزل المادة في نفس الشهر
-            exists = Enrollment.objects.filter(
-                student=student,
-                material=material,
-                date_registered__year=current_year,
-                date_registered__month=current_month
-            ).exists()
-
-            if not exists:
-                Enrollment.objects.create(
-                    student=student,
-                    material=material,
-                    semester=f"{current_month}/{current_year}",  # يمكنك تعديل الصياغة حسب رغبتك
-                    year=current_year,
-                    date_registered=today
-                )
+        # كل التنزيل في خدمة واحدة: عدد ثابت من الاستعلامات مهما كان عدد المواد
+        result = enroll_materials(student, selected_materials)
+        _report_enrollment_result(request, result)
 
     return render(request, 'student_material_download.html', {
         'student': student,
@@ -512,14 +785,14 @@ def student_material_download(request):
 
 def edit_student_downloads(request):
     student = None
-    materials = Material.objects.all()
+    materials = reference.materials()
     enrollments = []
 
     # جلب الطالب
     student_id = request.GET.get('student_id')
     if student_id:
         student = get_object_or_404(Student, id_student=student_id)
-        enrollments = Enrollment.objects.filter(student=student)
+        enrollments = Enrollment.objects.filter(student=student).select_related('material')
 
     # تنزيل مواد جديدة
     if request.method == 'POST' and 'download_materials' in request.POST:
@@ -527,36 +800,16 @@ def edit_student_downloads(request):
         student = get_object_or_404(Student, id_student=student_id)
         selected_materials = request.POST.getlist('materials')
 
-        today = datetime.today().date()
-        current_year = today.year
-        current_month = today.month
-
-        for material_id in selected_materials:
-            material = Material.objects.get(id=material_id)
-
-            # منع تنزيل نفس المادة أكثر من مرة في نفس الشهر
-            exists = Enrollment.objects.filter(
-                student=student,
-                material=material,
-                date_registered__year=current_year,
-                date_registered__month=current_month
-            ).exists()
-
-            if not exists:
-                Enrollment.objects.create(
-                    student=student,
-                    material=material,
-                    semester=f"{current_month}/{current_year}",
-                    year=current_year,
-                    date_registered=today
-                )
+        result = enroll_materials(student, selected_materials)
+        _report_enrollment_result(request, result)
         return redirect(f"{request.path}?student_id={student.id_student}")
 
     # حذف مادة
     if request.method == 'POST' and 'delete_enrollment' in request.POST:
         enrollment_id = request.POST.get('enrollment_id')
         enrollment = Enrollment.objects.get(id=enrollment_id)
-        enrollment.delete()
+        # إذا كان التنزيل محجوزًا في مجموعة نحرر المقعد (أو ننقله لأول طالب في الانتظار)
+        registration.release_seat(enrollment)
         return redirect(f"{request.path}?student_id={student.id_student}")
 
     return render(request, 'edit_student_downloads.html', {
@@ -568,18 +821,52 @@ def edit_student_downloads(request):
 
 
 
+# --- حجز مقعد في مجموعة محاضرات (JSON)
+@login_required
+def reserve_seat(request):
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "error": "forbidden"}, status=403)
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "POST only"}, status=405)
+
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+        student = Student.objects.get(id_student=int(data.get("student_id")))
+        lecture_group = LectureGroup.objects.get(material_id=int(data.get("material_id")), group=data.get("group"))
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "error": "بيانات غير صالحة"}, status=400)
+    except (Student.DoesNotExist, LectureGroup.DoesNotExist):
+        return JsonResponse({"success": False, "error": "الطالب أو المجموعة غير موجودة"}, status=404)
+
+    try:
+        result = registration.reserve_seat(student, lecture_group)
+    except registration.RegistrationError as exc:
+        return JsonResponse({"success": False, "error": str(exc), "code": exc.code}, status=409)
+
+    return JsonResponse({
+        "success": True,
+        "status": result.status,
+        "enrollment_id": result.enrollment.id if result.enrollment else None,
+        "waitlist_position": result.waitlist_position,
+    })
+
+
+
 @login_required
+@page_cache.cache_view(MaterialPrerequisite, Material)
 def manage_material_prerequisites(request):
     if not request.user.is_staff:
         return redirect('login')
 
-    all_materials = Material.objects.all()
-    all_material_names = list(all_materials.values_list('name', flat=True))
-
     if request.method == 'POST':
         material_names = request.POST.getlist('material_name[]')
         prerequisites_lists = request.POST.getlist('prerequisites[]')
 
+        # نجيب المواد المذكورة في النموذج فقط باستعلام واحد بدل تحميل كل المواد
+        posted_names = {n.strip() for n in material_names + prerequisites_lists if n.strip()}
+        materials_by_name = {m.name: m for m in Material.objects.filter(name__in=posted_names)}
+        failed = False
+
         for mat_name, prereq_name in zip(material_names, prerequisites_lists):
             mat_name = mat_name.strip()
             prereq_name = prereq_name.strip()
@@ -587,38 +874,41 @@ def manage_material_prerequisites(request):
             if not mat_name:
                 continue
 
-            try:
-                material = Material.objects.get(name=mat_name)
-            except Material.DoesNotExist:
+            material = materials_by_name.get(mat_name)
+            if material is None:
                 continue
 
-            # نحذف الأسبقيات القديمة لنفس المادة
-            MaterialPrerequisite.objects.filter(material=material).delete()
-
-            if prereq_name == "" or prereq_name == "لا يوجد":
-                MaterialPrerequisite.objects.create(material=material, prerequisite=None)
-            else:
-                try:
-                    prereq_material = Material.objects.get(name=prereq_name)
-                    if prereq_material != material:
-                        MaterialPrerequisite.objects.create(material=material, prerequisite=prereq_material)
-                except Material.DoesNotExist:
-                    continue
-
-        messages.success(request, "✅ تم حفظ أسبقيات المواد بنجاح!")
+            try:
+                # كل صف في transaction مستقلة: لو الأسبقية الجديدة تصنع دورة نرجع القديمة
+                with transaction.atomic():
+                    # نحذف الأسبقيات القديمة لنفس المادة
+                    MaterialPrerequisite.objects.filter(material=material).delete()
+
+                    if prereq_name == "" or prereq_name == "لا يوجد":
+                        MaterialPrerequisite.objects.create(material=material, prerequisite=None)
+                    else:
+                        prereq_material = materials_by_name.get(prereq_name)
+                        if prereq_material is None:
+                            continue
+                        if prereq_material != material:
+                            MaterialPrerequisite.objects.create(material=material, prerequisite=prereq_material)
+            except ValidationError as exc:
+                failed = True
+                messages.error(request, f"{mat_name} ← {prereq_name}: {' '.join(exc.messages)}")
+
+        if not failed:
+            messages.success(request, "✅ تم حفظ أسبقيات المواد بنجاح!")
         return redirect('manage_material_prerequisites')
 
     # 🔹 بعد الحفظ أو عند الدخول، نعرض البيانات الحالية
-    prerequisites_data = []
-    for p in MaterialPrerequisite.objects.select_related('material', 'prerequisite'):
-        prerequisites_data.append({
-            'material': p.material.name,
-            'prerequisite': p.prerequisite.name if p.prerequisite else "لا يوجد"
-        })
+    prerequisites_data = [
+        {'material': material, 'prerequisite': prerequisite or "لا يوجد"}
+        for material, prerequisite in reference.prerequisites()
+    ]
 
     context = {
-        'all_material_names': all_material_names,
-        'prerequisites_data': prerequisites_data
+        'prerequisites_data': prerequisites_data,
+        **page_cache.fragment_context(MaterialPrerequisite, Material),
     }
     return render(request, 'manage_material_prerequisites.html', context)
 
@@ -626,21 +916,23 @@ def manage_material_prerequisites(request):
 
 
 @login_required
+@page_cache.cache_view(Lecture, Section, Material)
 def timetable_page(request):
-    lectures = Lecture.objects.select_related('material').all()
-    lectures = sorted(lectures, key=lambda x: (x.time, x.day))
-
-    materials = Material.objects.all()  # جلب جميع المواد
-
-    time_slots = [0, 1, 2, 3, 4]
-    days = [1, 2, 3, 4, 5, 6]
+    filters = {
+        'section': request.GET.get('section', '').strip(),
+        'room': request.GET.get('room', '').strip(),
+        'group': request.GET.get('group', '').strip(),
+    }
+    if not filters['section'].isdigit():
+        filters['section'] = ''
 
     context = {
-        'lectures': lectures,
-        'colors': ["#ef4444","#3b82f6","#10b981","#f59e0b","#6366f1","#06b6d4","#8b5cf6"],
-        'rows': time_slots,
-        'days': days,
-        'materials': materials,  # إرسال المواد للـ template
+        # الجدول نفسه يُبنى مرة واحدة ويُخزّن في الكاش حتى تتغير المحاضرات
+        'grid_html': timetable.cached_grid_html(**filters),
+        'filters': filters,
+        'sections': reference.sections(),
+        'materials': reference.materials(),  # للنافذة المنبثقة
+        **page_cache.fragment_context(Section, Material),
     }
     return render(request, 'timetable.html', context)
 
@@ -660,6 +952,19 @@ def save_lecture(request):
 
             material = Material.objects.get(id=material_id)  # جلب المادة من قاعدة البيانات
 
+            # منع حجز نفس القاعة أو نفس مجموعة الطلاب مرتين في نفس الخانة
+            conflicts, free_slots = clashes.check_lecture(
+                material, group, room, day, time,
+                exclude_id=int(lecture_id) if lecture_id and int(lecture_id) > 0 else None,
+            )
+            if conflicts:
+                return JsonResponse({
+                    "success": False,
+                    "error": "تعارض في الجدول",
+                    "conflicts": conflicts,
+                    "free_slots": free_slots,
+                }, status=409)
+
             if lecture_id and int(lecture_id) > 0:
                 lecture = Lecture.objects.get(id=lecture_id)
                 lecture.material = material
@@ -680,4 +985,116 @@ def save_lecture(request):
         except Exception as e:
             print(e)
             return JsonResponse({"success": False, "error": str(e)})
-    return JsonResponse({"success": False})
\ No newline at end of file
+    return JsonResponse({"success": False})
+
+
+@login_required
+def validate_timetable(request):
+    """فحص الجدول كاملًا وإرجاع كل تعارضات القاعات والمجموعات"""
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "error": "غير مصرح"}, status=403)
+    count, conflicts = clashes.validate_timetable()
+    return JsonResponse({"lectures": count, "conflicts_count": len(conflicts), "conflicts": conflicts})
+
+
+# حد للتوليد كله، أقل من مهلة gunicorn (--timeout في scripts/course_service.sh). التوليد داخل
+# عملية الطلب نفسها (workers=1): لا نفتح عمليات فرعية من worker في gunicorn
+GENERATE_TIMETABLE_MAX_SECONDS = 20
+
+
+@login_required
+@database.statement_timeout('reporting', methods=('POST',))
+def generate_timetable(request):
+    """توليد الجدول آليًا من صفحة الإجراءات (نفس أمر manage.py generate_timetable)"""
+    if not request.user.is_staff:
+        return redirect('login')
+
+    context = {'rooms_text': request.POST.get('rooms', ''), 'restarts': request.POST.get('restarts', '4')}
+    if request.method == 'POST':
+        try:
+            restarts = min(max(int(context['restarts']), 1), 16)
+        except ValueError:
+            restarts = 4
+        try:
+            rooms = scheduling.parse_rooms(context['rooms_text']) if context['rooms_text'].strip() else None
+            problem = scheduling.build_problem(rooms)
+        except scheduling.SchedulingError as exc:
+            messages.error(request, str(exc))
+            return render(request, 'generate_timetable.html', context)
+
+        solution = scheduling.solve(problem, restarts=restarts, workers=1,
+                                    time_limit=GENERATE_TIMETABLE_MAX_SECONDS)
+        context.update({'problem': problem, 'solution': solution})
+        if not solution.feasible:
+            messages.error(request, f"لم يتم إيجاد جدول بدون تعارض ({solution.violations} تعارض)")
+        elif request.POST.get('apply'):
+            written = scheduling.apply_solution(problem, solution)
+            messages.success(request, f"تم حفظ {written} محاضرة في الجدول")
+            return redirect('timetable_page')
+        else:
+            names = dict(Material.objects.filter(id__in={s.material_id for s in problem.sessions})
+                         .values_list('id', 'name'))
+            rows = scheduling.assignments(problem, solution)
+            for row in rows:
+                row['material'] = names.get(row['material_id'])
+                row['day_label'] = timetable.DAY_LABELS[row['day']]
+                row['time_label'] = timetable.TIME_LABELS[row['time']]
+            context['rows'] = rows
+
+    return render(request, 'generate_timetable.html', context)
+
+
+@login_required
+def reference_cache_stats(request):
+    """عدادات إصابة/إخفاق كاش البيانات المرجعية في هذه العملية (JSON للمراقبة)"""
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "error": "غير مصرح"}, status=403)
+    return JsonResponse({"success": True, **reference.stats()})
+
+
+@login_required
+def page_cache_stats(request):
+    """نسبة إصابة كاش الصفحات لكل view في هذه العملية (JSON للمراقبة)"""
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "error": "غير مصرح"}, status=403)
+    return JsonResponse({"success": True, **page_cache.stats()})
+
+
+@login_required
+def diagnostics_page(request):
+    """استعلامات وأزمنة كل صفحة منذ تشغيل هذه العملية، مع حدود الاستعلامات والاستعلامات المكررة"""
+    if not request.user.is_staff:
+        return redirect('login')
+
+    if request.method == 'POST':
+        instrumentation.reset()
+        reference.reset_stats()
+        page_cache.reset_stats()
+        messages.success(request, "تم تصفير الإحصاءات")
+        return redirect('diagnostics_page')
+
+    context = {
+        'rows': instrumentation.snapshot(),
+        'reference_cache': reference.stats(),
+        'page_cache': page_cache.stats(),
+        'enforce_budgets': settings.QUERY_BUDGETS_ENFORCE,
+    }
+    return render(request, 'diagnostics.html', context)
+
+
+def metrics_view(request):
+    """
+    مقاييس Prometheus لكل عمليات gunicorn (صيغة النص). بدون تسجيل دخول حتى يقرأها
+    Prometheus، لكن فقط مع METRICS_TOKEN أو لمستخدم إداري أو من METRICS_ALLOWED_IPS. العنوان
+    لا يُعتمد إذا مر الطلب بـ proxy (فيه X-Forwarded-For)، لأن REMOTE_ADDR عندها عنوان الـ proxy.
+    """
+    token = settings.METRICS_TOKEN
+    direct = 'HTTP_X_FORWARDED_FOR' not in request.META
+    allowed = (
+        (direct and request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS)
+        or (token and request.headers.get('Authorization') == f"Bearer {token}")
+        or request.user.is_staff
+    )
+    if not allowed:
+        return HttpResponse("غير مصرح", status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
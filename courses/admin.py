@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Student, Section, Material, Enrollment, GradeRecord, MaterialPrerequisite
+from .models import Student, Section, Material, Enrollment, GradeRecord, MaterialPrerequisite, SemesterGPA, \
+    MaterialPrerequisiteClosure, RegistrationWindow, LectureGroup, WaitlistEntry, \
+    MaterialTermReport, SectionTermReport, ReportRefresh
 
 # --- الأقسام
 @admin.register(Section)
@@ -31,7 +33,7 @@ class MaterialPrerequisiteAdmin(admin.ModelAdmin):
 # --- تنزيل المواد
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
-    list_display = ('student', 'material', 'semester', 'year', 'grade')
+    list_display = ('student', 'material', 'semester', 'year', 'group', 'grade')
     search_fields = ('student__name', 'material__name')
     list_filter = ('semester', 'year')
 
@@ -40,4 +42,53 @@ class EnrollmentAdmin(admin.ModelAdmin):
 class GradeRecordAdmin(admin.ModelAdmin):
     list_display = ('student', 'material', 'semester', 'year', 'grade', 'semester_gpa', 'cumulative_gpa')
     search_fields = ('student__name', 'material__name')
-    list_filter = ('semester', 'year')
\ No newline at end of file
+    list_filter = ('semester', 'year')
+
+# --- ملخص المعدلات
+@admin.register(SemesterGPA)
+class SemesterGPAAdmin(admin.ModelAdmin):
+    list_display = ('student', 'semester', 'year', 'total_points', 'total_hours', 'grades_count', 'gpa')
+    search_fields = ('student__name', 'student__id_student')
+    list_filter = ('semester', 'year')
+
+# --- الأسبقيات المتعدية (تُحسب تلقائيًا)
+@admin.register(MaterialPrerequisiteClosure)
+class MaterialPrerequisiteClosureAdmin(admin.ModelAdmin):
+    list_display = ('ancestor', 'descendant', 'depth')
+    search_fields = ('ancestor__name', 'descendant__name')
+    list_filter = ('depth',)
+
+# --- فترات التسجيل
+@admin.register(RegistrationWindow)
+class RegistrationWindowAdmin(admin.ModelAdmin):
+    list_display = ('name', 'opens_at', 'closes_at', 'is_active')
+    list_filter = ('is_active',)
+
+# --- سعة مجموعات المحاضرات
+@admin.register(LectureGroup)
+class LectureGroupAdmin(admin.ModelAdmin):
+    list_display = ('material', 'group', 'capacity', 'seats_taken')
+    search_fields = ('material__name', 'material__code', 'group')
+    readonly_fields = ('seats_taken',)
+
+# --- قائمة الانتظار
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'lecture_group', 'created_at')
+    search_fields = ('student__name', 'lecture_group__material__name')
+
+# --- جداول التقارير (للقراءة فقط، تُبنى بأمر refresh_reports)
+@admin.register(MaterialTermReport)
+class MaterialTermReportAdmin(admin.ModelAdmin):
+    list_display = ('material_name', 'section_name', 'semester', 'year', 'enrolled_count', 'graded_count', 'passed_count')
+    search_fields = ('material_name',)
+    list_filter = ('semester', 'year')
+
+@admin.register(SectionTermReport)
+class SectionTermReportAdmin(admin.ModelAdmin):
+    list_display = ('section_name', 'semester', 'year', 'students_count', 'enrollments_count', 'graded_count', 'passed_count')
+    list_filter = ('semester', 'year')
+
+@admin.register(ReportRefresh)
+class ReportRefreshAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'finished_at', 'rows')
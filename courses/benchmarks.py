@@ -0,0 +1,251 @@
+"""
+قياس أداء كل صفحات لوحة الإدارة
+
+كل صفحة تُطلب بعميل Django (بدون خادم) كمستخدم إداري: عدة مرات لقياس الزمن (الوسيط
+والأدنى والأعلى)، ثم مرة واحدة تحت tracemalloc و CaptureQueriesContext لعدد الاستعلامات
+وذروة الذاكرة، حتى لا يؤثر القياس على الزمن. افتراضيًا يُمسح الكاش قبل كل طلب (أسوأ حالة
+وقابلة للتكرار)، وهذا مسموح فقط لكاش locmem الخاص بالعملية أو مع BENCHMARK_CLEAR_CACHE لكاش
+مخصص للقياس، حتى لا يمسح القياس كاش الخادم المشترك.
+
+النتيجة قاموس يُحفظ JSON كخط أساس، و compare تقارن تشغيلًا جديدًا به وترجع التراجعات،
+و budget_violations تقارن عدد الاستعلامات بحدود QUERY_BUDGETS.
+تُشغّل على بيانات seed_scale حتى تكون الأرقام ذات معنى.
+"""
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from courses.instrumentation import budget_for
+from courses.models import Enrollment, GradeRecord, Lecture, Material, Section, Student
+
+# (الاسم، اسم الرابط، معاملات الرابط، معاملات GET) — القيم بين <> تُستبدل من _fixtures
+CASES = [
+    ('admin_dashbord', 'admin_dashbord', (), {}),
+    ('materials_page', 'materials_page', (), {}),
+    ('materials_page:search', 'materials_page', (), {'name': 'مادة'}),
+    ('material_autocomplete', 'material_autocomplete', (), {'q': 'مادة'}),
+    ('material_detail', 'material_detail', ('<material>',), {}),
+    ('add_material_page', 'add_material_page', (), {}),
+    ('students_page', 'students_page', (), {}),
+    ('students_page:search', 'students_page', (), {'name': 'طالب'}),
+    ('student_detail', 'student_detail', ('<student>',), {}),
+    ('student_timetable', 'student_timetable', ('<student>',), {}),
+    ('add_student', 'add_student', (), {}),
+    ('sections_page', 'sections_page', (), {}),
+    ('edit_section', 'edit_section', ('<section>',), {}),
+    ('section_timetable_conflicts', 'section_timetable_conflicts', ('<section>',), {}),
+    ('reports_page', 'reports_page', (), {}),
+    ('grades_entry', 'grades_entry', (), {}),
+    ('add_grade_entry', 'add_grade_entry', (), {}),
+    ('import_grades', 'import_grades', (), {}),
+    ('procedures_page', 'procedures_page', (), {}),
+    ('materials_download_page', 'materials_download_page', (), {}),
+    ('student_material_download', 'student_material_download', (), {'student_id': '<student>'}),
+    ('edit_student_downloads', 'edit_student_downloads', (), {'student_id': '<student>'}),
+    ('manage_material_prerequisites', 'manage_material_prerequisites', (), {}),
+    ('timetable_page', 'timetable_page', (), {}),
+    ('validate_timetable', 'validate_timetable', (), {}),
+    ('generate_timetable', 'generate_timetable', (), {}),
+    ('export_records:enrollments', 'export_records', ('enrollments',), {'section': '<section>'}),
+    ('export_records:transcripts', 'export_records', ('transcripts',), {'section': '<section>'}),
+]
+
+MIN_TIME_DELTA_MS = 5        # فروق الزمن الأصغر من هذا ضجيج وليست تراجعًا
+MIN_MEMORY_DELTA_KB = 256
+
+# كاش داخل العملية نفسها: مسحه لا يمس الخادم
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class BenchmarkError(Exception):
+    """لا يمكن تشغيل القياس (لا يوجد مستخدم إداري أو بيانات مثلًا)"""
+
+
+def _fixtures():
+    """طالب له درجات، وقسمه، ومادة لها محاضرات — لصفحات التفاصيل"""
+    student_id = GradeRecord.objects.order_by('student_id').values_list('student_id', flat=True).first()
+    if student_id is None:
+        raise BenchmarkError("لا توجد درجات مرصودة؛ شغّل manage.py seed_scale أولًا")
+    section_id = Student.objects.filter(pk=student_id).values_list('section_id', flat=True).first()
+    material_id = Lecture.objects.order_by('material_id').values_list('material_id', flat=True).first() or \
+        Material.objects.order_by('id').values_list('id', flat=True).first()
+    return {'<student>': student_id, '<section>': section_id, '<material>': material_id}
+
+
+def build_urls(only=None):
+    """[(الاسم، اسم الرابط، الرابط)] لكل الحالات أو للأسماء المعطاة فقط"""
+    fixtures = _fixtures()
+    urls = []
+    for name, url_name, args, params in CASES:
+        if only and name not in only:
+            continue
+        args = [fixtures.get(arg, arg) for arg in args]
+        params = {key: fixtures.get(value, value) for key, value in params.items()}
+        url = reverse(url_name, args=args)
+        urls.append((name, url_name, f"{url}?{urlencode(params)}" if params else url))
+    return urls
+
+
+def server_name():
+    """اسم خادم مسموح في ALLOWED_HOSTS حتى لا ترفض الطلبات بـ DisallowedHost"""
+    hosts = [h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def staff_client(username=None):
+    """عميل Django مسجل دخوله كمستخدم إداري، مع كوكي CSRF"""
+    users = get_user_model().objects.filter(is_active=True, is_staff=True)
+    user = users.filter(username=username).first() if username else users.order_by('-is_superuser', 'id').first()
+    if user is None:
+        raise BenchmarkError("لا يوجد مستخدم إداري فعّال (أنشئ واحدًا بـ manage.py createsuperuser)")
+    client = Client(SERVER_NAME=server_name())
+    client.force_login(user)
+    client.get(reverse('admin_dashbord'))  # كوكي CSRF كما في المتصفح
+    return client
+
+
+def check_cold_cache():
+    """القياس البارد يمسح الكاش كله، فنرفضه على كاش مشترك (file أو redis) إلا بإذن صريح"""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in LOCAL_CACHE_BACKENDS and not getattr(settings, 'BENCHMARK_CLEAR_CACHE', False):
+        raise BenchmarkError(
+            f"القياس البارد يمسح الكاش ({backend}) وهو مشترك مع الخادم؛ استخدم --warm أو CACHE_BACKEND=locmem "
+            "أو BENCHMARK_CLEAR_CACHE = True إذا كان الكاش مخصصًا للقياس"
+        )
+
+
+def _fetch(client, url):
+    """يطلب الصفحة ويستهلك الرد كاملًا (بما فيه الردود المتدفقة). يرجع (الحالة، الحجم)"""
+    response = client.get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def measure(client, url, repeat=5, cold=True):
+    if cold:
+        check_cold_cache()
+    # طلب تسخين أول لتحميل الوحدات والقوالب، لا يدخل في النتائج
+    _fetch(client, url)
+
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        status, size = _fetch(client, url)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            _fetch(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': status,
+        'bytes': size,
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def dataset():
+    """أحجام الجداول الرئيسية، لمعرفة هل خط الأساس قيس على نفس البيانات"""
+    return {
+        'sections': Section.objects.count(),
+        'materials': Material.objects.count(),
+        'students': Student.objects.count(),
+        'enrollments': Enrollment.objects.count(),
+        'grade_records': GradeRecord.objects.count(),
+        'lectures': Lecture.objects.count(),
+    }
+
+
+def run(repeat=5, cold=True, only=None, username=None, progress=None):
+    """يقيس كل الصفحات ويرجع النتيجة كقاموس قابل للحفظ JSON"""
+    if cold:
+        check_cold_cache()
+    client = staff_client(username)
+    views = {}
+    for name, url_name, url in build_urls(only):
+        views[name] = {'url_name': url_name, **measure(client, url, repeat=repeat, cold=cold)}
+        if progress:
+            progress(name, views[name])
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': repeat,
+            'cold_cache': cold,
+            'dataset': dataset(),
+        },
+        'views': views,
+    }
+
+
+def budget_violations(results):
+    """الصفحات التي تجاوزت حد الاستعلامات في QUERY_BUDGETS (حسب اسم الرابط)"""
+    violations = []
+    for name, result in results['views'].items():
+        budget = budget_for(result['url_name'])
+        if budget is not None and result['queries'] > budget:
+            violations.append(f"{name}: {result['queries']} استعلام والحد {budget}")
+    return violations
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    ترجع (التراجعات، ملاحظات). التراجع: حالة HTTP مختلفة، أو استعلامات أكثر، أو زمن وسيط
+    أو ذروة ذاكرة أكبر من خط الأساس بأكثر من tolerance (مع حد أدنى للفرق يتجاهل الضجيج).
+    """
+    regressions, notes = [], []
+    if results['meta']['dataset'] != baseline['meta'].get('dataset'):
+        notes.append("أحجام البيانات تختلف عن خط الأساس، فالمقارنة تقريبية")
+    if results['meta']['database'] != baseline['meta'].get('database'):
+        notes.append("قاعدة البيانات تختلف عن خط الأساس")
+
+    for name, current in results['views'].items():
+        old = baseline['views'].get(name)
+        if old is None:
+            notes.append(f"{name}: جديدة، لا توجد في خط الأساس")
+            continue
+        if current['status'] != old['status']:
+            regressions.append(f"{name}: الحالة {old['status']} ← {current['status']}")
+        if current['queries'] > old['queries']:
+            regressions.append(f"{name}: الاستعلامات {old['queries']} ← {current['queries']}")
+        if current['median_ms'] > old['median_ms'] * (1 + tolerance) and \
+                current['median_ms'] - old['median_ms'] >= MIN_TIME_DELTA_MS:
+            regressions.append(f"{name}: الزمن {old['median_ms']} ← {current['median_ms']} ms")
+        if current['peak_kb'] > old['peak_kb'] * (1 + tolerance) and \
+                current['peak_kb'] - old['peak_kb'] >= MIN_MEMORY_DELTA_KB:
+            regressions.append(f"{name}: الذاكرة {old['peak_kb']} ← {current['peak_kb']} KB")
+    return regressions, notes
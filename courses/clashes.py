@@ -0,0 +1,153 @@
+"""
+كشف تعارضات جدول المحاضرات
+
+الأسبوع 30 خانة (6 أيام × 5 أوقات)، فنمثل انشغال كل قاعة وكل مجموعة طلاب بعدد صحيح
+كل بت فيه خانة. فحص محاضرة جديدة هو AND واحد على بت خانتها، وفحص الجدول كاملًا مرور
+واحد على المحاضرات. مجموعة الطلاب هي (القسم، اسم المجموعة): نفس طلاب المجموعة يحضرون
+كل مواد قسمهم، فلا يجوز أن تكون لهم محاضرتان في نفس الخانة.
+"""
+from django.db.models import Q
+
+from courses.models import Lecture
+from courses.timetable import DAY_LABELS, DAYS, TIME_LABELS, TIME_SLOTS
+
+ROOM = 'room'
+GROUP = 'group'
+
+SLOT_COUNT = len(DAYS) * len(TIME_SLOTS)
+ALL_SLOTS = (1 << SLOT_COUNT) - 1
+
+LECTURE_FIELDS = ('id', 'material_id', 'material__name', 'material__section_id', 'group', 'room', 'day', 'time')
+
+
+def slot_index(day, time):
+    return (day - DAYS[0]) * len(TIME_SLOTS) + (time - TIME_SLOTS[0])
+
+
+def slot_bit(day, time):
+    return 1 << slot_index(day, time)
+
+
+def slot_from_index(index):
+    day, time = divmod(index, len(TIME_SLOTS))
+    return DAYS[0] + day, TIME_SLOTS[0] + time
+
+
+def _keys(lecture):
+    """
+    مفاتيح انشغال المحاضرة: القاعة ومجموعة الطلاب. مادة بلا قسم ليس لمجموعتها طلاب مشتركون
+    مع مواد أخرى (وتكرار نفس المادة والمجموعة في خانة واحدة يمنعه القيد الفريد)، فلها القاعة فقط.
+    """
+    if lecture['material__section_id'] is None:
+        return ((ROOM, lecture['room']),)
+    return ((ROOM, lecture['room']), (GROUP, (lecture['material__section_id'], lecture['group'])))
+
+
+def _describe(lecture):
+    return {
+        'id': lecture['id'],
+        'material_id': lecture['material_id'],
+        'material': lecture['material__name'],
+        'group': lecture['group'],
+        'room': lecture['room'],
+    }
+
+
+def _conflict(kind, key, day, time, lectures):
+    return {
+        'type': kind,
+        ROOM: key if kind == ROOM else None,
+        GROUP: key[1] if kind == GROUP else None,
+        'section_id': key[0] if kind == GROUP else None,
+        'day': day,
+        'day_label': DAY_LABELS[day],
+        'time': time,
+        'time_label': TIME_LABELS[time],
+        'lectures': [_describe(lecture) for lecture in lectures],
+    }
+
+
+class Occupancy:
+    """بتات الانشغال لكل قاعة ومجموعة، مع المحاضرات في كل خانة لوصف التعارض"""
+
+    def __init__(self):
+        self.bits = {}
+        self.slots = {}
+
+    def add(self, lecture):
+        """تضيف محاضرة (قاموس من values) وترجع التعارضات التي أحدثتها"""
+        bit = slot_bit(lecture['day'], lecture['time'])
+        clashes = []
+        for key in _keys(lecture):
+            occupied = self.bits.get(key, 0)
+            if occupied & bit:
+                clashes.append(key)
+            self.bits[key] = occupied | bit
+            self.slots.setdefault((key, bit), []).append(lecture)
+        return clashes
+
+    def conflicts_for(self, lecture):
+        """تعارضات محاضرة مقترحة مع الموجود، بدون إضافتها"""
+        bit = slot_bit(lecture['day'], lecture['time'])
+        conflicts = []
+        for kind, key in _keys(lecture):
+            if self.bits.get((kind, key), 0) & bit:
+                others = self.slots[((kind, key), bit)]
+                conflicts.append(_conflict(kind, key, lecture['day'], lecture['time'], others))
+        return conflicts
+
+    def free_slots(self, lecture):
+        """الخانات التي تكون فيها القاعة والمجموعة كلتاهما متاحتين"""
+        busy = 0
+        for key in _keys(lecture):
+            busy |= self.bits.get(key, 0)
+        free = ALL_SLOTS & ~busy
+        return [slot_from_index(i) for i in range(SLOT_COUNT) if free >> i & 1]
+
+
+def check_lecture(material, group, room, day, time, exclude_id=None):
+    """
+    تعارضات حفظ محاضرة في الخانة (day, time): قائمة فارغة إذا لم يوجد تعارض.
+    ترجع (conflicts, free_slots) حيث free_slots الخانات البديلة المتاحة للقاعة والمجموعة.
+    """
+    lecture = {
+        'id': exclude_id, 'material_id': material.id, 'material__name': material.name,
+        'material__section_id': material.section_id, 'group': group, 'room': room,
+        'day': day, 'time': time,
+    }
+    # نحمّل فقط محاضرات نفس القاعة أو نفس مجموعة القسم (section_id=None يصير IS NULL فنتجنبه)
+    condition = Q(room=room)
+    if material.section_id is not None:
+        condition |= Q(group=group, material__section_id=material.section_id)
+    related = Lecture.objects.filter(condition)
+    if exclude_id:
+        related = related.exclude(id=exclude_id)
+
+    occupancy = Occupancy()
+    for other in related.values(*LECTURE_FIELDS):
+        occupancy.add(other)
+    conflicts = occupancy.conflicts_for(lecture)
+    return conflicts, (occupancy.free_slots(lecture) if conflicts else [])
+
+
+def validate_timetable(lectures=None):
+    """يفحص الجدول كاملًا بمرور واحد ويرجع قائمة التعارضات (تعارض لكل قاعة/مجموعة وخانة)"""
+    if lectures is None:
+        lectures = Lecture.objects.values(*LECTURE_FIELDS).order_by('day', 'time', 'id')
+
+    occupancy = Occupancy()
+    clashing = []
+    count = 0
+    for lecture in lectures:
+        count += 1
+        bit = slot_bit(lecture['day'], lecture['time'])
+        for key in occupancy.add(lecture):
+            # نسجل كل (مفتاح، خانة) مرة واحدة، والمحاضرات تتجمع في occupancy.slots
+            if len(occupancy.slots[(key, bit)]) == 2:
+                clashing.append((key, lecture['day'], lecture['time'], bit))
+
+    conflicts = [
+        _conflict(kind, key, day, time, occupancy.slots[((kind, key), bit)])
+        for (kind, key), day, time, bit in clashing
+    ]
+    return count, conflicts
@@ -0,0 +1,105 @@
+"""
+إعدادات الاتصال بقاعدة البيانات أثناء الطلب
+
+مهلة الاستعلام الافتراضية (STATEMENT_TIMEOUTS['default']) تُضبط مرة واحدة عند فتح
+الاتصال من OPTIONS، فلا تكلف أي استعلام في الطلبات العادية. الصفحات الثقيلة (التصدير،
+الاستيراد، توليد الجدول) تأخذ مهلة فئتها بـ statement_timeout، وتعود المهلة للافتراضي بعد
+الطلب لأن الاتصال نفسه يُعاد استخدامه (CONN_MAX_AGE). أوامر manage.py الطويلة (الاستيراد،
+إعادة الحساب، التوليد) تأخذ مهلتها بـ command_timeout. على غير Postgres لا تفعل شيئًا.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.backends.signals import connection_created
+
+
+def timeout_ms(category):
+    return settings.STATEMENT_TIMEOUTS[category]
+
+
+def _set_timeout(connection, value):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('statement_timeout', %s, false)", [str(value)])
+
+
+def _reset_timeout(connection):
+    """يرجع المهلة لقيمة بداية الاتصال؛ إذا فشل (اتصال معطوب) نغلقه حتى لا تبقى المهلة"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("RESET statement_timeout")
+    except DatabaseError:
+        connection.close()
+
+
+def statement_timeout(category, using=DEFAULT_DB_ALIAS, methods=None):
+    """
+    decorator للـ view: مهلة الاستعلام من STATEMENT_TIMEOUTS[category] طوال الطلب، بما فيه
+    قراءة الردود المتدفقة (تعود المهلة عند إغلاق الرد وليس عند خروج الـ view).
+    methods: تطبيقها على هذه الطرق فقط (مثل POST لصفحة عرضها خفيف وتنفيذها ثقيل).
+    """
+    if category not in settings.STATEMENT_TIMEOUTS:
+        raise ValueError(f"فئة مهلة غير معروفة: {category}")
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            connection = connections[using]
+            if connection.vendor != 'postgresql' or timeout_ms(category) == timeout_ms('default') \
+                    or (methods and request.method not in methods):
+                return view(request, *args, **kwargs)
+
+            _set_timeout(connection, timeout_ms(category))
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                _reset_timeout(connection)
+                raise
+            if response.streaming:
+                response._resource_closers.append(lambda: _reset_timeout(connection))
+            else:
+                _reset_timeout(connection)
+            return response
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def command_timeout(category='bulk'):
+    """
+    مهلة STATEMENT_TIMEOUTS[category] لكل اتصالات Postgres طوال الأمر، ويُستخدم كـ decorator
+    على handle. الاتصالات التي تُفتح أثناءه (بعد connections.close_all مثلًا) تأخذها أيضًا.
+    """
+    value = timeout_ms(category)
+    if value == timeout_ms('default'):
+        yield
+        return
+
+    def on_connect(sender, connection, **kwargs):
+        if connection.vendor == 'postgresql':
+            _set_timeout(connection, value)
+
+    for connection in connections.all(initialized_only=True):
+        if connection.vendor == 'postgresql' and connection.connection is not None:
+            _set_timeout(connection, value)
+    connection_created.connect(on_connect)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(on_connect)
+        for connection in connections.all(initialized_only=True):
+            if connection.vendor == 'postgresql' and connection.connection is not None:
+                _reset_timeout(connection)
+
+
+@checks.register(checks.Tags.database)
+def check_pool_support(app_configs, **kwargs):
+    if getattr(settings, 'DB_POOL', False) and not settings.DB_POOL_SUPPORTED:
+        return [checks.Warning(
+            "DB_POOL=1 يتطلب Django 5.1 أو أحدث؛ سيُستخدم CONN_MAX_AGE بدل الـ pool",
+            hint="حدّث Django أو ضع PgBouncer أمام Postgres",
+            id='courses.W001',
+        )]
+    return []
@@ -0,0 +1,77 @@
+"""
+خدمة تنزيل المواد للطالب
+
+تأخذ طالبًا وقائمة أرقام مواد وتنفذ التنزيل بعدد ثابت من الاستعلامات للتحميل والفحص:
+تحميل المواد، فحص الأسبقيات، فحص التنزيلات الموجودة، ثم إدخال كل مادة جديدة. التكرار في
+نفس السمستر يمنعه قيد unique_together على Enrollment نفسه وليس القراءة قبل الكتابة: مادة
+سبقنا إليها طلب آخر ترفض بـ IntegrityError فتُحسب منزّلة مسبقًا كما في registration.reserve_seat.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.db import IntegrityError, transaction
+
+from courses import prerequisites
+from courses.models import Enrollment, Material
+
+
+@dataclass
+class EnrollmentResult:
+    enrolled: list = field(default_factory=list)           # المواد التي نُزّلت الآن
+    already_enrolled: list = field(default_factory=list)   # منزّلة مسبقًا في نفس السمستر
+    blocked: dict = field(default_factory=dict)            # {رقم المادة: [أسبقيات غير مجتازة]}
+    unknown: list = field(default_factory=list)            # أرقام غير موجودة
+
+
+def current_term(today=None):
+    """السمستر الحالي بنفس صيغة صفحات التنزيل: ("الشهر/السنة", "السنة")"""
+    today = today or date.today()
+    return f"{today.month}/{today.year}", str(today.year)
+
+
+def _parse_ids(material_ids):
+    ids = []
+    for value in material_ids:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return list(dict.fromkeys(ids))
+
+
+def enroll_materials(student, material_ids, today=None):
+    """تنزّل المواد المختارة للطالب في السمستر الحالي وترجع EnrollmentResult"""
+    result = EnrollmentResult()
+    ids = _parse_ids(material_ids)
+    if not ids:
+        return result
+
+    materials = Material.objects.in_bulk(ids)
+    result.unknown = [i for i in ids if i not in materials]
+
+    result.blocked = prerequisites.check_eligibility(student, materials.keys())
+    candidates = [materials[i] for i in ids if i in materials and i not in result.blocked]
+    if not candidates:
+        return result
+
+    semester, year = current_term(today)
+    existing = set(
+        Enrollment.objects.filter(
+            student=student, semester=semester, year=year,
+            material_id__in=[m.id for m in candidates],
+        ).values_list('material_id', flat=True)
+    )
+    result.already_enrolled = [m for m in candidates if m.id in existing]
+    new = [m for m in candidates if m.id not in existing]
+
+    with transaction.atomic():
+        for material in new:
+            try:
+                with transaction.atomic():
+                    Enrollment.objects.create(student=student, material=material, semester=semester, year=year)
+            except IntegrityError:
+                # طلب آخر نزّل نفس المادة بعد فحصنا، فلا نعدّها ضمن ما نُزّل الآن
+                result.already_enrolled.append(material)
+            else:
+                result.enrolled.append(material)
+    return result
@@ -0,0 +1,333 @@
+"""
+محرك المعدلات التراكمية — المصدر الوحيد للمعدلات في المشروع
+
+نحتفظ لكل طالب ولكل سمستر بمجموع النقاط (الدرجة × ساعات المادة) ومجموع الساعات
+وعدد الدرجات في جدول semester_gpas، فيصير تعديل درجة واحدة تحديثًا واحدًا لصف واحد
+بدل إعادة تجميع كل سجل الطالب. الدرجات نفسها في GradeRecord فقط.
+
+القراءة (get_student_gpa و gpas_for_students) من الكاش لكل طالب، وأي كتابة على مجاميع
+طالب تحذف مفتاحه فورًا وبعد الـ commit أيضًا، حتى لا يعيد طلب متزامن ملء الكاش بقيم قديمة.
+"""
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Round
+
+from courses import routing
+from courses.models import GradeRecord, Material, SemesterGPA
+
+VERSION_KEY = 'gpa:version'
+REFRESH_CHUNK_SIZE = 500
+
+
+@dataclass
+class StudentGPA:
+    semesters: dict = field(default_factory=dict)   # {(السمستر، السنة): المعدل}
+    cumulative: float = 0
+
+    def semester(self, semester, year):
+        return self.semesters.get((semester, year), 0)
+
+
+def _round(points, hours):
+    return round(points / hours, 2) if hours > 0 else 0
+
+
+def from_totals(rows):
+    """معدلات الطالب من مجاميع سمستراته: rows = [(السمستر، السنة، النقاط، الساعات)]"""
+    result = StudentGPA()
+    total_points = total_hours = 0
+    for semester, year, points, hours in rows:
+        result.semesters[(semester, year)] = _round(points, hours)
+        total_points += points
+        total_hours += hours
+    result.cumulative = _round(total_points, total_hours)
+    return result
+
+
+def _cache_timeout():
+    return getattr(settings, 'GPA_CACHE_TIMEOUT', 300)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _key(student_id, version):
+    return f"gpa:{version}:{student_id}"
+
+
+def invalidate(student_ids):
+    """حذف معدلات الطلاب من الكاش الآن وبعد الـ commit"""
+    student_ids = set(student_ids)
+    if not student_ids:
+        return
+
+    def delete():
+        version = _version()
+        cache.delete_many([_key(student_id, version) for student_id in student_ids])
+
+    delete()
+    transaction.on_commit(delete)
+
+
+def invalidate_all():
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 2, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def gpas_for_students(student_ids):
+    """
+    معدلات عدة طلاب: من الكاش، والناقص كله باستعلام واحد على semester_gpas.
+    ترجع {رقم الطالب: StudentGPA}.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+    version = _version()
+    keys = {_key(student_id, version): student_id for student_id in student_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = [student_id for student_id in student_ids if student_id not in result]
+    if missing:
+        rows = {student_id: [] for student_id in missing}
+        with routing.primary():
+            for student_id, semester, year, points, hours in SemesterGPA.objects.filter(student_id__in=missing)\
+                    .values_list('student_id', 'semester', 'year', 'total_points', 'total_hours'):
+                rows[student_id].append((semester, year, points, hours))
+        loaded = {student_id: from_totals(student_rows) for student_id, student_rows in rows.items()}
+        cache.set_many({_key(student_id, version): value for student_id, value in loaded.items()}, _cache_timeout())
+        result.update(loaded)
+    return result
+
+
+def get_student_gpa(student_id):
+    return gpas_for_students([student_id])[student_id]
+
+
+def _points_expression():
+    return Sum(F('grade') * F('material__hours'), output_field=FloatField())
+
+
+def _contribution(grade, hours):
+    """ما تضيفه درجة واحدة للمجاميع: (النقاط، الساعات، العدد)"""
+    if grade is None:
+        return 0.0, 0, 0
+    return grade * hours, hours, 1
+
+
+def _bump(student_id, semester, year, points, hours, count):
+    """نضيف الفرق لصف السمستر في استعلام UPDATE واحد، وننشئ الصف إذا لم يوجد"""
+    if not (points or hours or count):
+        return
+    invalidate([student_id])
+
+    rows = SemesterGPA.objects.filter(student_id=student_id, semester=semester, year=year)
+    updated = rows.update(
+        total_points=F('total_points') + points,
+        total_hours=F('total_hours') + hours,
+        grades_count=F('grades_count') + count,
+    )
+    if updated or count <= 0:
+        # فرق سالب بدون صف يعني أن الطالب نفسه يُحذف، فلا داعي لإنشاء شيء
+        return
+
+    try:
+        with transaction.atomic():
+            SemesterGPA.objects.create(
+                student_id=student_id, semester=semester, year=year,
+                total_points=points, total_hours=hours, grades_count=count,
+            )
+    except IntegrityError:
+        # طلب آخر أنشأ الصف في نفس اللحظة
+        rows.update(
+            total_points=F('total_points') + points,
+            total_hours=F('total_hours') + hours,
+            grades_count=F('grades_count') + count,
+        )
+
+
+def apply_grade_change(previous, current, material=None):
+    """
+    نطبّق تغيّر درجة واحدة على المجاميع.
+    previous و current هما ناتج GradeRecord.gpa_state() قبل وبعد الحفظ (أو None).
+    """
+    hours = {}
+    if material is not None:
+        hours[material.pk] = material.hours
+    missing = {s[1] for s in (previous, current) if s is not None and s[1] not in hours}
+    if missing:
+        hours.update(Material.objects.filter(pk__in=missing).values_list('id', 'hours'))
+
+    deltas = {}
+    for state, sign in ((previous, -1), (current, 1)):
+        if state is None:
+            continue
+        student_id, material_id, semester, year, grade = state
+        points, credit_hours, count = _contribution(grade, hours.get(material_id, 0))
+        key = (student_id, semester, year)
+        old = deltas.get(key, (0.0, 0, 0))
+        deltas[key] = (old[0] + sign * points, old[1] + sign * credit_hours, old[2] + sign * count)
+
+    for (student_id, semester, year), (points, credit_hours, count) in deltas.items():
+        _bump(student_id, semester, year, points, credit_hours, count)
+
+
+def recompute_semester(student_id, semester, year):
+    """نعيد حساب صف سمستر واحد من سجلات الدرجات مباشرة"""
+    invalidate([student_id])
+    totals = GradeRecord.objects.filter(
+        student_id=student_id, semester=semester, year=year, grade__isnull=False
+    ).aggregate(
+        points=_points_expression(),
+        hours=Sum('material__hours'),
+        count=Count('id'),
+    )
+    SemesterGPA.objects.update_or_create(
+        student_id=student_id, semester=semester, year=year,
+        defaults={
+            'total_points': totals['points'] or 0,
+            'total_hours': totals['hours'] or 0,
+            'grades_count': totals['count'],
+        },
+    )
+
+
+def student_gpas(student_id, semester, year):
+    """ترجع (معدل السمستر، المعدل التراكمي) للطالب"""
+    result = get_student_gpa(student_id)
+    return result.semester(semester, year), result.cumulative
+
+
+def rebuild_all(batch_size=1000):
+    """نمسح جدول الملخص ونبنيه من الصفر من كل سجلات الدرجات"""
+    totals = GradeRecord.objects.filter(grade__isnull=False)\
+        .values('student_id', 'semester', 'year')\
+        .annotate(points=_points_expression(), hours=Sum('material__hours'), count=Count('id'))\
+        .order_by()
+
+    with transaction.atomic():
+        invalidate_all()
+        SemesterGPA.objects.all().delete()
+        batch = []
+        created = 0
+        for row in totals.iterator(chunk_size=batch_size):
+            batch.append(SemesterGPA(
+                student_id=row['student_id'], semester=row['semester'], year=row['year'],
+                total_points=row['points'] or 0, total_hours=row['hours'] or 0,
+                grades_count=row['count'],
+            ))
+            if len(batch) >= batch_size:
+                SemesterGPA.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            SemesterGPA.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
+
+def recompute_semesters(keys):
+    """
+    نعيد حساب عدة صفوف (طالب، سمستر، سنة) باستعلام تجميع واحد ثم upsert واحد،
+    وهذا ما تستخدمه مسارات الرصد الجماعي بدل التحديث مع كل درجة.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    student_ids = {k[0] for k in keys}
+    invalidate(student_ids)
+    totals = {key: (0.0, 0, 0) for key in keys}
+    rows = GradeRecord.objects.filter(student_id__in=student_ids, grade__isnull=False)\
+        .values('student_id', 'semester', 'year')\
+        .annotate(points=_points_expression(), hours=Sum('material__hours'), count=Count('id'))\
+        .order_by()
+    for row in rows:
+        key = (row['student_id'], row['semester'], row['year'])
+        if key in totals:
+            totals[key] = (row['points'] or 0, row['hours'] or 0, row['count'])
+
+    SemesterGPA.objects.bulk_create(
+        [
+            SemesterGPA(student_id=student_id, semester=semester, year=year,
+                        total_points=points, total_hours=hours, grades_count=count)
+            for (student_id, semester, year), (points, hours, count) in totals.items()
+            if semester is not None and year is not None
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'semester', 'year'],
+        update_fields=['total_points', 'total_hours', 'grades_count'],
+    )
+    # ON CONFLICT لا يطابق NULL، فصفوف السمستر أو السنة الفارغة بمطابقة IS NULL
+    for (student_id, semester, year), (points, hours, count) in totals.items():
+        if semester is None or year is None:
+            SemesterGPA.objects.update_or_create(
+                student_id=student_id, semester=semester, year=year,
+                defaults={'total_points': points, 'total_hours': hours, 'grades_count': count},
+            )
+
+
+def _stored_gpa_expressions():
+    """معدل السمستر والتراكمي لكل سجل درجة كاستعلامات فرعية على semester_gpas (نفس تقريب from_totals)"""
+    def ratio(points, hours):
+        return Case(
+            When(**{f'{hours}__gt': 0}, then=Round(
+                ExpressionWrapper(F(points) * 1.0 / F(hours), output_field=FloatField()), 2,
+            )),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    # مقارنة السمستر والسنة بعد Coalesce حتى يطابق السجل بلا سمستر صف ملخصه (NULL = NULL)
+    semester = SemesterGPA.objects.filter(student_id=OuterRef('student_id'))\
+        .alias(term_semester=Coalesce('semester', Value('')), term_year=Coalesce('year', Value('')))\
+        .filter(term_semester=Coalesce(OuterRef('semester'), Value('')),
+                term_year=Coalesce(OuterRef('year'), Value('')))\
+        .annotate(value=ratio('total_points', 'total_hours')).values('value')[:1]
+    cumulative = SemesterGPA.objects.filter(student_id=OuterRef('student_id'))\
+        .values('student_id').annotate(points=Sum('total_points'), hours=Sum('total_hours'))\
+        .annotate(value=ratio('points', 'hours')).values('value')[:1]
+    return {
+        'semester_gpa': Coalesce(Subquery(semester), Value(0.0)),
+        'cumulative_gpa': Coalesce(Subquery(cumulative), Value(0.0)),
+    }
+
+
+def refresh_stored_gpas(student_ids=None, keys=None, chunk_size=REFRESH_CHUNK_SIZE):
+    """
+    نحدّث حقلي semester_gpa و cumulative_gpa المخزنين في سجلات الدرجات من جدول الملخص،
+    بأمر UPDATE واحد لكل دفعة طلاب بدل تحديث لكل (طالب، سمستر).
+    student_ids: قائمة أو queryset (يصير استعلامًا فرعيًا في أمر واحد)؛ keys: (طالب، سمستر، سنة)
+    وتُحدّث كل سجلات طلابها لأن المعدل التراكمي يتغير في كل سمستراتهم.
+    """
+    if keys is not None:
+        student_ids = sorted({k[0] for k in keys})
+
+    values = _stored_gpa_expressions()
+    if student_ids is None:
+        return GradeRecord.objects.update(**values)
+    if not isinstance(student_ids, (list, tuple, set)):
+        return GradeRecord.objects.filter(student_id__in=student_ids).update(**values)
+
+    student_ids = list(student_ids)
+    updated = 0
+    for offset in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[offset:offset + chunk_size]
+        updated += GradeRecord.objects.filter(student_id__in=chunk).update(**values)
+    return updated
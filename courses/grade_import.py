@@ -0,0 +1,243 @@
+"""
+استيراد الدرجات من ملف CSV أو XLSX
+
+نقرأ الملف سطرًا بسطر ونعالجه على دفعات، فتبقى الذاكرة ثابتة مهما كبر الملف.
+الطلاب والمواد نحمّلهم مرة واحدة في قواميس بحث (استعلام لكل جدول)، وكل دفعة تُكتب
+بعمليتي upsert (التنزيلات والدرجات) ثم نعيد حساب المعدلات للسمسترات المتأثرة فقط.
+"""
+import codecs
+import csv
+import io
+import zipfile
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from courses import grading
+from courses.models import Enrollment, GradeRecord, Material, Student
+
+COLUMNS = ('id_student', 'material_code', 'semester', 'year', 'grade')
+
+# أسماء بديلة مقبولة في رأس الملف
+COLUMN_ALIASES = {
+    'student_id': 'id_student',
+    'code': 'material_code',
+    'material': 'material_code',
+}
+
+
+# ملفات CSV العربية من Excel على Windows تُحفظ غالبًا بـ cp1256 وليس UTF-8
+CSV_ENCODINGS = ('utf-8-sig', 'cp1256')
+
+
+class GradeImportError(Exception):
+    """خطأ يمنع قراءة الملف كله (صيغة غير مدعومة أو أعمدة ناقصة أو ملف تالف)"""
+
+
+@dataclass
+class ImportReport:
+    total_rows: int = 0
+    imported: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)  # [(رقم السطر، الرسالة)]
+    max_errors: int = 500
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        # نحتفظ بعدد محدود من الرسائل حتى لا تكبر الذاكرة مع الملفات الكبيرة
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_no, message))
+
+
+def _normalize_header(header):
+    names = []
+    for name in header:
+        name = str(name or '').strip().lower()
+        names.append(COLUMN_ALIASES.get(name, name))
+    missing = [c for c in COLUMNS if c not in names]
+    if missing:
+        raise GradeImportError(f"أعمدة ناقصة في الملف: {', '.join(missing)}")
+    return names
+
+
+def _scan_csv(fileobj, encoding):
+    """يفك ويقرأ الملف كله بدون حفظ شيء؛ يرفع UnicodeDecodeError أو csv.Error"""
+    for _row in csv.reader(codecs.getreader(encoding)(fileobj)):
+        pass
+
+
+def _detect_encoding(fileobj):
+    """
+    أول ترميز يقرأ الملف كله بلا أخطاء. نفحص الملف قبل كتابة أي دفعة، فالملف التالف
+    يُرفض كاملًا بدل أن يُحفظ نصفه. الملف غير القابل للرجوع (seek) يُقرأ UTF-8 مباشرة.
+    """
+    if not getattr(fileobj, 'seekable', lambda: False)():
+        return CSV_ENCODINGS[0]
+    start = fileobj.tell()
+    try:
+        for encoding in CSV_ENCODINGS:
+            fileobj.seek(start)
+            try:
+                _scan_csv(fileobj, encoding)
+            except UnicodeDecodeError:
+                continue
+            except csv.Error as exc:
+                raise GradeImportError(f"ملف CSV تالف: {exc}")
+            return encoding
+    finally:
+        fileobj.seek(start)
+    raise GradeImportError("ترميز الملف غير مدعوم، احفظه بترميز UTF-8")
+
+
+def _iter_csv(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding=_detect_encoding(fileobj), newline='')
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+        if header is None:
+            return
+        names = _normalize_header(header)
+        for line_no, row in enumerate(reader, start=2):
+            if any(cell.strip() for cell in row):
+                yield line_no, dict(zip(names, row))
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise GradeImportError(f"تعذرت قراءة الملف عند السطر {reader.line_num}: {exc}")
+
+
+def _iter_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise GradeImportError("قراءة ملفات XLSX تحتاج مكتبة openpyxl (pip install openpyxl)")
+
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # ملف تالف أو ليس XLSX: الـ zip أو الـ XML بداخله لا يُقرأ
+    corrupt = (zipfile.BadZipFile, InvalidFileException, KeyError, ValueError, SyntaxError, EOFError)
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except corrupt as exc:
+        raise GradeImportError(f"ملف XLSX تالف أو غير صالح: {exc}")
+    line_no = 1
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = _normalize_header(header)
+        for line_no, row in enumerate(rows, start=2):
+            if any(cell not in (None, '') for cell in row):
+                yield line_no, dict(zip(names, row))
+    except corrupt as exc:
+        raise GradeImportError(f"تعذرت قراءة الملف بعد السطر {line_no}: {exc}")
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename):
+    """يرجع (رقم السطر، قاموس القيم) لكل سطر حسب امتداد الملف"""
+    name = (filename or '').lower()
+    if name.endswith('.xlsx'):
+        return _iter_xlsx(fileobj)
+    if name.endswith('.csv') or name.endswith('.txt'):
+        return _iter_csv(fileobj)
+    raise GradeImportError("صيغة الملف غير مدعومة، استخدم CSV أو XLSX")
+
+
+def _cell_text(value):
+    """قيم Excel الرقمية تأتي float (2025.0)، نحولها لنص بدون كسور"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_row(row, student_ids, materials):
+    student_text = _cell_text(row.get('id_student'))
+    if not student_text.isdigit():
+        raise ValueError("رقم القيد غير صالح")
+    student_id = int(student_text)
+    if student_id not in student_ids:
+        raise ValueError(f"رقم القيد {student_id} غير موجود")
+
+    code = _cell_text(row.get('material_code'))
+    if code not in materials:
+        raise ValueError(f"رمز المادة {code or '-'} غير موجود")
+
+    semester = _cell_text(row.get('semester'))
+    year = _cell_text(row.get('year'))
+    if not semester or len(semester) > 20:
+        raise ValueError("السمستر مطلوب (20 حرفًا كحد أقصى)")
+    if not year or len(year) > 10:
+        raise ValueError("السنة مطلوبة (10 أحرف كحد أقصى)")
+
+    grade = grading.parse_grade(_cell_text(row.get('grade')))
+    if grade is None:
+        raise ValueError("الدرجة مطلوبة")
+    return student_id, materials[code], semester, year, grade
+
+
+def _write_chunk(rows):
+    """rows: {(طالب، مادة، سمستر، سنة): درجة}"""
+    with transaction.atomic():
+        Enrollment.objects.bulk_create(
+            [
+                Enrollment(student_id=s, material_id=m, semester=sem, year=y, grade=g)
+                for (s, m, sem, y), g in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['student', 'material', 'semester', 'year'],
+            update_fields=['grade'],
+        )
+        grading.upsert_grade_records([
+            GradeRecord(student_id=s, material_id=m, semester=sem, year=y, grade=g)
+            for (s, m, sem, y), g in rows.items()
+        ])
+        grading.refresh_gpas((s, sem, y) for (s, m, sem, y) in rows)
+
+
+def import_grades(fileobj, filename, chunk_size=1000, max_errors=500, progress=None):
+    """
+    تستورد الدرجات وترجع ImportReport بعدد الأسطر والأخطاء.
+    الأسطر الخاطئة تُتجاهل وتُسجّل، والأسطر الصحيحة تُحفظ دفعة بعد دفعة.
+    """
+    report = ImportReport(max_errors=max_errors)
+    rows = iter_rows(fileobj, filename)
+
+    # قواميس البحث: استعلام واحد للطلاب وواحد للمواد
+    student_ids = set(Student.objects.values_list('id_student', flat=True))
+    materials = dict(Material.objects.values_list('code', 'id'))
+
+    chunk = {}
+    try:
+        for line_no, row in rows:
+            report.total_rows += 1
+            try:
+                student_id, material_id, semester, year, grade = _parse_row(row, student_ids, materials)
+            except ValueError as exc:
+                report.add_error(line_no, str(exc))
+                continue
+
+            # لو تكرر نفس السجل في الملف نأخذ آخر قيمة
+            chunk[(student_id, material_id, semester, year)] = grade
+            if len(chunk) >= chunk_size:
+                _write_chunk(chunk)
+                report.imported += len(chunk)
+                chunk = {}
+                if progress:
+                    progress(report)
+    except GradeImportError as exc:
+        if report.imported:
+            raise GradeImportError(f"{exc} (حُفظت {report.imported} درجة قبل الخطأ)")
+        raise
+
+    if chunk:
+        _write_chunk(chunk)
+        report.imported += len(chunk)
+        if progress:
+            progress(report)
+    return report
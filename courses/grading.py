@@ -0,0 +1,136 @@
+"""
+خدمة رصد الدرجات الجماعي
+
+نتحقق من كل درجات النموذج أولًا، ثم نكتبها كلها بعملية upsert واحدة داخل transaction
+ونعيد حساب المعدلات مرة واحدة لكل سمستر متأثر بدل مرة لكل مادة.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from courses import gpa, metrics
+from courses.models import Enrollment, GradeRecord
+
+MIN_GRADE = 0
+MAX_GRADE = 100
+PASS_GRADE = 50  # أقل درجة نجاح في المادة
+
+GRADE_UNIQUE_FIELDS = ['student', 'material', 'semester', 'year']
+
+
+class GradeValidationError(ValueError):
+    """ترفع عندما تحتوي درجة أو أكثر على قيمة غير صالحة، مع رسالة لكل حقل"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{key}: {msg}" for key, msg in errors.items()))
+
+
+def parse_grade(value):
+    """تحوّل قيمة الدرجة من النموذج إلى رقم، أو None إذا كانت فارغة"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        grade = float(value)
+    except ValueError:
+        raise ValueError("الدرجة يجب أن تكون رقمًا")
+    if not MIN_GRADE <= grade <= MAX_GRADE:
+        raise ValueError(f"الدرجة يجب أن تكون بين {MIN_GRADE} و {MAX_GRADE}")
+    return grade
+
+
+def has_term(record):
+    """ON CONFLICT في Postgres لا يطابق NULL، فالسجل بلا سمستر أو سنة لا يدخل الـ upsert"""
+    return record.semester is not None and record.year is not None
+
+
+def upsert_grade_records(records):
+    """
+    نكتب سجلات الدرجات دفعة واحدة ونحدّث الدرجة إذا كان السجل موجودًا.
+    السجلات بلا سمستر أو سنة (بيانات قديمة) تُحدّث بمطابقة IS NULL ثم تُنشأ إذا لم توجد.
+    """
+    keyed = [r for r in records if has_term(r)]
+    if keyed:
+        GradeRecord.objects.bulk_create(
+            keyed,
+            update_conflicts=True,
+            unique_fields=GRADE_UNIQUE_FIELDS,
+            update_fields=['grade'],
+        )
+    for record in records:
+        if has_term(record):
+            continue
+        updated = GradeRecord.objects.filter(
+            student_id=record.student_id, material_id=record.material_id,
+            semester=record.semester, year=record.year,
+        ).update(grade=record.grade)
+        if not updated:
+            GradeRecord.objects.bulk_create([record])
+    count = len(records)
+    transaction.on_commit(lambda: metrics.inc('grades_written_total', {'source': 'bulk'}, count))
+
+
+def refresh_gpas(keys):
+    """إعادة حساب المعدلات مرة واحدة لكل (طالب، سمستر، سنة) متأثر"""
+    keys = set(keys)
+    gpa.recompute_semesters(keys)
+    gpa.refresh_stored_gpas(keys=keys)
+
+
+def submit_grades(student, grades, clear_blank=False):
+    """
+    ترصد درجات طالب واحد.
+    grades: قاموس {رقم التنزيل (enrollment id): قيمة الدرجة من النموذج}.
+    clear_blank: الحقل الفارغ يحذف الدرجة المرصودة بدل تجاهله (صفحة تفاصيل الطالب).
+    ترجع عدد الدرجات المحفوظة، وترفع GradeValidationError بدون حفظ أي شيء إذا فشل التحقق.
+    """
+    enrollments = Enrollment.objects.filter(student=student, id__in=list(grades))\
+        .only('id', 'material_id', 'semester', 'year', 'grade')
+
+    errors = {}
+    records = []
+    graded = []
+    cleared = []
+    for enrollment in enrollments:
+        try:
+            grade = parse_grade(grades.get(enrollment.id))
+        except ValueError as exc:
+            errors[enrollment.id] = str(exc)
+            continue
+        if grade is None:
+            if clear_blank:
+                enrollment.grade = None
+                cleared.append(enrollment)
+            continue
+        enrollment.grade = grade
+        graded.append(enrollment)
+        records.append(GradeRecord(
+            student_id=student.pk,
+            material_id=enrollment.material_id,
+            semester=enrollment.semester,
+            year=enrollment.year,
+            grade=grade,
+        ))
+
+    if errors:
+        raise GradeValidationError(errors)
+    if not records and not cleared:
+        return 0
+
+    with transaction.atomic():
+        if records:
+            upsert_grade_records(records)
+        if cleared:
+            removed = Q()
+            for e in cleared:
+                removed |= Q(material_id=e.material_id, semester=e.semester, year=e.year)
+            GradeRecord.objects.filter(removed, student_id=student.pk).delete()
+        # GradeRecord هو المصدر، وعمود Enrollment.grade نسخة له للصفحات القديمة
+        Enrollment.objects.bulk_update(graded + cleared, ['grade'])
+        refresh_gpas(
+            [(r.student_id, r.semester, r.year) for r in records]
+            + [(student.pk, e.semester, e.year) for e in cleared]
+        )
+    return len(records)
@@ -0,0 +1,228 @@
+"""
+قياس الاستعلامات والزمن لكل طلب
+
+InstrumentationMiddleware يسجل لكل طلب: عدد استعلامات SQL وزمنها الكلي، والاستعلامات
+المكررة (نفس البصمة بعد حذف القيم، وهي علامة N+1)، وزمن رسم القالب والزمن الكلي، ثم:
+- يجمعها لكل اسم رابط (url name) في هذه العملية، وتعرضها صفحة التشخيص للإداريين.
+- يضيفها لمقاييس Prometheus (courses.metrics) التي يعرضها رابط /metrics.
+- يكتب سطر JSON في السجل courses.instrumentation (ملف logs/requests.log حسب LOGGING).
+- يقارن عدد الاستعلامات بحد الصفحة في QUERY_BUDGETS؛ التجاوز تحذير في السجل، ومع
+  QUERY_BUDGETS_ENFORCE (في الاختبارات و CI) يرفع QueryBudgetExceeded فيفشل الطلب.
+
+الاستعلامات تُلتقط بـ connection.execute_wrapper فتعمل مع DEBUG=False. استعلامات الردود
+المتدفقة (التصدير) تُنفذ بعد خروج الرد من الـ middleware فلا تُحسب. زمن رسم القوالب يقيسه
+محرك القوالب TimedDjangoTemplates (في TEMPLATES) بدل تعديل Template.render.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from courses import metrics
+
+logger = logging.getLogger(__name__)
+
+TOP_DUPLICATES = 5
+SLOW_REQUEST_MS = 1000
+
+_current = contextvars.ContextVar('instrumentation_profile', default=None)
+_lock = threading.Lock()
+_stats = {}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """عدد استعلامات الصفحة تجاوز حدها في QUERY_BUDGETS"""
+
+
+@dataclass
+class RequestProfile:
+    url_name: str = ''
+    method: str = ''
+    status: int = 0
+    queries: int = 0
+    db_ms: float = 0.0
+    render_ms: float = 0.0
+    total_ms: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+    aliases: Counter = field(default_factory=Counter)   # الاستعلامات لكل قاعدة (default / replica)
+    _render_depth: int = 0
+
+    @property
+    def duplicates(self):
+        """[(البصمة، العدد)] للاستعلامات التي تكررت، الأكثر أولًا"""
+        return [(sql, count) for sql, count in self.fingerprints.most_common(TOP_DUPLICATES) if count > 1]
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+
+def fingerprint(sql):
+    """نص الاستعلام بدون القيم، حتى يتطابق نفس الاستعلام بمعاملات مختلفة"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def budget_for(url_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.queries += 1
+            profile.db_ms += (time.perf_counter() - started) * 1000
+            profile.fingerprints[fingerprint(sql)] += 1
+            profile.aliases[context['connection'].alias] += 1
+
+
+class TimedTemplate(Template):
+    """قالب يضيف زمن رسمه (المستوى الأعلى فقط) للطلب الحالي"""
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        profile._render_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile._render_depth -= 1
+            if profile._render_depth == 0:
+                profile.render_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """محرك DjangoTemplates نفسه، لكن قوالبه TimedTemplate"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _aggregate(profile, over_budget):
+    with _lock:
+        row = _stats.setdefault(profile.url_name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'render_ms': 0.0,
+            'total_ms': 0.0, 'max_ms': 0.0, 'duplicate_queries': 0, 'over_budget': 0,
+            'duplicates': Counter(),
+        })
+        row['requests'] += 1
+        row['queries'] += profile.queries
+        row['max_queries'] = max(row['max_queries'], profile.queries)
+        row['db_ms'] += profile.db_ms
+        row['render_ms'] += profile.render_ms
+        row['total_ms'] += profile.total_ms
+        row['max_ms'] = max(row['max_ms'], profile.total_ms)
+        row['duplicate_queries'] += profile.duplicate_queries
+        row['over_budget'] += over_budget
+        for sql, count in profile.duplicates:
+            row['duplicates'][sql] = max(row['duplicates'][sql], count)
+
+
+def _log(profile, budget):
+    over_budget = budget is not None and profile.queries > budget
+    level = logging.WARNING if over_budget or profile.total_ms >= SLOW_REQUEST_MS else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, json.dumps({
+        'url_name': profile.url_name,
+        'method': profile.method,
+        'status': profile.status,
+        'queries': profile.queries,
+        'budget': budget,
+        'db_ms': round(profile.db_ms, 2),
+        'render_ms': round(profile.render_ms, 2),
+        'total_ms': round(profile.total_ms, 2),
+        'duplicates': [{'sql': sql, 'count': count} for sql, count in profile.duplicates],
+    }, ensure_ascii=False))
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile(method=request.method)
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        profile.total_ms = (time.perf_counter() - started) * 1000
+        profile.status = response.status_code
+
+        match = getattr(request, 'resolver_match', None)
+        profile.url_name = (match.view_name if match else '') or '<unresolved>'
+
+        budget = budget_for(profile.url_name)
+        over_budget = budget is not None and profile.queries > budget
+        _aggregate(profile, over_budget)
+        metrics.observe_request(profile)
+        _log(profile, budget)
+        if over_budget and getattr(settings, 'QUERY_BUDGETS_ENFORCE', False):
+            raise QueryBudgetExceeded(
+                f"{profile.url_name}: {profile.queries} استعلام والحد {budget} "
+                f"(المكرر: {profile.duplicates[:1]})"
+            )
+        return response
+
+
+def snapshot():
+    """إحصاءات كل صفحة في هذه العملية، الأكثر استعلامات في المتوسط أولًا"""
+    rows = []
+    with _lock:
+        for url_name, row in _stats.items():
+            requests = row['requests']
+            rows.append({
+                'url_name': url_name,
+                'requests': requests,
+                'avg_queries': round(row['queries'] / requests, 1),
+                'max_queries': row['max_queries'],
+                'budget': budget_for(url_name),
+                'over_budget': row['over_budget'],
+                'avg_db_ms': round(row['db_ms'] / requests, 1),
+                'avg_render_ms': round(row['render_ms'] / requests, 1),
+                'avg_ms': round(row['total_ms'] / requests, 1),
+                'max_ms': round(row['max_ms'], 1),
+                'duplicate_queries': row['duplicate_queries'],
+                'duplicates': row['duplicates'].most_common(TOP_DUPLICATES),
+            })
+    rows.sort(key=lambda r: r['avg_queries'], reverse=True)
+    return rows
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,18 @@
+"""
+معالجات السجلات
+
+RotatingFileHandler ينشئ مجلد الملف عند أول سطر فقط، حتى لا يكتب استيراد الإعدادات على
+القرص (manage.py و collectstatic وغيرهما) ولا يفشل إذا لم يوجد المجلد بعد.
+"""
+import logging.handlers
+import os
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def __init__(self, filename, *args, **kwargs):
+        kwargs['delay'] = True
+        super().__init__(filename, *args, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
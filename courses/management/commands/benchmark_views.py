@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.benchmarks import BenchmarkError, budget_violations, compare, run
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس زمن وعدد استعلامات وذروة ذاكرة كل صفحات الإدارة، مع حفظ النتيجة JSON "
+        "ومقارنتها بخط أساس سابق وبحدود QUERY_BUDGETS (يفشل الأمر عند وجود تراجع أو تجاوز)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="عدد مرات قياس الزمن لكل صفحة")
+        parser.add_argument('--warm', action='store_true', help="عدم مسح الكاش بين الطلبات")
+        parser.add_argument('--only', help="أسماء الحالات مفصولة بفواصل")
+        parser.add_argument('--user', help="اسم المستخدم الإداري (افتراضيًا أول مدير)")
+        parser.add_argument('--output', help="حفظ النتيجة في ملف JSON (خط أساس جديد)")
+        parser.add_argument('--baseline', help="ملف JSON سابق للمقارنة")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="نسبة الزيادة المسموحة في الزمن والذاكرة")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"لا يمكن قراءة خط الأساس: {exc}")
+
+        only = {name.strip() for name in options['only'].split(',') if name.strip()} if options['only'] else None
+
+        self.stdout.write(f"{'الصفحة':<32} {'الحالة':>6} {'وسيط(ms)':>10} {'أعلى(ms)':>10} {'استعلامات':>10} {'ذاكرة(KB)':>10}")
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name:<32} {result['status']:>6} {result['median_ms']:>10.1f} {result['max_ms']:>10.1f} "
+                f"{result['queries']:>10} {result['peak_kb']:>10.0f}"
+            )
+
+        try:
+            results = run(
+                repeat=options['repeat'], cold=not options['warm'], only=only,
+                username=options['user'], progress=progress,
+            )
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"تم حفظ النتيجة في {options['output']}"))
+
+        failures = budget_violations(results)
+        if baseline is not None:
+            regressions, notes = compare(results, baseline, options['tolerance'])
+            for note in notes:
+                self.stdout.write(self.style.WARNING(note))
+            failures += regressions
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f"{len(failures)} تراجع أو تجاوز لحد الاستعلامات")
+        self.stdout.write(self.style.SUCCESS("لا توجد تراجعات ولا تجاوزات لحدود الاستعلامات"))
@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.urls import reverse
+
+from courses.benchmarks import BenchmarkError, server_name, staff_client
+
+# اسم الوضع: تعديلات إعدادات الاتصال
+MODES = {
+    'none': {'CONN_MAX_AGE': 0},            # اتصال جديد لكل طلب (الوضع القديم)
+    'persistent': {'CONN_MAX_AGE': 600},    # اتصال دائم لكل thread مع فحص الصحة
+    'pool': {'CONN_MAX_AGE': 0, 'pool': True},  # pool الخاص بـ psycopg (Django 5.1+)
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "مقارنة عدد الطلبات في الثانية بين اتصال جديد لكل طلب والاتصالات الدائمة والـ pool. "
+        "الطلبات تمر بمعالج WSGI كاملًا (مع إشارات بداية ونهاية الطلب التي تغلق الاتصالات) "
+        "من عدة threads كعمليات gunicorn. يُشغّل على Postgres محلي."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="عدد الطلبات لكل وضع")
+        parser.add_argument('--threads', type=int, default=8, help="عدد الطلبات المتزامنة")
+        parser.add_argument('--modes', default='none,persistent,pool', help="الأوضاع مفصولة بفواصل")
+        parser.add_argument('--url', help="الرابط المطلوب (افتراضيًا بحث المواد السريع)")
+        parser.add_argument('--user', help="اسم المستخدم الإداري (افتراضيًا أول مدير)")
+        parser.add_argument('--database', default='default', help="اسم قاعدة البيانات في DATABASES")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in MODES]
+        if unknown:
+            raise CommandError(f"أوضاع غير معروفة: {', '.join(unknown)} (المتاح: {', '.join(MODES)})")
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError("عدد الطلبات والـ threads يجب أن يكون 1 على الأقل")
+
+        alias = options['database']
+        if connections[alias].vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING("قاعدة البيانات ليست Postgres؛ الأرقام لا تمثل كلفة الاتصال الحقيقية"))
+
+        try:
+            cookie = '; '.join(f"{key}={morsel.value}" for key, morsel in staff_client(options['user']).cookies.items())
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+        url = options['url'] or f"{reverse('material_autocomplete')}?q=a"
+        handler = WSGIHandler()
+
+        self.stdout.write(f"{'الوضع':<12} {'طلب/ث':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'اتصالات':>8} {'أخطاء':>6}")
+        for mode in modes:
+            if mode == 'pool' and not settings.DB_POOL_SUPPORTED:
+                self.stdout.write(self.style.WARNING("pool: يتطلب Django 5.1 أو أحدث، تم تخطيه"))
+                continue
+            result = self._run(handler, alias, mode, url, cookie, options['requests'], options['threads'])
+            self.stdout.write(
+                f"{mode:<12} {result['rps']:>8.1f} {result['p50']:>9.1f} {result['p95']:>9.1f} "
+                f"{result['connections']:>8} {result['errors']:>6}"
+            )
+
+    def _run(self, handler, alias, mode, url, cookie, total, threads):
+        db_settings = connections.settings[alias]
+        saved = {'CONN_MAX_AGE': db_settings.get('CONN_MAX_AGE', 0), 'OPTIONS': db_settings.get('OPTIONS', {})}
+        changes = dict(MODES[mode])
+        pool = changes.pop('pool', False)
+        db_settings.update(changes)
+        db_settings['OPTIONS'] = {**saved['OPTIONS'], **({'pool': True} if pool else {})}
+        connections.close_all()
+
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                with lock:
+                    opened.append(1)
+
+        factory = RequestFactory(SERVER_NAME=server_name(), HTTP_COOKIE=cookie)
+        path, _, query = url.partition('?')
+
+        def worker(count):
+            latencies, errors = [], 0
+            try:
+                for _ in range(count):
+                    environ = factory.get(path, QUERY_STRING=query).environ
+                    started = time.perf_counter()
+                    status = []
+                    response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+                    try:
+                        for _chunk in response:
+                            pass
+                    finally:
+                        response.close()  # request_finished: هنا يُغلق الاتصال أو يبقى حسب الوضع
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    errors += not status or not status[0].startswith('200')
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        per_thread = [total // threads + (i < total % threads) for i in range(threads)]
+        connection_created.connect(count_connection, weak=False)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool_executor:
+                results = list(pool_executor.map(worker, [n for n in per_thread if n]))
+        finally:
+            elapsed = time.perf_counter() - started
+            connection_created.disconnect(count_connection)
+            db_settings.update(saved)
+            connections.close_all()
+
+        latencies = sorted(value for thread_latencies, _ in results for value in thread_latencies)
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[max(0, int(len(latencies) * 0.95) - 1)],
+            'connections': len(opened),
+            'errors': sum(errors for _, errors in results),
+        }
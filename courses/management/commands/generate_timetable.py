@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import database, scheduling
+
+
+class Command(BaseCommand):
+    help = (
+        "توليد جدول المحاضرات آليًا لمجموعات السمستر الحالي: قاعة لكل محاضرة بدون تعارض "
+        "في القاعات أو المجموعات أو بين المواد التي يشترك فيها نفس الطلاب"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', help="القاعات وسعاتها: \"A101:40,B2:120\" (افتراضيًا قاعات الجدول الحالي)")
+        parser.add_argument('--semester')
+        parser.add_argument('--year')
+        parser.add_argument('--restarts', type=int, default=4)
+        parser.add_argument('--workers', type=int, default=0, help="عدد العمليات (0 = عدد المعالجات)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--time-limit', type=float, default=30.0, help="أقصى زمن للتوليد كله بالثواني")
+        parser.add_argument('--apply', action='store_true', help="حفظ الجدول بدل محاضرات المواد المجدولة")
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        try:
+            rooms = scheduling.parse_rooms(options['rooms']) if options['rooms'] else None
+            problem = scheduling.build_problem(rooms, options['semester'], options['year'])
+        except scheduling.SchedulingError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            f"{len(problem.sessions)} محاضرة، {len(problem.rooms)} قاعة، {problem.conflict_pairs} زوج متعارض"
+        )
+        solution = scheduling.solve(
+            problem, restarts=options['restarts'], workers=options['workers'],
+            seed=options['seed'], time_limit=options['time_limit'],
+        )
+        self.stdout.write(
+            f"أفضل حل (بذرة {solution.seed}): {solution.violations} تعارض، "
+            f"{solution.spread_penalty} تكرار في نفس اليوم، {solution.total_elapsed:.2f} ثانية"
+        )
+
+        if not solution.feasible:
+            raise CommandError("لم يتم إيجاد جدول بدون تعارض؛ جرّب قاعات أكثر أو محاولات أكثر")
+        if options['apply']:
+            written = scheduling.apply_solution(problem, solution)
+            self.stdout.write(self.style.SUCCESS(f"تم حفظ {written} محاضرة"))
+        else:
+            for row in scheduling.assignments(problem, solution):
+                self.stdout.write(f"{row['day']}/{row['time']}  {row['room']}  مادة {row['material_id']} مجموعة {row['group']}")
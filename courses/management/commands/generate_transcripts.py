@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import database
+from courses.pdf_transcripts import BATCH_SIZE, TranscriptRenderError, generate_transcripts
+
+
+class Command(BaseCommand):
+    help = "توليد كشوف الدرجات الرسمية PDF لقسم أو سنة أو طلاب محددين، في ملف zip أو مجلد"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="ملف .zip أو مسار مجلد")
+        parser.add_argument('--section', type=int)
+        parser.add_argument('--year')
+        parser.add_argument('--students', help="أرقام قيد مفصولة بفواصل")
+        parser.add_argument('--workers', type=int, default=0, help="عدد العمليات (0 = عدد المعالجات)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        student_ids = None
+        if options['students']:
+            try:
+                student_ids = [int(s) for s in options['students'].split(',') if s.strip()]
+            except ValueError:
+                raise CommandError("أرقام القيد يجب أن تكون أرقامًا")
+
+        def progress(stats):
+            self.stdout.write(f"... {stats.transcripts} كشف ({stats.per_second:.1f} كشف/ثانية)")
+
+        try:
+            stats = generate_transcripts(
+                options['output'], section_id=options['section'], year=options['year'],
+                student_ids=student_ids, workers=options['workers'], batch_size=options['batch_size'],
+                progress=progress,
+            )
+        except TranscriptRenderError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"تم توليد {stats.transcripts} كشف في {stats.elapsed:.1f} ثانية "
+            f"({stats.per_second:.1f} كشف/ثانية، {stats.bytes_written / 1024 / 1024:.1f} MB)"
+        ))
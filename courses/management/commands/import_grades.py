@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import database
+from courses.grade_import import GradeImportError, import_grades
+
+
+class Command(BaseCommand):
+    help = "استيراد الدرجات من ملف CSV أو XLSX (id_student, material_code, semester, year, grade)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=500, help="أقصى عدد لرسائل الأخطاء المعروضة")
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        path = options['path']
+
+        def progress(report):
+            self.stdout.write(f"... {report.total_rows} سطر، {report.imported} محفوظ، {report.error_count} خطأ")
+
+        try:
+            with open(path, 'rb') as f:
+                report = import_grades(
+                    f, path,
+                    chunk_size=options['chunk_size'],
+                    max_errors=options['max_errors'],
+                    progress=progress,
+                )
+        except (OSError, GradeImportError) as exc:
+            raise CommandError(str(exc))
+
+        for line_no, message in report.errors:
+            self.stderr.write(f"سطر {line_no}: {message}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... و {report.error_count - len(report.errors)} خطأ آخر")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"تم استيراد {report.imported} درجة من {report.total_rows} سطر ({report.error_count} خطأ)"
+        ))
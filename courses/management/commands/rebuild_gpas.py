@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from courses import database, gpa
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء جدول ملخص المعدلات (semester_gpas) من سجلات الدرجات"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--refresh-records', action='store_true',
+            help="تحديث حقلي semester_gpa و cumulative_gpa في grade_records أيضًا",
+        )
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        created = gpa.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"تم بناء {created} صف في ملخص المعدلات"))
+
+        if options['refresh_records']:
+            updated = gpa.refresh_stored_gpas()
+            self.stdout.write(self.style.SUCCESS(f"تم تحديث {updated} سجل درجة"))
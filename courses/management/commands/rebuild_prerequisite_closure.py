@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses import database, prerequisites
+from courses.models import MaterialPrerequisiteClosure
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء جدول الأسبقيات المتعدية (material_prerequisite_closure) من جدول الأسبقيات"
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        prerequisites.rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(
+            f"تم بناء {MaterialPrerequisiteClosure.objects.count()} صف في جدول الأسبقيات المتعدية"
+        ))
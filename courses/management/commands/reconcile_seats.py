@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from courses import database, registration
+from courses.enrollment import current_term
+
+
+class Command(BaseCommand):
+    help = (
+        "إعادة حساب المقاعد المحجوزة (seats_taken) في كل مجموعات المحاضرات من تنزيلات السمستر، "
+        "إذا حُذفت تنزيلات دون تحرير مقاعدها"
+    )
+
+    def add_arguments(self, parser):
+        semester, year = current_term()
+        parser.add_argument('--semester', default=semester, help=f"افتراضيًا السمستر الحالي ({semester})")
+        parser.add_argument('--year', default=year)
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        changed = registration.reconcile_seats(options['semester'], options['year'])
+        for lecture_group, old, new in changed:
+            self.stdout.write(f"{lecture_group}: {old} ← {new}")
+        self.stdout.write(self.style.SUCCESS(f"تم تصحيح {len(changed)} مجموعة"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from courses import database, reports
+
+
+class Command(BaseCommand):
+    help = "إعادة بناء جداول التقارير (report_*) من التنزيلات والدرجات؛ يُشغّل دوريًا من cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int,
+            help="لا تحدّث إذا كان آخر تحديث أحدث من هذا العدد من الدقائق",
+        )
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        if options['max_age'] is not None and not reports.is_stale(options['max_age']):
+            self.stdout.write(f"التقارير محدّثة ({reports.last_refresh()})")
+            return
+
+        refresh = reports.refresh_reports()
+        self.stdout.write(self.style.SUCCESS(
+            f"تم تحديث التقارير: {refresh.rows} صف في {refresh.duration:.2f} ثانية"
+        ))
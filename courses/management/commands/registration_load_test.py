@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+
+from courses import registration
+from courses.models import Enrollment, LectureGroup, Material, Section, Student, WaitlistEntry
+
+LOADTEST_CODE = 'LOADTEST'
+RESERVED_CONNECTIONS = 5   # اتصال الأمر نفسه واتصالات المدير المحجوزة في Postgres
+
+
+class Command(BaseCommand):
+    help = (
+        "اختبار حمل لحجز المقاعد: عدد كبير من الطلبات المتزامنة على مجموعة واحدة، "
+        "يتأكد من عدم الحجز الزائد ويعرض زمن الاستجابة (p50/p95/p99). يُشغّل على Postgres محلي. "
+        "كل طلب متزامن يفتح اتصالًا، فيجب أن يبقى --concurrency أقل من max_connections "
+        "(100 افتراضيًا)، أو ارفع max_connections في postgresql.conf."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="عدد الطلاب (الطلبات)")
+        parser.add_argument(
+            '--concurrency', type=int, default=80,
+            help="عدد الطلبات المتزامنة (اتصال لكل طلب، أقل من max_connections)",
+        )
+        parser.add_argument('--capacity', type=int, default=100, help="سعة المجموعة")
+        parser.add_argument('--keep', action='store_true', help="عدم حذف بيانات الاختبار بعد الانتهاء")
+
+    def handle(self, *args, **options):
+        self._check_connections(options['concurrency'])
+        if Material.objects.filter(code=LOADTEST_CODE).exists():
+            raise CommandError(f"توجد مادة برمز {LOADTEST_CODE} من تشغيل سابق، احذفها أولًا")
+
+        section, material, lecture_group, students = self._setup(options['requests'], options['capacity'])
+        try:
+            latencies, errors = self._run(students, lecture_group, options['concurrency'])
+            self._report(lecture_group, students, latencies, errors)
+        finally:
+            if not options['keep']:
+                Student.objects.filter(pk__in=[s.pk for s in students]).delete()
+                material.delete()
+                section.delete()
+
+    def _check_connections(self, concurrency):
+        if concurrency < 1:
+            raise CommandError("--concurrency يجب أن يكون 1 على الأقل")
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW max_connections")
+            max_connections = int(cursor.fetchone()[0])
+        if concurrency > max_connections - RESERVED_CONNECTIONS:
+            raise CommandError(
+                f"--concurrency={concurrency} يحتاج {concurrency} اتصالًا و max_connections={max_connections}؛ "
+                f"استخدم {max_connections - RESERVED_CONNECTIONS} أو أقل، أو ارفع max_connections"
+            )
+
+    def _setup(self, count, capacity):
+        section_id = (Section.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        section = Section.objects.create(id=section_id, name=f"loadtest-{section_id}")
+        material = Material.objects.create(code=LOADTEST_CODE, name="اختبار حمل", hours=3, section=section)
+        lecture_group = LectureGroup.objects.create(material=material, group='LT', capacity=capacity)
+        Student.objects.bulk_create([
+            Student(name=f"loadtest {i}", section=section, email=f"loadtest-{section_id}-{i}@example.invalid",
+                    password='-')
+            for i in range(count)
+        ])
+        students = list(Student.objects.filter(section=section))
+        return section, material, lecture_group, students
+
+    def _run(self, students, lecture_group, concurrency):
+        # كل الطلبات تُرسل للـ pool أولًا ثم تنطلق معًا، فتبدأ أول concurrency طلب في نفس اللحظة
+        start = threading.Event()
+        errors = []
+
+        def reserve(student):
+            start.wait()
+            began = time.perf_counter()
+            try:
+                registration.reserve_seat(student, lecture_group, enforce_window=False)
+            except Exception as exc:  # نسجل أي فشل ونكمل باقي الطلبات
+                errors.append(repr(exc))
+                return None
+            finally:
+                elapsed = time.perf_counter() - began
+                connection.close()
+            return elapsed
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = pool.map(reserve, students)
+            start.set()
+            results = list(pending)
+        connections.close_all()
+        # زمن الاستجابة للطلبات الناجحة فقط؛ الفاشلة تُعد في errors
+        return [elapsed for elapsed in results if elapsed is not None], errors
+
+    def _report(self, lecture_group, students, latencies, errors):
+        lecture_group.refresh_from_db()
+        enrolled = Enrollment.objects.filter(material_id=lecture_group.material_id, group=lecture_group.group).count()
+        waitlisted = WaitlistEntry.objects.filter(lecture_group=lecture_group).count()
+
+        ordered = sorted(latencies)
+
+        def percentile(p):
+            return ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000
+
+        self.stdout.write(f"الطلبات: {len(students)}  السعة: {lecture_group.capacity}")
+        self.stdout.write(f"محجوز: {enrolled}  العداد: {lecture_group.seats_taken}  في الانتظار: {waitlisted}")
+        if ordered:
+            self.stdout.write(
+                f"زمن الاستجابة للناجحة (ms): p50={percentile(0.50):.1f}  p95={percentile(0.95):.1f}  "
+                f"p99={percentile(0.99):.1f}  max={ordered[-1] * 1000:.1f}  mean={statistics.mean(ordered) * 1000:.1f}"
+            )
+
+        expected = min(lecture_group.capacity, len(students))
+        if enrolled > lecture_group.capacity or enrolled != lecture_group.seats_taken:
+            raise CommandError("حجز زائد أو عداد غير متطابق مع التنزيلات!")
+        if errors:
+            raise CommandError(f"{len(errors)} طلب فشل من {len(students)}، أولها: {errors[0]}")
+        if enrolled != expected or enrolled + waitlisted != len(students):
+            raise CommandError("عدد المحجوزين أو المنتظرين غير صحيح")
+        self.stdout.write(self.style.SUCCESS("لا يوجد حجز زائد ✅"))
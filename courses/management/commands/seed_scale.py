@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import database
+from courses.seeding import BATCH_SIZE, SeedConfig, SeedError, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "توليد بيانات تجريبية بأحجام حقيقية (أقسام، مواد وأسبقيات، طلاب، تنزيلات، درجات، محاضرات) "
+        "بإدخال جماعي، لقياس أداء الصفحات"
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedConfig()
+        parser.add_argument('--sections', type=int, default=defaults.sections)
+        parser.add_argument('--students', type=int, default=defaults.students)
+        parser.add_argument('--materials', type=int, default=defaults.materials)
+        parser.add_argument('--max-prerequisites', type=int, default=defaults.max_prerequisites,
+                            help="أقصى عدد أسبقيات مباشرة للمادة")
+        parser.add_argument('--terms', type=int, default=defaults.terms, help="سمسترات سابقة مرصودة لكل طالب")
+        parser.add_argument('--per-term', type=int, default=defaults.per_term, help="مواد الطالب في السمستر")
+        parser.add_argument('--groups', type=int, default=defaults.groups, help="مجموعات المحاضرات لكل مادة")
+        parser.add_argument('--capacity', type=int, default=defaults.capacity)
+        parser.add_argument('--year', type=int, default=defaults.year, help="سنة السمستر الحالي")
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    @database.command_timeout()
+    def handle(self, *args, **options):
+        config = SeedConfig(**{
+            name: options[name] for name in (
+                'sections', 'students', 'materials', 'max_prerequisites', 'terms', 'per_term',
+                'groups', 'capacity', 'year', 'seed', 'batch_size',
+            )
+        })
+        try:
+            stats = seed(config, progress=lambda message: self.stdout.write(f"... {message}"))
+        except SeedError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f"تم توليد البيانات في {stats.elapsed:.1f} ثانية"))
+        for name, count in stats.counts.items():
+            self.stdout.write(f"{name:>16}: {count}")
@@ -0,0 +1,64 @@
+import math
+import random
+
+from django.core.management.base import BaseCommand
+
+from courses import scheduling
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس زمن توليد الجدول مقابل حجم الكلية على مسائل مصطنعة (بدون قاعدة البيانات): "
+        "عدد المحاضرات، القاعات، الأزواج المتعارضة، الزمن والتعارضات المتبقية"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,200,400,800', help="أعداد المواد، مفصولة بفواصل")
+        parser.add_argument('--load', type=float, default=0.7, help="نسبة إشغال القاعات المستهدفة")
+        parser.add_argument('--restarts', type=int, default=4)
+        parser.add_argument('--workers', type=int, default=0)
+        parser.add_argument('--time-limit', type=float, default=60.0, help="أقصى زمن لكل مسألة (كل المحاولات)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'مواد':>6} {'محاضرات':>8} {'قاعات':>6} {'أزواج':>8} {'زمن(ث)':>8} {'تعارض':>6} {'تكرار':>6}")
+        for size in [int(s) for s in options['sizes'].split(',') if s.strip()]:
+            problem = self._synthetic(size, options['load'], options['seed'])
+            solution = scheduling.solve(
+                problem, restarts=options['restarts'], workers=options['workers'],
+                seed=options['seed'], time_limit=options['time_limit'],
+            )
+            self.stdout.write(
+                f"{size:>6} {len(problem.sessions):>8} {len(problem.rooms):>6} {problem.conflict_pairs:>8} "
+                f"{solution.total_elapsed:>8.2f} {solution.violations:>6} {solution.spread_penalty:>6}"
+            )
+
+    def _synthetic(self, materials, load, seed):
+        """
+        كلية مصطنعة: أقسام من 10 مواد، لكل مادة 1-3 مجموعات ومحاضرتان أسبوعيًا،
+        وطلاب كل قسم يشتركون في مواد من نفس المستوى (5 مواد).
+        """
+        rng = random.Random(seed)
+        sessions = []
+        shared = set()
+        for material_id in range(materials):
+            section = material_id // 10
+            groups = [str(g + 1) for g in range(rng.randint(1, 3))]
+            for group in groups:
+                size = rng.choice([25, 40, 60, 90])
+                sessions += [scheduling.Session(material_id, group, size, (section, group))] * 2
+
+        # مواد نفس المستوى في القسم يأخذها نفس الطلاب
+        keys = sorted({(s.material_id, s.group) for s in sessions})
+        by_level = {}
+        for key in keys:
+            by_level.setdefault(key[0] // 5, []).append(key)
+        for level in by_level.values():
+            for i, first in enumerate(level):
+                for second in level[i + 1:]:
+                    if first[0] != second[0] and first[1] == second[1]:
+                        shared.add((first, second))
+
+        room_count = math.ceil(len(sessions) / (scheduling.SLOT_COUNT * load))
+        rooms = [(f"R{r}", rng.choice([40, 60, 90, 120]) if r else 120) for r in range(room_count)]
+        return scheduling.make_problem(sessions, rooms, shared)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from courses import database
+from courses.models import Section
+from courses.student_timetable import section_conflict_report
+
+
+class Command(BaseCommand):
+    help = "تقرير تعارضات جداول الطلاب لقسم أو لكل الأقسام في السمستر (الحالي افتراضيًا)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--section', type=int, help="رقم القسم (افتراضيًا كل الأقسام)")
+        parser.add_argument('--semester')
+        parser.add_argument('--year')
+
+    @database.command_timeout('reporting')
+    def handle(self, *args, **options):
+        sections = Section.objects.order_by('id')
+        if options['section'] is not None:
+            sections = sections.filter(id=options['section'])
+
+        for section in sections:
+            report = section_conflict_report(section.id, options['semester'], options['year'])
+            self.stdout.write(
+                f"{section.name}: {report['enrolled']} طالب منزّل، {report['with_conflicts']} لديهم تعارض"
+            )
+            for row in report['report']:
+                slots = "، ".join(
+                    f"{c['day_label']} {c['time_label']} ("
+                    + " / ".join(m['material'] for m in c['materials']) + ")"
+                    for c in row['conflicts']
+                )
+                self.stdout.write(f"  {row['student_id']} {row['name']}: {slots}")
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import GradeRecord
+from courses.pdf_transcripts import TranscriptRenderError, generate_transcripts
+
+
+class Command(BaseCommand):
+    help = "قياس سرعة توليد كشوف الدرجات PDF (كشف/ثانية) بعدد عمليات مختلف"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500, help="عدد الطلاب في القياس")
+        parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}", help="أعداد العمليات، مفصولة بفواصل")
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        student_ids = list(
+            GradeRecord.objects.order_by('student_id').values_list('student_id', flat=True)
+            .distinct()[:options['students']]
+        )
+        if not student_ids:
+            raise CommandError("لا توجد درجات مرصودة للقياس")
+
+        self.stdout.write(f"{len(student_ids)} طالب")
+        self.stdout.write(f"{'عمليات':>8} {'كشوف':>8} {'زمن(ث)':>8} {'كشف/ث':>8} {'MB':>8}")
+        for workers in [int(w) for w in options['workers'].split(',') if w.strip()]:
+            with tempfile.TemporaryDirectory() as tmp:
+                try:
+                    stats = generate_transcripts(
+                        os.path.join(tmp, 'transcripts.zip'), student_ids=student_ids,
+                        workers=workers, batch_size=options['batch_size'],
+                    )
+                except TranscriptRenderError as exc:
+                    raise CommandError(str(exc))
+            self.stdout.write(
+                f"{workers:>8} {stats.transcripts:>8} {stats.elapsed:>8.2f} {stats.per_second:>8.1f} "
+                f"{stats.bytes_written / 1024 / 1024:>8.2f}"
+            )
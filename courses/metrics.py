@@ -0,0 +1,241 @@
+"""
+مقاييس Prometheus (صيغة النص) بدون مكتبات خارجية
+
+كل عملية (worker في gunicorn) تجمع العدادات والـ histograms في الذاكرة، وإذا ضُبط
+METRICS_DIR تكتبها بعد كل طلب في ملف خاص بها (<pid>.json) بكتابة ذرية (ملف مؤقت ثم
+rename). رابط /metrics يقرأ كل الملفات ويجمعها، فيرى Prometheus مجموع كل العمليات أيًا
+كانت العملية التي أجابت. العدادات والـ histograms تُجمع من كل الملفات (حتى لعمليات
+انتهت، حتى لا تنقص العدادات)، والـ gauges من العمليات الحية فقط. يجب تفريغ المجلد عند
+تشغيل الخدمة (scripts/course_service.sh يفعل ذلك).
+
+بدون METRICS_DIR (runserver أو عملية واحدة) تُقرأ القيم من ذاكرة العملية مباشرة.
+عمق قائمة الانتظار وحالة فترة التسجيل تُحسب من القاعدة وقت القراءة.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# الاسم: (النوع، الوصف، الحدود للـ histogram)
+METRICS = {
+    'http_requests_total': ('counter', "عدد الطلبات حسب الصفحة والطريقة والحالة", None),
+    'http_request_duration_seconds': ('histogram', "زمن الطلب حسب الصفحة", LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', "عدد استعلامات SQL في الطلب حسب الصفحة", QUERY_COUNT_BUCKETS),
+    'db_queries_total': ('counter', "استعلامات SQL حسب الصفحة وقاعدة البيانات (default أو replica)", None),
+    'db_query_duration_seconds': ('histogram', "زمن القاعدة الكلي في الطلب حسب الصفحة", LATENCY_BUCKETS),
+    'db_connections_opened_total': ('counter', "اتصالات قاعدة بيانات جديدة", None),
+    'db_connections_open': ('gauge', "اتصالات قاعدة البيانات المفتوحة الآن", None),
+    'cache_requests_total': ('counter', "طلبات الكاش حسب النوع والاسم والنتيجة", None),
+    'enrollments_created_total': ('counter', "تنزيلات مواد جديدة حسب المصدر", None),
+    'grades_written_total': ('counter', "درجات مكتوبة (جديدة أو معدلة) حسب المصدر", None),
+    'registration_waitlist_depth': ('gauge', "عدد الطلبات في قوائم الانتظار", None),
+    'registration_window_open': ('gauge', "1 إذا كانت فترة التسجيل مفتوحة", None),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)       # (الاسم، التسميات) ← القيمة
+_histograms = {}                     # (الاسم، التسميات) ← [عدد كل حد..., +Inf, المجموع]
+_gauges = {}
+_last_flush = 0.0
+
+
+def _labels(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc(name, labels=None, value=1):
+    with _lock:
+        _counters[(name, _labels(labels))] += value
+
+
+def observe(name, value, labels=None):
+    buckets = METRICS[name][2]
+    key = (name, _labels(labels))
+    with _lock:
+        row = _histograms.get(key)
+        if row is None:
+            row = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        else:
+            row[len(buckets)] += 1
+        row[-1] += value
+
+
+def set_gauge(name, value, labels=None):
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+
+def observe_request(profile):
+    """يُستدعى من InstrumentationMiddleware بعد كل طلب"""
+    labels = {'view': profile.url_name}
+    inc('http_requests_total', {**labels, 'method': profile.method, 'status': str(profile.status)})
+    observe('http_request_duration_seconds', profile.total_ms / 1000, labels)
+    observe('db_queries_per_request', profile.queries, labels)
+    observe('db_query_duration_seconds', profile.db_ms / 1000, labels)
+    for alias, count in profile.aliases.items():
+        inc('db_queries_total', {**labels, 'alias': alias}, count)
+    flush()
+
+
+def _collect_process_values():
+    """قيم تُقرأ لحظة الكتابة: الاتصالات المفتوحة الآن"""
+    from django.db import connections
+
+    for alias in connections:
+        connection = connections[alias]
+        set_gauge('db_connections_open', int(connection.connection is not None), {'alias': alias})
+
+
+def _directory():
+    return getattr(settings, 'METRICS_DIR', '') or ''
+
+
+def _dump():
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), row] for (name, labels), row in _histograms.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in _gauges.items()],
+        }
+
+
+def flush(force=False):
+    """يكتب قيم هذه العملية في ملفها داخل METRICS_DIR (كل METRICS_FLUSH_INTERVAL ثانية على الأكثر)"""
+    global _last_flush
+    directory = _directory()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 0):
+        return
+    _last_flush = now
+    _collect_process_values()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_dump(), f)
+    os.replace(tmp, path)
+
+
+atexit.register(lambda: flush(force=True))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshots():
+    directory = _directory()
+    if not directory:
+        _collect_process_values()
+        return [_dump()]
+    flush(force=True)
+    snapshots = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # ملف عملية تُكتب الآن أو تالف
+    return snapshots
+
+
+def aggregate():
+    """(العدادات، الـ histograms، الـ gauges) مجموعة من كل العمليات"""
+    counters, histograms, gauges = defaultdict(float), {}, defaultdict(float)
+    for snapshot in _snapshots():
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, row in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            current = histograms.setdefault(key, [0] * len(row))
+            histograms[key] = [a + b for a, b in zip(current, row)]
+        if _alive(snapshot['pid']):
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, tuple(map(tuple, labels)))] += value
+    return counters, histograms, gauges
+
+
+def _registration_gauges(gauges):
+    from courses import registration
+    from courses.models import RegistrationWindow
+
+    gauges[('registration_waitlist_depth', ())] = registration.queue_depth()
+    gauges[('registration_window_open', ())] = int(RegistrationWindow.is_open())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """كل المقاييس بصيغة النص (text exposition format 0.0.4)"""
+    counters, histograms, gauges = aggregate()
+    _registration_gauges(gauges)
+
+    by_name = defaultdict(list)
+    for store in (counters, gauges):
+        for (name, labels), value in store.items():
+            by_name[name].append((labels, value))
+    for (name, labels), row in histograms.items():
+        by_name[name].append((labels, row))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted(by_name.get(name, []), key=lambda item: item[0])
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _gauges.clear()
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_semester_gpas(apps, schema_editor):
+    GradeRecord = apps.get_model('courses', 'GradeRecord')
+    SemesterGPA = apps.get_model('courses', 'SemesterGPA')
+    totals = GradeRecord.objects.filter(grade__isnull=False)\
+        .values('student_id', 'semester', 'year')\
+        .annotate(
+            points=models.Sum(models.F('grade') * models.F('material__hours'), output_field=models.FloatField()),
+            hours=models.Sum('material__hours'),
+            count=models.Count('id'),
+        ).order_by()
+    SemesterGPA.objects.bulk_create([
+        SemesterGPA(
+            student_id=row['student_id'], semester=row['semester'], year=row['year'],
+            total_points=row['points'] or 0, total_hours=row['hours'] or 0, grades_count=row['count'],
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_lecture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemesterGPA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.CharField(blank=True, max_length=20, null=True)),
+                ('year', models.CharField(blank=True, max_length=10, null=True)),
+                ('total_points', models.FloatField(default=0)),
+                ('total_hours', models.IntegerField(default=0)),
+                ('grades_count', models.IntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='semester_gpas', to='courses.student')),
+            ],
+            options={
+                'verbose_name': 'معدل سمستر',
+                'verbose_name_plural': 'معدلات السمسترات',
+                'db_table': 'semester_gpas',
+                'unique_together': {('student', 'semester', 'year')},
+            },
+        ),
+        migrations.RunPython(build_semester_gpas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:12
+
+import re
+
+from django.db import migrations, models
+
+# نسخة ثابتة من courses.search.normalize_arabic وقت كتابة هذه الخطوة، حتى لا تتغير
+# نتيجة الترحيل إذا تغير كود التطبيق لاحقًا
+_TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+_TATWEEL = '\u0640'
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+_SPACES = re.compile(r'\s+')
+
+
+def material_search_text(code, name):
+    text = f"{code or ''} {name or ''}"
+    text = _TASHKEEL.sub('', text).replace(_TATWEEL, '')
+    text = text.translate(_LETTERS).lower()
+    return _SPACES.sub(' ', text).strip()
+
+
+def fill_search_name(apps, schema_editor):
+    Material = apps.get_model('courses', 'Material')
+    materials = list(Material.objects.only('id', 'code', 'name'))
+    for material in materials:
+        material.search_name = material_search_text(material.code, material.name)
+    Material.objects.bulk_update(materials, ['search_name'], batch_size=500)
+
+
+TRIGRAM_INDEXES = {
+    'materials_code_trgm_idx': 'code',
+    'materials_name_trgm_idx': 'name',
+    'materials_search_name_trgm_idx': 'search_name',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # فهارس trigram خاصة بـ Postgres تخدم icontains/contains والبحث التقريبي
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON materials USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_student_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=130),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
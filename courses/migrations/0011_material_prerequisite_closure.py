@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict, deque
+
+
+def build_closure(apps, schema_editor):
+    MaterialPrerequisite = apps.get_model('courses', 'MaterialPrerequisite')
+    MaterialPrerequisiteClosure = apps.get_model('courses', 'MaterialPrerequisiteClosure')
+
+    parents = defaultdict(set)
+    edges = MaterialPrerequisite.objects.filter(prerequisite__isnull=False)\
+        .values_list('material_id', 'prerequisite_id')
+    for material_id, prerequisite_id in edges:
+        parents[material_id].add(prerequisite_id)
+
+    rows = []
+    for descendant in list(parents):
+        seen = {}
+        queue = deque((p, 1) for p in parents[descendant])
+        while queue:
+            node, depth = queue.popleft()
+            if node in seen:
+                continue
+            seen[node] = depth
+            queue.extend((p, depth + 1) for p in parents.get(node, ()))
+        rows.extend(
+            MaterialPrerequisiteClosure(ancestor_id=a, descendant_id=descendant, depth=d)
+            for a, d in seen.items()
+        )
+    MaterialPrerequisiteClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_material_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialPrerequisiteClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(default=1)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='required_for_closure', to='courses.material')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requires_closure', to='courses.material')),
+            ],
+            options={
+                'verbose_name': 'أسبقية متعدية',
+                'verbose_name_plural': 'الأسبقيات المتعدية',
+                'db_table': 'material_prerequisite_closure',
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_material_prerequisite_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LectureGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(max_length=50, verbose_name='المجموعة')),
+                ('capacity', models.PositiveIntegerField(verbose_name='السعة')),
+                ('seats_taken', models.PositiveIntegerField(default=0, verbose_name='المقاعد المحجوزة')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecture_groups', to='courses.material', verbose_name='المادة')),
+            ],
+            options={
+                'verbose_name': 'مجموعة محاضرات',
+                'verbose_name_plural': 'مجموعات المحاضرات',
+                'db_table': 'lecture_groups',
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistrationWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='الاسم')),
+                ('opens_at', models.DateTimeField(verbose_name='يفتح في')),
+                ('closes_at', models.DateTimeField(verbose_name='يغلق في')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'فترة تسجيل',
+                'verbose_name_plural': 'فترات التسجيل',
+                'db_table': 'registration_windows',
+                'ordering': ['-opens_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='group',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lecture_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='courses.lecturegroup')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='courses.student')),
+            ],
+            options={
+                'verbose_name': 'طلب انتظار',
+                'verbose_name_plural': 'قائمة الانتظار',
+                'db_table': 'registration_waitlist',
+                'ordering': ['created_at', 'id'],
+                'unique_together': {('student', 'lecture_group')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lecturegroup',
+            constraint=models.CheckConstraint(check=models.Q(('seats_taken__lte', models.F('capacity'))), name='lecture_groups_not_overbooked'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='lecturegroup',
+            unique_together={('material', 'group')},
+        ),
+    ]
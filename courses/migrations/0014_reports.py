@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_lecture_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('rows', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'تحديث التقارير',
+                'verbose_name_plural': 'تحديثات التقارير',
+                'db_table': 'report_refreshes',
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SectionTermReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section_name', models.CharField(blank=True, default='', max_length=150)),
+                ('semester', models.CharField(blank=True, max_length=20, null=True)),
+                ('year', models.CharField(blank=True, max_length=10, null=True)),
+                ('students_count', models.IntegerField(default=0)),
+                ('enrollments_count', models.IntegerField(default=0)),
+                ('graded_count', models.IntegerField(default=0)),
+                ('passed_count', models.IntegerField(default=0)),
+                ('gpa_sum', models.FloatField(default=0)),
+                ('gpa_count', models.IntegerField(default=0)),
+                ('section', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='term_reports', to='courses.section')),
+            ],
+            options={
+                'verbose_name': 'تقرير قسم',
+                'verbose_name_plural': 'تقارير الأقسام',
+                'db_table': 'report_section_terms',
+                'unique_together': {('section', 'semester', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MaterialTermReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('material_name', models.CharField(max_length=100)),
+                ('section_name', models.CharField(blank=True, default='', max_length=150)),
+                ('semester', models.CharField(blank=True, max_length=20, null=True)),
+                ('year', models.CharField(blank=True, max_length=10, null=True)),
+                ('enrolled_count', models.IntegerField(default=0)),
+                ('graded_count', models.IntegerField(default=0)),
+                ('passed_count', models.IntegerField(default=0)),
+                ('grade_sum', models.FloatField(default=0)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_reports', to='courses.material')),
+                ('section', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='courses.section')),
+            ],
+            options={
+                'verbose_name': 'تقرير مادة',
+                'verbose_name_plural': 'تقارير المواد',
+                'db_table': 'report_material_terms',
+                'indexes': [models.Index(fields=['year', 'semester'], name='report_material_term_idx')],
+                'unique_together': {('material', 'semester', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GPADistributionReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.CharField(blank=True, max_length=20, null=True)),
+                ('year', models.CharField(blank=True, max_length=10, null=True)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('students_count', models.IntegerField(default=0)),
+                ('section', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='gpa_reports', to='courses.section')),
+            ],
+            options={
+                'verbose_name': 'توزيع المعدلات',
+                'verbose_name_plural': 'توزيع المعدلات',
+                'db_table': 'report_gpa_distribution',
+                'unique_together': {('section', 'semester', 'year', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:02
+
+from django.db import migrations
+
+
+def create_upper_trigram_index(apps, schema_editor):
+    # name__icontains يُكتب على Postgres كـ UPPER("students"."name"::text) LIKE UPPER(...)
+    # فلا يستخدم فهرسًا على العمود نفسه؛ الفهرس يجب أن يكون على نفس التعبير
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS students_name_trgm_idx")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS students_name_upper_trgm_idx ON students USING gin (UPPER(name) gin_trgm_ops)"
+    )
+
+
+def drop_upper_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS students_name_upper_trgm_idx")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS students_name_trgm_idx ON students USING gin (name gin_trgm_ops)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_reports'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_upper_trigram_index, drop_upper_trigram_index),
+    ]
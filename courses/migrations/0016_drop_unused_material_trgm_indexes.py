@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:20
+
+from django.db import migrations
+
+# صفحة المواد والبحث يستخدمان search_name فقط (فهرسه materials_search_name_trgm_idx)
+UNUSED_INDEXES = {
+    'materials_code_trgm_idx': 'code',
+    'materials_name_trgm_idx': 'name',
+}
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in UNUSED_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index, column in UNUSED_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON materials USING gin ({column} gin_trgm_ops)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_students_name_upper_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_indexes, create_indexes),
+    ]
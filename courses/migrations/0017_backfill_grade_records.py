@@ -0,0 +1,111 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:05
+
+from django.core.cache import cache
+from django.db import migrations, transaction
+from django.db.models import (
+    Case, Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Round
+
+BATCH_SIZE = 1000
+GPA_VERSION_KEY = 'gpa:version'   # courses.gpa.VERSION_KEY
+
+
+def _stored_gpa_values(SemesterGPA):
+    """نفس courses.gpa._stored_gpa_expressions على النماذج التاريخية"""
+    def ratio(points, hours):
+        return Case(
+            When(**{f'{hours}__gt': 0}, then=Round(
+                ExpressionWrapper(F(points) * 1.0 / F(hours), output_field=FloatField()), 2,
+            )),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+
+    semester = SemesterGPA.objects.filter(student_id=OuterRef('student_id'))\
+        .alias(term_semester=Coalesce('semester', Value('')), term_year=Coalesce('year', Value('')))\
+        .filter(term_semester=Coalesce(OuterRef('semester'), Value('')),
+                term_year=Coalesce(OuterRef('year'), Value('')))\
+        .annotate(value=ratio('total_points', 'total_hours')).values('value')[:1]
+    cumulative = SemesterGPA.objects.filter(student_id=OuterRef('student_id'))\
+        .values('student_id').annotate(points=Sum('total_points'), hours=Sum('total_hours'))\
+        .annotate(value=ratio('points', 'hours')).values('value')[:1]
+    return {
+        'semester_gpa': Coalesce(Subquery(semester), Value(0.0)),
+        'cumulative_gpa': Coalesce(Subquery(cumulative), Value(0.0)),
+    }
+
+
+def _bump_gpa_cache():
+    """مثل gpa.invalidate_all: معدلات الطلاب في الكاش (StudentGPA) صارت قديمة"""
+    try:
+        cache.incr(GPA_VERSION_KEY)
+    except ValueError:
+        cache.set(GPA_VERSION_KEY, 2, None)
+
+
+def backfill_grade_records(apps, schema_editor):
+    """
+    الدرجات التي رُصدت قبل أن يصبح GradeRecord المصدر الوحيد موجودة في Enrollment.grade فقط.
+    ننشئ لها سجلات درجات ثم نعيد بناء ملخص المعدل (semester_gpas) لطلابها، ونحدّث المعدلات
+    المخزنة في كل سجلات درجاتهم (مثل gpa.refresh_stored_gpas) ونُبطل كاش المعدلات.
+    """
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    GradeRecord = apps.get_model('courses', 'GradeRecord')
+    SemesterGPA = apps.get_model('courses', 'SemesterGPA')
+
+    recorded = GradeRecord.objects.filter(
+        student_id=OuterRef('student_id'), material_id=OuterRef('material_id'),
+        semester=OuterRef('semester'), year=OuterRef('year'),
+    )
+    legacy = Enrollment.objects.filter(grade__isnull=False, semester__isnull=False, year__isnull=False)\
+        .exclude(Exists(recorded))\
+        .values_list('student_id', 'material_id', 'semester', 'year', 'grade')
+
+    student_ids = set()
+    batch = []
+    for student_id, material_id, semester, year, grade in legacy.iterator(chunk_size=BATCH_SIZE):
+        student_ids.add(student_id)
+        batch.append(GradeRecord(
+            student_id=student_id, material_id=material_id, semester=semester, year=year, grade=grade,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            GradeRecord.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        GradeRecord.objects.bulk_create(batch, ignore_conflicts=True)
+
+    # نفس حساب courses.gpa: النقاط = الدرجة × ساعات المادة
+    student_ids = sorted(student_ids)
+    for offset in range(0, len(student_ids), BATCH_SIZE):
+        chunk = student_ids[offset:offset + BATCH_SIZE]
+        totals = GradeRecord.objects.filter(student_id__in=chunk, grade__isnull=False)\
+            .values('student_id', 'semester', 'year')\
+            .annotate(
+                points=Sum(F('grade') * F('material__hours'), output_field=FloatField()),
+                hours=Sum('material__hours'),
+                count=Count('id'),
+            ).order_by()
+        SemesterGPA.objects.filter(student_id__in=chunk).delete()
+        SemesterGPA.objects.bulk_create([
+            SemesterGPA(
+                student_id=row['student_id'], semester=row['semester'], year=row['year'],
+                total_points=row['points'] or 0, total_hours=row['hours'] or 0, grades_count=row['count'],
+            )
+            for row in totals
+        ], batch_size=BATCH_SIZE)
+        GradeRecord.objects.filter(student_id__in=chunk).update(**_stored_gpa_values(SemesterGPA))
+
+    if student_ids:
+        transaction.on_commit(_bump_gpa_cache)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_drop_unused_material_trgm_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_grade_records, migrations.RunPython.noop),
+    ]
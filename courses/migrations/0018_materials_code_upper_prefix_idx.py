@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-20 09:15
+
+from django.db import migrations
+
+
+def create_code_prefix_index(apps, schema_editor):
+    # code__istartswith يُكتب على Postgres كـ UPPER("materials"."code"::text) LIKE UPPER('...%')؛
+    # text_pattern_ops يجعل LIKE بالبداية يستخدم الفهرس مهما كانت الـ collation
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS materials_code_upper_prefix_idx ON materials (UPPER(code) text_pattern_ops)"
+    )
+
+
+def drop_code_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS materials_code_upper_prefix_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_backfill_grade_records'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_code_prefix_index, drop_code_prefix_index),
+    ]
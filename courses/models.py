@@ -28,6 +28,10 @@ class Student(models.Model):
     class Meta:
         db_table = 'students'
         ordering = ['-created_at']
+        indexes = [
+            # يخدم الترقيم بالمؤشر في صفحة الطلاب (-created_at, id_student)
+            models.Index(fields=['-created_at', 'id_student'], name='students_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.id_student})"
@@ -40,6 +44,8 @@ class Material(models.Model):
     hours = models.IntegerField(default=3)
     section = models.ForeignKey(Section, on_delete=models.SET_NULL, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
+    # الرمز والاسم بعد التوحيد (بدون تشكيل وبأشكال موحدة للحروف) لخدمة البحث
+    search_name = models.CharField(max_length=130, blank=True, default='', editable=False)
 
     class Meta:
         db_table = 'materials'
@@ -48,6 +54,15 @@ class Material(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.code})"
+
+    def save(self, *args, **kwargs):
+        from courses.search import material_search_text
+
+        self.search_name = material_search_text(self.code, self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'code', 'name'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super().save(*args, **kwargs)
     
     def get_prerequisites(self):
         """ترجع كل المواد المطلوبة قبل هذه المادة"""
@@ -62,6 +77,7 @@ class Enrollment(models.Model):
     year = models.CharField(max_length=10, null=True, blank=True)      # مثال: "2025"
     date_registered = models.DateTimeField(auto_now_add=True)
     grade = models.FloatField(null=True, blank=True)
+    group = models.CharField(max_length=50, null=True, blank=True)  # مجموعة المحاضرات التي حُجز فيها المقعد
 
     class Meta:
         db_table = 'enrollments'
@@ -97,35 +113,81 @@ class GradeRecord(models.Model):
     def __str__(self):
         return f"{self.student.name} - {self.material.name} ({self.semester} {self.year})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # نحتفظ بالحالة كما قُرئت من القاعدة لنحسب الفرق عند الحفظ
+        instance._loaded_gpa_state = instance.gpa_state()
+        return instance
+
+    GPA_FIELDS = ('student_id', 'material_id', 'semester', 'year', 'grade')
+
+    def gpa_state(self):
+        """الحقول التي تؤثر على مجاميع المعدل، أو None إذا لم تُحمّل كلها"""
+        if any(f not in self.__dict__ for f in self.GPA_FIELDS):
+            return None
+        return tuple(self.__dict__[f] for f in self.GPA_FIELDS)
+
+    def _stored_gpa_state(self):
+        """نفس gpa_state لكن كما هي في القاعدة الآن (None إذا لم يُحفظ السجل بعد)"""
+        return GradeRecord.objects.filter(pk=self.pk).values_list(*self.GPA_FIELDS).first()
+
     def save(self, *args, **kwargs):
         """
-        نحسب المعدل الفصلي والمعدل التراكمي تلقائيًا
+        نحدّث مجاميع المعدل بفرق الدرجة فقط بدل إعادة حساب كل السجل
         """
+        from courses import gpa
+
+        previous = None if self._state.adding else getattr(self, '_loaded_gpa_state', None)
+        if previous is None and not self._state.adding:
+            # حقول مؤجلة (only/defer): نقرأ الحالة القديمة قبل الحفظ، فإذا انتقل السجل
+            # لسمستر آخر يُطرح أثره من السمستر القديم أيضًا
+            previous = self._stored_gpa_state()
         super().save(*args, **kwargs)
 
-        # بعد حفظ الدرجة نحسب المعدلات
+        current = self.gpa_state() or self._stored_gpa_state()
+        gpa.apply_grade_change(previous, current, material=self.material)
+        self._loaded_gpa_state = current
+
+        # بعد حفظ الدرجة نحدّث المعدلات المخزنة في السجل
         self.update_gpas()
 
     def update_gpas(self):
-        from django.db.models import Avg
-
-        # نحسب معدل السمستر الحالي
-        semester_avg = GradeRecord.objects.filter(
-            student=self.student,
-            semester=self.semester,
-            year=self.year
-        ).aggregate(Avg('grade'))['grade__avg'] or 0
+        from courses import gpa
 
-        # نحسب المعدل التراكمي لكل الفصول السابقة
-        cumulative_avg = GradeRecord.objects.filter(
-            student=self.student
-        ).aggregate(Avg('grade'))['grade__avg'] or 0
+        semester_avg, cumulative_avg = gpa.student_gpas(self.student_id, self.semester, self.year)
 
         # نحفظهم
         GradeRecord.objects.filter(pk=self.pk).update(
-            semester_gpa=round(semester_avg, 2),
-            cumulative_gpa=round(cumulative_avg, 2)
+            semester_gpa=semester_avg,
+            cumulative_gpa=cumulative_avg
         )
+        self.semester_gpa = semester_avg
+        self.cumulative_gpa = cumulative_avg
+
+
+# ملخص المعدل لكل طالب في كل سمستر (مجاميع تُحدَّث مع كل رصد درجة)
+class SemesterGPA(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='semester_gpas')
+    semester = models.CharField(max_length=20, null=True, blank=True)
+    year = models.CharField(max_length=10, null=True, blank=True)
+
+    total_points = models.FloatField(default=0)     # مجموع (الدرجة × عدد الساعات)
+    total_hours = models.IntegerField(default=0)    # مجموع ساعات المواد المرصودة
+    grades_count = models.IntegerField(default=0)   # عدد الدرجات المرصودة
+
+    class Meta:
+        db_table = 'semester_gpas'
+        verbose_name = "معدل سمستر"
+        verbose_name_plural = "معدلات السمسترات"
+        unique_together = ('student', 'semester', 'year')
+
+    def __str__(self):
+        return f"{self.student_id} - {self.semester} ({self.year}): {self.gpa}"
+
+    @property
+    def gpa(self):
+        return round(self.total_points / self.total_hours, 2) if self.total_hours > 0 else 0
 
 
 
@@ -153,6 +215,32 @@ class MaterialPrerequisite(models.Model):
         if self.prerequisite:
             return f"{self.prerequisite.name} → {self.material.name}"
         return f"لا توجد أسبقية → {self.material.name}"
+
+    def clean(self):
+        from courses.prerequisites import check_no_cycle
+
+        check_no_cycle(self.material_id, self.prerequisite_id)
+
+    def save(self, *args, **kwargs):
+        # نمنع الدورات (أ قبل ب و ب قبل أ) قبل الحفظ
+        self.clean()
+        super().save(*args, **kwargs)
+
+
+# جدول الإغلاق المتعدي للأسبقيات: كل مادة مع كل المواد المطلوبة قبلها مباشرة أو بشكل غير مباشر
+class MaterialPrerequisiteClosure(models.Model):
+    ancestor = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='required_for_closure')
+    descendant = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='requires_closure')
+    depth = models.PositiveSmallIntegerField(default=1)  # طول أقصر مسار (1 = أسبقية مباشرة)
+
+    class Meta:
+        db_table = 'material_prerequisite_closure'
+        unique_together = ('ancestor', 'descendant')
+        verbose_name = "أسبقية متعدية"
+        verbose_name_plural = "الأسبقيات المتعدية"
+
+    def __str__(self):
+        return f"{self.ancestor_id} ⇒ {self.descendant_id} ({self.depth})"
     
 
 
@@ -190,6 +278,7 @@ class Lecture(models.Model):
     ], verbose_name="الوقت")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # يدخل في نسخة كاش الجدول
 
     class Meta:
         db_table = 'lectures'
@@ -198,4 +287,176 @@ class Lecture(models.Model):
         unique_together = ('material', 'group', 'day', 'time')  # منع ازدواجية المحاضرة لنفس الوقت والمجموعة
 
     def __str__(self):
-        return f"{self.material.name} - مجموعة {self.group} ({self.get_day_display()} {self.get_time_display()})"
\ No newline at end of file
+        return f"{self.material.name} - مجموعة {self.group} ({self.get_day_display()} {self.get_time_display()})"
+
+
+# فترة التسجيل: حجز المقاعد في المجموعات مسموح فقط داخل فترة مفعّلة
+class RegistrationWindow(models.Model):
+    name = models.CharField(max_length=100, verbose_name="الاسم")
+    opens_at = models.DateTimeField(verbose_name="يفتح في")
+    closes_at = models.DateTimeField(verbose_name="يغلق في")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'registration_windows'
+        verbose_name = "فترة تسجيل"
+        verbose_name_plural = "فترات التسجيل"
+        ordering = ['-opens_at']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def is_open(cls, at=None):
+        at = at or timezone.now()
+        return cls.objects.filter(is_active=True, opens_at__lte=at, closes_at__gte=at).exists()
+
+
+# سعة كل مجموعة محاضرات لمادة، وعداد المقاعد المحجوزة (يُحدَّث ذريًا)
+class LectureGroup(models.Model):
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='lecture_groups', verbose_name="المادة")
+    group = models.CharField(max_length=50, verbose_name="المجموعة")
+    capacity = models.PositiveIntegerField(verbose_name="السعة")
+    seats_taken = models.PositiveIntegerField(default=0, verbose_name="المقاعد المحجوزة")
+
+    class Meta:
+        db_table = 'lecture_groups'
+        verbose_name = "مجموعة محاضرات"
+        verbose_name_plural = "مجموعات المحاضرات"
+        unique_together = ('material', 'group')
+        constraints = [
+            # حماية أخيرة على مستوى القاعدة ضد الحجز الزائد
+            models.CheckConstraint(check=models.Q(seats_taken__lte=models.F('capacity')),
+                                   name='lecture_groups_not_overbooked'),
+        ]
+
+    def __str__(self):
+        return f"{self.material.name} - مجموعة {self.group} ({self.seats_taken}/{self.capacity})"
+
+    @property
+    def seats_left(self):
+        return max(self.capacity - self.seats_taken, 0)
+
+
+# قائمة الانتظار لمجموعة ممتلئة (بالترتيب حسب وقت الطلب)
+class WaitlistEntry(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='waitlist_entries')
+    lecture_group = models.ForeignKey(LectureGroup, on_delete=models.CASCADE, related_name='waitlist')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'registration_waitlist'
+        verbose_name = "طلب انتظار"
+        verbose_name_plural = "قائمة الانتظار"
+        unique_together = ('student', 'lecture_group')
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.student_id} ← {self.lecture_group}"
+
+
+# --- جداول التقارير (ملخصات تُبنى بأمر refresh_reports ولا تُكتب من الصفحات)
+# صفحة التقارير تقرأ منها فقط، فلا تمر على جدول التنزيلات الكبير أثناء فترة التسجيل
+
+class MaterialTermReport(models.Model):
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='term_reports')
+    material_name = models.CharField(max_length=100)
+    section = models.ForeignKey(Section, on_delete=models.SET_NULL, null=True, blank=True)
+    section_name = models.CharField(max_length=150, blank=True, default='')
+    semester = models.CharField(max_length=20, null=True, blank=True)
+    year = models.CharField(max_length=10, null=True, blank=True)
+
+    enrolled_count = models.IntegerField(default=0)    # عدد المنزّلين
+    graded_count = models.IntegerField(default=0)      # عدد الدرجات المرصودة
+    passed_count = models.IntegerField(default=0)      # عدد الناجحين
+    grade_sum = models.FloatField(default=0)
+
+    class Meta:
+        db_table = 'report_material_terms'
+        verbose_name = "تقرير مادة"
+        verbose_name_plural = "تقارير المواد"
+        unique_together = ('material', 'semester', 'year')
+        indexes = [models.Index(fields=['year', 'semester'], name='report_material_term_idx')]
+
+    def __str__(self):
+        return f"{self.material_name} ({self.semester} {self.year})"
+
+    @property
+    def pass_rate(self):
+        return round(100 * self.passed_count / self.graded_count, 1) if self.graded_count else None
+
+    @property
+    def failed_count(self):
+        return self.graded_count - self.passed_count
+
+    @property
+    def average_grade(self):
+        return round(self.grade_sum / self.graded_count, 2) if self.graded_count else None
+
+
+class SectionTermReport(models.Model):
+    section = models.ForeignKey(Section, on_delete=models.CASCADE, null=True, blank=True, related_name='term_reports')
+    section_name = models.CharField(max_length=150, blank=True, default='')
+    semester = models.CharField(max_length=20, null=True, blank=True)
+    year = models.CharField(max_length=10, null=True, blank=True)
+
+    students_count = models.IntegerField(default=0)     # طلاب القسم الذين نزّلوا مواد
+    enrollments_count = models.IntegerField(default=0)
+    graded_count = models.IntegerField(default=0)
+    passed_count = models.IntegerField(default=0)
+    gpa_sum = models.FloatField(default=0)              # مجموع معدلات السمستر للطلاب المرصودين
+    gpa_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_section_terms'
+        verbose_name = "تقرير قسم"
+        verbose_name_plural = "تقارير الأقسام"
+        unique_together = ('section', 'semester', 'year')
+
+    def __str__(self):
+        return f"{self.section_name} ({self.semester} {self.year})"
+
+    @property
+    def pass_rate(self):
+        return round(100 * self.passed_count / self.graded_count, 1) if self.graded_count else None
+
+    @property
+    def average_gpa(self):
+        return round(self.gpa_sum / self.gpa_count, 2) if self.gpa_count else None
+
+
+class GPADistributionReport(models.Model):
+    section = models.ForeignKey(Section, on_delete=models.CASCADE, null=True, blank=True, related_name='gpa_reports')
+    semester = models.CharField(max_length=20, null=True, blank=True)
+    year = models.CharField(max_length=10, null=True, blank=True)
+    bucket = models.PositiveSmallIntegerField()         # بداية الفئة: 0، 10، ... 90
+    students_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_gpa_distribution'
+        verbose_name = "توزيع المعدلات"
+        verbose_name_plural = "توزيع المعدلات"
+        unique_together = ('section', 'semester', 'year', 'bucket')
+
+    def __str__(self):
+        return f"{self.section_id} {self.semester} {self.year}: {self.bucket}-{self.bucket + 10} ({self.students_count})"
+
+
+class ReportRefresh(models.Model):
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    rows = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'report_refreshes'
+        verbose_name = "تحديث التقارير"
+        verbose_name_plural = "تحديثات التقارير"
+        ordering = ['-finished_at']
+
+    def __str__(self):
+        return f"{self.finished_at:%Y-%m-%d %H:%M} ({self.rows})"
+
+    @property
+    def duration(self):
+        return (self.finished_at - self.started_at).total_seconds()
@@ -0,0 +1,152 @@
+"""
+كاش الصفحات وأجزاء القوالب
+
+لكل نموذج تعتمد عليه صفحة رقم إصدار في الكاش يُرفع عند أي حفظ أو حذف (الإشارات في
+signals.py، والكتابة الجماعية تستدعي bump يدويًا). مفتاح الصفحة فيه اسم الـ view
+ومعاملات الرابط وإصدارات نماذجها، فلا حاجة لحذف أي صفحة: تغيّر الإصدار يكفي.
+
+الصفحة الكاملة فيها اسم المستخدم ورمز CSRF، لذلك مفتاحها خاص بالمستخدم وسر CSRF في
+الكوكي؛ أما الجداول الكبيرة داخل القوالب فتُخزّن بوسم {% cache %} بمفتاح فيه
+cache_version فقط، فتُشارك بين كل المستخدمين.
+
+عدادات الإصابة/الإخفاق لكل view في هذه العملية، وتُقرأ من stats() (وتُصفّر من صفحة التشخيص)،
+وتُضاف أيضًا لعداد cache_requests_total في courses.metrics الذي لا يُصفّر.
+"""
+import functools
+import hashlib
+import json
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from courses import metrics, routing
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+_bypassed = Counter()
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def _version_key(model):
+    return f"pagecache:version:{model._meta.label_lower}"
+
+
+def version(*models):
+    """إصدار بيانات النماذج المعطاة كنص واحد (يصلح جزءًا من مفتاح)"""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, None)
+            versions[key] = cache.get(key, 1)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(model):
+    """رفع إصدار النموذج الآن وبعد الـ commit، حتى لا يعيد طلب متزامن ملء الكاش بقيم قديمة"""
+    key = _version_key(model)
+
+    def incr():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+    incr()
+    transaction.on_commit(incr)
+
+
+def fragment_context(*models):
+    """متغيرات وسم {% cache cache_timeout <اسم> cache_version ... %} في القوالب"""
+    return {'cache_version': version(*models), 'cache_timeout': _timeout()}
+
+
+def _page_key(name, request, data_version):
+    raw = json.dumps([
+        data_version,
+        sorted(request.GET.lists()),
+        request.user.pk,
+        request.META.get('CSRF_COOKIE', ''),
+    ], ensure_ascii=False)
+    return f"pagecache:view:{name}:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _cacheable(request):
+    # الرسائل تُعرض مرة واحدة، وبدون كوكي CSRF سيحمل الرمز في الصفحة سرًا جديدًا
+    return (
+        request.method == 'GET'
+        and request.user.is_authenticated
+        and 'CSRF_COOKIE' in request.META
+        and not len(messages.get_messages(request))
+    )
+
+
+def cache_view(*models, timeout=None):
+    """
+    يخزّن استجابة GET الناجحة للـ view حتى يتغير أحد النماذج المعطاة.
+    يوضع بعد login_required حتى لا تُخزّن صفحات الزوار.
+    """
+    def decorator(view):
+        name = view.__name__
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                with _lock:
+                    _bypassed[name] += 1
+                metrics.inc('cache_requests_total', {'cache': 'page', 'name': name, 'result': 'bypassed'})
+                return view(request, *args, **kwargs)
+
+            key = _page_key(name, request, version(*models))
+            cached = cache.get(key)
+            with _lock:
+                (_misses if cached is None else _hits)[name] += 1
+            metrics.inc('cache_requests_total', {
+                'cache': 'page', 'name': name, 'result': 'misses' if cached is None else 'hits',
+            })
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            # ما يُخزّن يُقرأ من default حتى لا تُحفظ نسخة القراءة المتأخرة تحت الإصدار الجديد
+            with routing.primary():
+                response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout or _timeout())
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """عدادات كل view في هذه العملية مع نسبة الإصابة"""
+    with _lock:
+        names = sorted(set(_hits) | set(_misses) | set(_bypassed))
+        views = {}
+        for name in names:
+            hits, misses = _hits[name], _misses[name]
+            views[name] = {
+                'hits': hits,
+                'misses': misses,
+                'bypassed': _bypassed[name],
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+    return {'backend': settings.CACHES['default']['BACKEND'], 'views': views}
+
+
+def reset_stats():
+    with _lock:
+        _hits.clear()
+        _misses.clear()
+        _bypassed.clear()
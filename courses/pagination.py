@@ -0,0 +1,147 @@
+"""
+ترقيم الصفحات بالمؤشر (keyset pagination)
+
+بدل OFFSET الذي يقرأ ويتجاهل كل الصفوف السابقة، نطلب الصفوف التي تأتي بعد آخر صف
+في الصفحة الحالية حسب ترتيب ثابت وفريد، فتبقى تكلفة أي صفحة ثابتة مهما كان عمقها.
+"""
+import base64
+import binascii
+import datetime
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+# تحت هذا العدد نحسب العدد الحقيقي، فوقه نكتفي بتقدير Postgres
+ESTIMATE_THRESHOLD = 10000
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+    prev_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder يقص الأجزاء من الثانية إلى ميلي ثانية، والمؤشر يحتاج القيمة كاملة
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=_CursorEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """ترجع قائمة القيم، أو None إذا كان المؤشر تالفًا"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _keyset_filter(ordering, values, backwards):
+    """
+    (a, b) بعد (x, y) حسب الترتيب تعني: a بعد x، أو a = x و b بعد y ... إلخ
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending != backwards else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def keyset_page(queryset, ordering, page_size, after=None, before=None):
+    """
+    ترجع KeysetPage للصفحة التي تلي المؤشر after أو تسبق المؤشر before.
+    ordering يجب أن يكون ترتيبًا فريدًا (آخر حقل فيه مفتاح فريد).
+    """
+    fields = [f.lstrip('-') for f in ordering]
+    backwards = False
+    cursor = decode_cursor(after, len(ordering))
+    if cursor is None:
+        cursor = decode_cursor(before, len(ordering))
+        backwards = cursor is not None
+
+    if cursor is not None:
+        try:
+            # القيم من الرابط: مؤشر معدّل يدويًا (تاريخ أو رقم غير صالح) يعيد الصفحة الأولى
+            condition = _keyset_filter(ordering, cursor, backwards)
+            queryset.filter(condition)
+        except (ValueError, TypeError, ValidationError):
+            cursor, backwards = None, False
+
+    if backwards:
+        order = [f[1:] if f.startswith('-') else f'-{f}' for f in ordering]
+    else:
+        order = list(ordering)
+
+    queryset = queryset.order_by(*order)
+    if cursor is not None:
+        queryset = queryset.filter(condition)
+
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def row_cursor(row):
+        return encode_cursor([getattr(row, f) for f in fields])
+
+    has_next = (has_more if not backwards else True) and bool(rows)
+    has_prev = (cursor is not None if not backwards else has_more) and bool(rows)
+    return KeysetPage(
+        items=rows,
+        next_cursor=row_cursor(rows[-1]) if has_next else None,
+        prev_cursor=row_cursor(rows[0]) if has_prev else None,
+    )
+
+
+def estimated_count(queryset):
+    """
+    عدد صفوف رخيص: للجداول الكبيرة بدون فلاتر نقرأ تقدير Postgres من pg_class
+    بدل COUNT(*) الذي يمسح الجدول كله، وفي غير ذلك نحسب العدد الحقيقي.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= ESTIMATE_THRESHOLD:
+            return row[0]
+    return queryset.count()
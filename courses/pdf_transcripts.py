@@ -0,0 +1,232 @@
+"""
+توليد كشوف الدرجات الرسمية (PDF) بالجملة
+
+البيانات تُقرأ مرة واحدة باستعلام واحد مرتب حسب الطالب (transcripts.transcript_rows) وتُجمع
+في قواميس بسيطة لكل طالب، ثم يُرسم كل كشف في عملية منفصلة (ProcessPoolExecutor) لأن الرسم
+يستهلك المعالج. دفعة واحدة فقط تكون قيد الرسم بينما نجهّز التالية، فتبقى الذاكرة محدودة.
+الناتج ملف zip أو مجلد فيه ملف لكل طالب.
+
+الرسم يحتاج مكتبة reportlab (اختيارية). لعرض العربية بشكل صحيح يلزم خط TTF يدعمها
+(الإعداد TRANSCRIPT_FONT) ومكتبتا arabic_reshaper و python-bidi إن وُجدتا.
+"""
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+from courses.transcripts import transcript_rows
+
+BATCH_SIZE = 200
+FONT_NAME = 'TranscriptFont'
+
+_font = None
+
+
+class TranscriptRenderError(Exception):
+    """لا يمكن رسم الكشوف (مكتبة reportlab غير مثبتة مثلًا)"""
+
+
+@dataclass
+class PipelineStats:
+    transcripts: int = 0
+    elapsed: float = 0.0
+    bytes_written: int = 0
+
+    @property
+    def per_second(self):
+        return self.transcripts / self.elapsed if self.elapsed else 0.0
+
+
+def iter_transcripts(section_id=None, year=None, student_ids=None):
+    """كشف لكل طالب كقاموس بسيط قابل للإرسال لعملية أخرى"""
+    current = None
+    for row in transcript_rows(section_id, year, student_ids=student_ids):
+        (student_id, name, section, year_, semester, code, material, hours, grade,
+         semester_gpa, cumulative_gpa) = row
+        if current is None or current['student_id'] != student_id:
+            if current is not None:
+                yield current
+            current = {
+                'student_id': student_id, 'name': name, 'section': section or '',
+                'cumulative_gpa': cumulative_gpa, 'semesters': [],
+            }
+        semesters = current['semesters']
+        if not semesters or (semesters[-1]['year'], semesters[-1]['semester']) != (year_, semester):
+            semesters.append({'year': year_, 'semester': semester, 'gpa': semester_gpa, 'courses': []})
+        semesters[-1]['courses'].append((code, material, hours, grade))
+    if current is not None:
+        yield current
+
+
+def _shape(text):
+    """تجهيز النص العربي للرسم من اليمين لليسار إذا توفرت المكتبات"""
+    text = '' if text is None else str(text)
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return text
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def _register_font():
+    """تسجيل الخط مرة واحدة في كل عملية"""
+    global _font
+    if _font is None:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        path = getattr(settings, 'TRANSCRIPT_FONT', None)
+        if path and os.path.exists(path):
+            pdfmetrics.registerFont(TTFont(FONT_NAME, path))
+            _font = FONT_NAME
+        else:
+            _font = 'Helvetica'
+    return _font
+
+
+def render_pdf(transcript):
+    """يرسم كشف طالب واحد ويرجع محتوى ملف PDF"""
+    try:
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    except ImportError:
+        raise TranscriptRenderError("توليد ملفات PDF يحتاج مكتبة reportlab (pip install reportlab)")
+
+    font = _register_font()
+    title = ParagraphStyle('title', fontName=font, fontSize=16, alignment=1, spaceAfter=6)
+    normal = ParagraphStyle('normal', fontName=font, fontSize=10, alignment=2)
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e0e7ff')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cbd5e1')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ])
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, title=f"Transcript {transcript['student_id']}")
+    story = [
+        Paragraph(_shape("كشف الدرجات"), title),
+        Paragraph(_shape(f"الطالب: {transcript['name']}  -  رقم القيد: {transcript['student_id']}"), normal),
+        Paragraph(_shape(f"القسم: {transcript['section']}"), normal),
+        Spacer(1, 10),
+    ]
+    # الأعمدة من اليسار لليمين لأن الجدول يُرسم LTR والنص العربي مُعالج مسبقًا
+    header = [_shape(h) for h in ("الدرجة", "الساعات", "المادة", "الرمز")]
+    for term in transcript['semesters']:
+        story.append(Paragraph(_shape(f"السمستر {term['semester']} ({term['year']})"), normal))
+        rows = [header] + [
+            ['' if grade is None else f"{grade:g}", hours, _shape(material), code]
+            for code, material, hours, grade in term['courses']
+        ]
+        table = Table(rows, colWidths=[60, 50, 250, 80])
+        table.setStyle(table_style)
+        story += [table, Paragraph(_shape(f"معدل السمستر: {term['gpa']}"), normal), Spacer(1, 8)]
+    story.append(Paragraph(_shape(f"المعدل التراكمي: {transcript['cumulative_gpa']}"), title))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _render_task(transcript):
+    return f"{transcript['student_id']}.pdf", render_pdf(transcript)
+
+
+def _warm_up():
+    """مهمة فارغة تُنشئ عمليات الـ pool قبل فتح أي cursor"""
+
+
+class _ZipWriter:
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED)  # PDF مضغوط أصلًا
+
+    def write(self, name, data):
+        self.archive.writestr(name, data)
+
+    def close(self):
+        self.archive.close()
+
+
+class _DirWriter:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name, data):
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_transcripts(output, section_id=None, year=None, student_ids=None,
+                         workers=0, batch_size=BATCH_SIZE, progress=None):
+    """
+    يكتب كشف PDF لكل طالب في output (ينتهي بـ .zip أو مسار مجلد) ويرجع PipelineStats.
+    progress(stats) تُستدعى بعد كل دفعة.
+    """
+    render_pdf({'student_id': 0, 'name': '', 'section': '', 'cumulative_gpa': 0, 'semesters': []})  # فحص reportlab مبكرًا
+
+    workers = workers or os.cpu_count() or 1
+    writer = _ZipWriter(output) if str(output).lower().endswith('.zip') else _DirWriter(output)
+    stats = PipelineStats()
+    started = time.perf_counter()
+
+    def collect(futures):
+        for future in futures:
+            name, data = future.result()
+            writer.write(name, data)
+            stats.transcripts += 1
+            stats.bytes_written += len(data)
+        stats.elapsed = time.perf_counter() - started
+        if progress:
+            progress(stats)
+
+    try:
+        if workers == 1:
+            for batch in _batches(iter_transcripts(section_id, year, student_ids), batch_size):
+                for transcript in batch:
+                    name, data = _render_task(transcript)
+                    writer.write(name, data)
+                    stats.transcripts += 1
+                    stats.bytes_written += len(data)
+                stats.elapsed = time.perf_counter() - started
+                if progress:
+                    progress(stats)
+        else:
+            # العمليات الفرعية لا تستخدم قاعدة البيانات، فلا نورّثها اتصالات مفتوحة: ProcessPoolExecutor
+            # ينشئ العمليات عند أول submit، لذلك ننشئها بمهمة فارغة قبل أن يفتح iter_transcripts الـ cursor
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pool.submit(_warm_up).result()
+                in_flight = []
+                for batch in _batches(iter_transcripts(section_id, year, student_ids), batch_size):
+                    submitted = [pool.submit(_render_task, transcript) for transcript in batch]
+                    collect(in_flight)
+                    in_flight = submitted
+                collect(in_flight)
+    finally:
+        writer.close()
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,122 @@
+"""
+الأسبقيات المتعدية للمواد
+
+نحتفظ بجدول إغلاق (closure) فيه لكل مادة كل المواد المطلوبة قبلها مباشرة أو بشكل غير
+مباشر مع طول أقصر مسار. عند تغيير أسبقية نعيد حساب صفوف المادة المتأثرة وما يعتمد عليها
+فقط، ونفحص أهلية سلة مواد كاملة لطالب بعدد ثابت من الاستعلامات.
+"""
+from collections import defaultdict, deque
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from courses.grading import PASS_GRADE
+from courses.models import GradeRecord, Material, MaterialPrerequisite, MaterialPrerequisiteClosure
+
+
+def _load_graph():
+    """ترجع (أسبقيات كل مادة، المواد التي تعتمد على كل مادة) من جدول الأسبقيات باستعلام واحد"""
+    parents = defaultdict(set)
+    children = defaultdict(set)
+    edges = MaterialPrerequisite.objects.filter(prerequisite__isnull=False)\
+        .values_list('material_id', 'prerequisite_id')
+    for material_id, prerequisite_id in edges:
+        parents[material_id].add(prerequisite_id)
+        children[prerequisite_id].add(material_id)
+    return parents, children
+
+
+def _walk(start, graph):
+    """BFS من مادة واحدة، ترجع {مادة: أقصر مسافة}"""
+    distances = {}
+    queue = deque((node, 1) for node in graph.get(start, ()))
+    while queue:
+        node, depth = queue.popleft()
+        if node in distances:
+            continue
+        distances[node] = depth
+        queue.extend((n, depth + 1) for n in graph.get(node, ()) if n not in distances)
+    return distances
+
+
+def would_create_cycle(material_id, prerequisite_id):
+    """هل إضافة prerequisite كأسبقية لـ material تصنع دورة؟"""
+    if material_id == prerequisite_id:
+        return True
+    # دورة إذا كانت المادة نفسها مطلوبة (بشكل متعدٍ) قبل الأسبقية الجديدة
+    return MaterialPrerequisiteClosure.objects.filter(
+        ancestor_id=material_id, descendant_id=prerequisite_id
+    ).exists()
+
+
+def check_no_cycle(material_id, prerequisite_id):
+    if prerequisite_id is None:
+        return
+    if would_create_cycle(material_id, prerequisite_id):
+        raise ValidationError(
+            "لا يمكن إضافة هذه الأسبقية لأنها تصنع دورة (المادة مطلوبة قبل أسبقيتها)",
+            code='prerequisite_cycle',
+        )
+
+
+def refresh_closure(material_id):
+    """نعيد حساب صفوف الإغلاق للمادة ولكل المواد التي تعتمد عليها"""
+    parents, children = _load_graph()
+    affected = {material_id} | set(_walk(material_id, children))
+    _replace_rows(affected, parents)
+
+
+def rebuild_closure():
+    """نبني جدول الإغلاق كله من الصفر"""
+    parents, _ = _load_graph()
+    affected = set(Material.objects.values_list('id', flat=True))
+    _replace_rows(affected, parents, clear_all=True)
+
+
+def _replace_rows(affected, parents, clear_all=False):
+    rows = [
+        MaterialPrerequisiteClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+        for descendant in affected
+        for ancestor, depth in _walk(descendant, parents).items()
+    ]
+    with transaction.atomic():
+        if clear_all:
+            MaterialPrerequisiteClosure.objects.all().delete()
+        else:
+            MaterialPrerequisiteClosure.objects.filter(descendant_id__in=affected).delete()
+        MaterialPrerequisiteClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def passed_material_ids(student):
+    """المواد التي نجح فيها الطالب"""
+    return set(
+        GradeRecord.objects.filter(student=student, grade__gte=PASS_GRADE)
+        .values_list('material_id', flat=True)
+    )
+
+
+def check_eligibility(student, material_ids):
+    """
+    تفحص سلة مواد كاملة لطالب وترجع {رقم المادة: [المواد المطلوبة غير المجتازة]}
+    للمواد غير المؤهلة فقط. استعلامان: الأسبقيات المتعدية للسلة، ودرجات الطالب الناجحة.
+    """
+    material_ids = {int(m) for m in material_ids}
+    if not material_ids:
+        return {}
+
+    required = defaultdict(set)
+    for ancestor_id, descendant_id in MaterialPrerequisiteClosure.objects.filter(
+        descendant_id__in=material_ids
+    ).values_list('ancestor_id', 'descendant_id'):
+        required[descendant_id].add(ancestor_id)
+    if not required:
+        return {}
+
+    passed = passed_material_ids(student)
+    missing = {}
+    for material_id, prerequisites in required.items():
+        not_passed = prerequisites - passed
+        if not_passed:
+            missing[material_id] = sorted(not_passed)
+    return missing
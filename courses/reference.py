@@ -0,0 +1,106 @@
+"""
+كاش البيانات المرجعية: الأقسام والمواد والأسبقيات
+
+هذه الجداول تتغير مرات قليلة في الفصل بينما تقرؤها أغلب الصفحات في كل طلب، فنحفظ
+كل قائمة في الكاش (CACHES['default']: ذاكرة محلية أو ملفات أو Redis حسب الإعداد
+CACHE_BACKEND) تحت مفتاح فيه رقم إصدار. إشارات post_save/post_delete على Section و
+Material و MaterialPrerequisite ترفع الإصدار (الآن وبعد الـ commit) فتصبح كل المفاتيح
+القديمة غير مستخدمة دفعة واحدة. الكتابة بـ bulk_create/update لا ترسل إشارات، فيجب
+استدعاء invalidate() بعدها.
+
+عدادات الإصابة/الإخفاق لكل عملية (process) وتُقرأ من stats()، وتُضاف أيضًا لعداد
+cache_requests_total في courses.metrics.
+"""
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from courses import metrics, routing
+from courses.models import Material, MaterialPrerequisite, Section
+
+VERSION_KEY = 'reference:version'
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _timeout():
+    return getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def version():
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, 1, None)
+        current = cache.get(VERSION_KEY, 1)
+    return current
+
+
+def invalidate():
+    """رفع الإصدار الآن وبعد الـ commit، حتى لا يعيد طلب متزامن ملء الكاش بقيم قديمة"""
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 2, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _cached(name, load):
+    key = f"reference:{version()}:{name}"
+    value = cache.get(key)
+    with _lock:
+        (_misses if value is None else _hits)[name] += 1
+    metrics.inc('cache_requests_total', {
+        'cache': 'reference', 'name': name, 'result': 'misses' if value is None else 'hits',
+    })
+    if value is None:
+        with routing.primary():
+            value = load()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def sections():
+    """كل الأقسام (كائنات Section) مرتبة حسب الرقم"""
+    return _cached('sections', lambda: list(Section.objects.order_by('id')))
+
+
+def materials():
+    """كل المواد مرتبة حسب الرمز، بدون وصف المادة"""
+    return _cached('materials', lambda: list(Material.objects.defer('description').order_by('code')))
+
+
+def prerequisites():
+    """[(اسم المادة، اسم المتطلب أو None)] لكل صفوف الأسبقيات"""
+    return _cached('prerequisites', lambda: list(
+        MaterialPrerequisite.objects.order_by('material__name').values_list('material__name', 'prerequisite__name')
+    ))
+
+
+def stats():
+    """عدادات الكاش في هذه العملية: المجموع ولكل قائمة"""
+    with _lock:
+        names = sorted(set(_hits) | set(_misses))
+        per_name = {name: {'hits': _hits[name], 'misses': _misses[name]} for name in names}
+        hits, misses = sum(_hits.values()), sum(_misses.values())
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'version': version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'lists': per_name,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _hits.clear()
+        _misses.clear()
@@ -0,0 +1,165 @@
+"""
+حجز المقاعد في مجموعات المحاضرات أثناء فترة التسجيل
+
+عند فتح التسجيل يطلب مئات الطلاب نفس المجموعات في نفس اللحظة، لذلك لا نقرأ العداد ثم
+نكتبه: نحجز المقعد بـ UPDATE مشروط واحد (seats_taken < capacity) يقفل الصف حتى نهاية
+الـ transaction، وإذا لم يتغير أي صف فالمجموعة ممتلئة ويدخل الطالب قائمة الانتظار.
+"""
+from dataclasses import dataclass
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from courses import prerequisites
+from courses.enrollment import current_term
+from courses.models import Enrollment, LectureGroup, RegistrationWindow, WaitlistEntry
+
+ENROLLED = 'enrolled'
+WAITLISTED = 'waitlisted'
+ALREADY_ENROLLED = 'already_enrolled'
+
+
+class RegistrationError(Exception):
+    """خطأ يمنع الحجز، مع رسالة تُعرض للمستخدم"""
+
+    code = 'registration_error'
+
+
+class RegistrationClosed(RegistrationError):
+    code = 'closed'
+
+
+class PrerequisitesNotMet(RegistrationError):
+    code = 'prerequisites'
+
+    def __init__(self, message, missing):
+        super().__init__(message)
+        self.missing = missing
+
+
+@dataclass
+class ReservationResult:
+    status: str
+    enrollment: Enrollment = None
+    waitlist_position: int = None
+
+
+def waitlist_position(entry):
+    return WaitlistEntry.objects.filter(lecture_group_id=entry.lecture_group_id, id__lte=entry.id).count()
+
+
+def reserve_seat(student, lecture_group, enforce_window=True, today=None):
+    """
+    يحجز مقعدًا للطالب في المجموعة، أو يضيفه لقائمة الانتظار إذا كانت ممتلئة.
+    ترفع RegistrationClosed خارج فترة التسجيل و PrerequisitesNotMet إذا لم يجتز الأسبقيات.
+    """
+    if enforce_window and not RegistrationWindow.is_open():
+        raise RegistrationClosed("التسجيل مغلق حاليًا")
+
+    missing = prerequisites.check_eligibility(student, [lecture_group.material_id])
+    if missing:
+        raise PrerequisitesNotMet("لم يتم اجتياز أسبقيات المادة", missing[lecture_group.material_id])
+
+    semester, year = current_term(today)
+    try:
+        with transaction.atomic():
+            # UPDATE مشروط: ينجح فقط إذا بقي مقعد، ويقفل صف المجموعة حتى الـ commit
+            reserved = LectureGroup.objects.filter(
+                pk=lecture_group.pk, seats_taken__lt=F('capacity')
+            ).update(seats_taken=F('seats_taken') + 1)
+
+            if reserved:
+                enrollment = Enrollment.objects.create(
+                    student=student, material_id=lecture_group.material_id,
+                    semester=semester, year=year, group=lecture_group.group,
+                )
+                return ReservationResult(ENROLLED, enrollment=enrollment)
+    except IntegrityError:
+        # الطالب منزّل للمادة مسبقًا في هذا السمستر، والـ rollback أرجع المقعد
+        return ReservationResult(ALREADY_ENROLLED)
+
+    if Enrollment.objects.filter(
+        student=student, material_id=lecture_group.material_id, semester=semester, year=year
+    ).exists():
+        return ReservationResult(ALREADY_ENROLLED)
+
+    entry, _ = WaitlistEntry.objects.get_or_create(student=student, lecture_group=lecture_group)
+    return ReservationResult(WAITLISTED, waitlist_position=waitlist_position(entry))
+
+
+def release_seat(enrollment):
+    """
+    يلغي تنزيل مادة محجوزة في مجموعة. إذا كان هناك طالب في الانتظار يأخذ المقعد مباشرة
+    (أول طلب غير مقفول من طلب آخر: SKIP LOCKED)، وإلا يُنقص العداد.
+    ترجع تنزيل الطالب الذي رُقّي من الانتظار أو None.
+    """
+    with transaction.atomic():
+        enrollment.seat_released = True  # حتى لا يحرر seat_freed نفس المقعد مرة ثانية
+        enrollment.delete()
+        return _fill_seat(enrollment.material_id, enrollment.semester, enrollment.year, enrollment.group)
+
+
+def _fill_seat(material_id, semester, year, group):
+    """مقعد تحرر في المجموعة: يأخذه أول طالب في الانتظار، وإلا يُنقص العداد"""
+    with transaction.atomic():
+        lecture_group = LectureGroup.objects.filter(
+            material_id=material_id, group=group
+        ).first() if group else None
+        if lecture_group is None:
+            return None
+
+        while True:
+            entry = WaitlistEntry.objects.select_for_update(skip_locked=True)\
+                .filter(lecture_group=lecture_group).order_by('created_at', 'id').first()
+            if entry is None:
+                LectureGroup.objects.filter(pk=lecture_group.pk, seats_taken__gt=0)\
+                    .update(seats_taken=F('seats_taken') - 1)
+                return None
+
+            entry.delete()
+            try:
+                with transaction.atomic():
+                    # المقعد ينتقل كما هو للطالب التالي، فلا يتغير العداد
+                    return Enrollment.objects.create(
+                        student_id=entry.student_id, material_id=material_id,
+                        semester=semester, year=year, group=lecture_group.group,
+                    )
+            except IntegrityError:
+                # الطالب التالي نزّل المادة بطريقة أخرى، نجرب من بعده
+                continue
+
+
+def seat_freed(enrollment):
+    """
+    حذف تنزيل محجوز بغير release_seat (لوحة الإدارة، حذف الطالب أو المادة، delete على
+    queryset): يُحرر المقعد بعد الـ commit، فإذا حُذفت المادة نفسها لا نرقّي أحدًا إليها.
+    """
+    if not enrollment.group or getattr(enrollment, 'seat_released', False):
+        return
+    args = (enrollment.material_id, enrollment.semester, enrollment.year, enrollment.group)
+    transaction.on_commit(lambda: _fill_seat(*args))
+
+
+def reconcile_seats(semester, year):
+    """
+    يعيد حساب seats_taken لكل المجموعات من تنزيلات السمستر المحجوزة فعلًا (شبكة أمان إذا
+    ضاع تحرير مقعد). ترجع [(المجموعة، القيمة القديمة، الجديدة)] للمجموعات التي تغيرت.
+    """
+    rows = Enrollment.objects.filter(semester=semester, year=year, group__isnull=False)\
+        .values('material_id', 'group').annotate(count=Count('id')).order_by()
+    taken = {(row['material_id'], row['group']): row['count'] for row in rows}
+    changed = []
+    with transaction.atomic():
+        for lecture_group in LectureGroup.objects.select_for_update().order_by('id'):
+            # القيد lecture_groups_not_overbooked لا يسمح بأكثر من السعة
+            count = min(taken.get((lecture_group.material_id, lecture_group.group), 0), lecture_group.capacity)
+            if count != lecture_group.seats_taken:
+                changed.append((lecture_group, lecture_group.seats_taken, count))
+                lecture_group.seats_taken = count
+        LectureGroup.objects.bulk_update([row[0] for row in changed], ['seats_taken'])
+    return changed
+
+
+def queue_depth():
+    """عدد الطلبات في قوائم الانتظار لكل المجموعات"""
+    return WaitlistEntry.objects.count()
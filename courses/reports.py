@@ -0,0 +1,131 @@
+"""
+طبقة التقارير
+
+صفحة التقارير لا تستعلم من جداول التنزيلات والدرجات مباشرة: أمر refresh_reports (من cron
+أو من زر التحديث) يجمع الأرقام بعدد قليل من استعلامات GROUP BY ويستبدل جداول report_*
+داخل transaction واحدة، فيرى القرّاء النسخة القديمة كاملة حتى تكتمل الجديدة.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from courses.grading import PASS_GRADE
+from courses.models import (
+    Enrollment, GPADistributionReport, GradeRecord, Material, MaterialTermReport, ReportRefresh,
+    SectionTermReport, SemesterGPA, Section,
+)
+
+GPA_BUCKET = 10
+BATCH_SIZE = 1000
+
+
+def _gpa_bucket(gpa):
+    return min(int(gpa // GPA_BUCKET) * GPA_BUCKET, 100 - GPA_BUCKET)
+
+
+def _material_rows():
+    materials = {
+        row['id']: row for row in Material.objects.values('id', 'name', 'section_id', 'section__name')
+    }
+    rows = {}
+
+    def row_for(material_id, semester, year):
+        key = (material_id, semester, year)
+        if key not in rows:
+            material = materials[material_id]
+            rows[key] = MaterialTermReport(
+                material_id=material_id, material_name=material['name'],
+                section_id=material['section_id'], section_name=material['section__name'] or '',
+                semester=semester, year=year,
+            )
+        return rows[key]
+
+    for row in Enrollment.objects.values('material_id', 'semester', 'year').annotate(n=Count('id')).order_by():
+        row_for(row['material_id'], row['semester'], row['year']).enrolled_count = row['n']
+
+    for row in GradeRecord.objects.filter(grade__isnull=False).values('material_id', 'semester', 'year')\
+            .annotate(graded=Count('id'), passed=Count('id', filter=Q(grade__gte=PASS_GRADE)), total=Sum('grade'))\
+            .order_by():
+        report = row_for(row['material_id'], row['semester'], row['year'])
+        report.graded_count = row['graded']
+        report.passed_count = row['passed']
+        report.grade_sum = row['total'] or 0
+
+    return list(rows.values())
+
+
+def _section_rows():
+    names = dict(Section.objects.values_list('id', 'name'))
+    rows = {}
+
+    def row_for(section_id, semester, year):
+        key = (section_id, semester, year)
+        if key not in rows:
+            rows[key] = SectionTermReport(
+                section_id=section_id, section_name=names.get(section_id, ''), semester=semester, year=year,
+            )
+        return rows[key]
+
+    for row in Enrollment.objects.values('student__section_id', 'semester', 'year')\
+            .annotate(students=Count('student', distinct=True), n=Count('id')).order_by():
+        report = row_for(row['student__section_id'], row['semester'], row['year'])
+        report.students_count = row['students']
+        report.enrollments_count = row['n']
+
+    for row in GradeRecord.objects.filter(grade__isnull=False).values('student__section_id', 'semester', 'year')\
+            .annotate(graded=Count('id'), passed=Count('id', filter=Q(grade__gte=PASS_GRADE))).order_by():
+        report = row_for(row['student__section_id'], row['semester'], row['year'])
+        report.graded_count = row['graded']
+        report.passed_count = row['passed']
+
+    # المعدلات من ملخص semester_gpas: صف لكل طالب وسمستر، نجمعها في Python مع الفئات
+    distribution = defaultdict(int)
+    for section_id, semester, year, points, hours in SemesterGPA.objects.filter(total_hours__gt=0)\
+            .values_list('student__section_id', 'semester', 'year', 'total_points', 'total_hours')\
+            .iterator(chunk_size=5000):
+        gpa = points / hours
+        report = row_for(section_id, semester, year)
+        report.gpa_sum += gpa
+        report.gpa_count += 1
+        distribution[(section_id, semester, year, _gpa_bucket(gpa))] += 1
+
+    buckets = [
+        GPADistributionReport(section_id=section_id, semester=semester, year=year, bucket=bucket, students_count=n)
+        for (section_id, semester, year, bucket), n in distribution.items()
+    ]
+    return list(rows.values()), buckets
+
+
+def refresh_reports():
+    """يعيد بناء كل جداول التقارير ويرجع سجل ReportRefresh"""
+    started = timezone.now()
+    materials = _material_rows()
+    sections, buckets = _section_rows()
+
+    with transaction.atomic():
+        for model, rows in ((MaterialTermReport, materials), (SectionTermReport, sections),
+                            (GPADistributionReport, buckets)):
+            model.objects.all().delete()
+            model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        return ReportRefresh.objects.create(
+            started_at=started, finished_at=timezone.now(), rows=len(materials) + len(sections) + len(buckets),
+        )
+
+
+def last_refresh():
+    return ReportRefresh.objects.first()
+
+
+def is_stale(max_age_minutes):
+    refresh = last_refresh()
+    return refresh is None or refresh.finished_at < timezone.now() - timedelta(minutes=max_age_minutes)
+
+
+def available_terms():
+    """السمسترات الموجودة في التقارير، الأحدث أولًا"""
+    return list(
+        SectionTermReport.objects.values_list('year', 'semester').distinct().order_by('-year', '-semester')
+    )
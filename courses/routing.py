@@ -0,0 +1,120 @@
+"""
+توجيه القراءة لنسخة القراءة (replica) في صفحات العرض والتقارير
+
+الصفحات المعلّمة بـ read_from_replica تقرأ طلبات GET فيها من REPLICA_DATABASE، وكل
+ما عداها (الكتابة، و POST، وكل الصفحات الأخرى) يبقى على default. إذا لم تُعرّف نسخة
+قراءة في DATABASES يعمل كل شيء على default كما كان.
+
+القراءة بعد الكتابة: بعد أي طلب يغيّر البيانات (POST وما شابه) يضع
+ReplicaStickinessMiddleware كوكي لمدة REPLICA_STICKY_SECONDS تقرأ خلالها كل صفحات نفس
+المتصفح من default، حتى لا يرى المستخدم بيانات قبل تعديله بسبب تأخر النسخ.
+
+ما يُخزّن في الكاش المشترك (البيانات المرجعية، المعدلات، الصفحات) يُقرأ دائمًا من default
+بـ primary()، وإلا قد تُخزّن نسخة متأخرة عن آخر تعديل تحت إصدار الكاش الجديد.
+"""
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'db_primary_until'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', '')
+    return alias if alias and alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    """القراءة من نسخة القراءة داخل read_from_replica فقط، والكتابة والترحيل على default"""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # نفس البيانات في القاعدتين
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def primary():
+    """كل القراءات داخله من default حتى داخل صفحة تقرأ من نسخة القراءة"""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _stream_from_replica(chunks):
+    # الرد المتدفق يقرأ من القاعدة بعد خروج الـ view، فنفعّل التوجيه عند إنتاج كل جزء فقط
+    iterator = iter(chunks)
+    while True:
+        token = _use_replica.set(True)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _use_replica.reset(token)
+        yield chunk
+
+
+def read_from_replica(view):
+    """
+    decorator لصفحات العرض: قراءات طلب GET/HEAD من نسخة القراءة، إلا خلال نافذة
+    القراءة بعد الكتابة. يوضع بعد login_required وقبل cache_view.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or getattr(request, 'db_sticky', False) \
+                or replica_alias() is None:
+            return view(request, *args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+        if response.streaming:
+            response.streaming_content = _stream_from_replica(response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """يحدد هل الطلب داخل نافذة القراءة بعد الكتابة، ويفتح النافذة بعد كل طلب يكتب"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            until = 0
+        request.db_sticky = until > time.time()
+
+        response = self.get_response(request)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and replica_alias() is not None:
+            seconds = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, f"{time.time() + seconds:.0f}", max_age=seconds,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,402 @@
+"""
+توليد جدول المحاضرات آليًا
+
+كل مجموعة محاضرات (مادة + مجموعة) تحتاج عددًا من المحاضرات الأسبوعية (ساعات المادة ÷ 2)
+وكل محاضرة تأخذ خانة (يوم، وقت) وقاعة تتسع لها. القيود الصلبة:
+  - القاعة لا تُحجز مرتين في نفس الخانة.
+  - مجموعة الطلاب (القسم، اسم المجموعة) لا تحضر محاضرتين في نفس الخانة.
+  - المواد التي يشترك فيها نفس الطلاب حسب Enrollment لا تتزامن.
+وقيد مرن: محاضرات نفس المجموعة في أيام مختلفة.
+
+الحل: ترتيب جشع (الأكثر تقييدًا أولًا، وأصغر قاعة كافية) ثم بحث محلي (min-conflicts مع
+قائمة tabu) على المحاضرات المتعارضة. كل إعادة تشغيل ببذرة مختلفة، ويمكن توزيعها على
+عدة عمليات، ونأخذ أفضل حل.
+"""
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import combinations
+
+from django.db import connections, transaction
+
+from courses import page_cache
+from courses.clashes import SLOT_COUNT, slot_from_index
+from courses.enrollment import current_term
+from courses.models import Enrollment, Lecture, LectureGroup, Material
+from courses.timetable import TIME_SLOTS
+
+SLOT_HOURS = 2          # طول المحاضرة الواحدة بالساعات
+HARD = 1000             # وزن كسر قيد صلب مقابل القيد المرن
+TABU_TENURE = 10
+RANDOM_WALK = 0.05
+
+
+class SchedulingError(Exception):
+    """مدخلات لا يمكن بناء جدول منها (لا توجد قاعات، أو مجموعة أكبر من كل القاعات)"""
+
+
+@dataclass
+class Session:
+    material_id: int
+    group: str
+    size: int
+    cohort: tuple       # (القسم، المجموعة): نفس الطلاب، أو (material، المادة، المجموعة) لمادة بلا قسم
+
+
+@dataclass
+class Problem:
+    sessions: list
+    rooms: list                                     # [(اسم القاعة، السعة أو None بلا حد)]
+    conflicts: list = field(default_factory=list)   # لكل محاضرة: محاضرات لا تتزامن معها
+    siblings: list = field(default_factory=list)    # محاضرات نفس (المادة، المجموعة)
+    allowed_rooms: list = field(default_factory=list)
+
+    @property
+    def conflict_pairs(self):
+        return sum(len(c) for c in self.conflicts) // 2
+
+
+@dataclass
+class Solution:
+    slots: list
+    rooms: list
+    violations: int
+    spread_penalty: int
+    seed: int
+    elapsed: float                  # زمن هذه المحاولة
+    steps: int = 0
+    total_elapsed: float = 0.0      # زمن solve كله (كل المحاولات)
+
+    @property
+    def feasible(self):
+        return self.violations == 0
+
+
+def make_problem(sessions, rooms, shared_pairs=()):
+    """
+    تبني Problem من المحاضرات والقاعات.
+    shared_pairs: أزواج ((مادة، مجموعة)، (مادة، مجموعة)) يشترك فيها طلاب فلا تتزامن.
+    """
+    if not rooms:
+        raise SchedulingError("لا توجد قاعات")
+
+    conflicts = [set() for _ in sessions]
+    by_cohort = defaultdict(list)
+    by_group = defaultdict(list)
+    for i, session in enumerate(sessions):
+        by_cohort[session.cohort].append(i)
+        by_group[(session.material_id, session.group)].append(i)
+
+    def link(a, b):
+        if a != b:
+            conflicts[a].add(b)
+            conflicts[b].add(a)
+
+    for members in by_cohort.values():
+        for a, b in combinations(members, 2):
+            link(a, b)
+    for first, second in shared_pairs:
+        for a in by_group.get(first, ()):
+            for b in by_group.get(second, ()):
+                link(a, b)
+
+    siblings = [[j for j in by_group[(s.material_id, s.group)] if j != i] for i, s in enumerate(sessions)]
+
+    # القاعات الصالحة لكل محاضرة مرتبة من الأصغر (best fit) حتى تبقى الكبيرة للمجموعات الكبيرة
+    by_size = sorted(range(len(rooms)), key=lambda r: float('inf') if rooms[r][1] is None else rooms[r][1])
+    allowed = []
+    for session in sessions:
+        fitting = [r for r in by_size if rooms[r][1] is None or rooms[r][1] >= session.size]
+        if not fitting:
+            raise SchedulingError(
+                f"لا توجد قاعة تتسع لمجموعة {session.group} من المادة {session.material_id} ({session.size})"
+            )
+        allowed.append(fitting)
+
+    return Problem(sessions=sessions, rooms=list(rooms), conflicts=[list(c) for c in conflicts],
+                   siblings=siblings, allowed_rooms=allowed)
+
+
+def _day(slot):
+    return slot // len(TIME_SLOTS)
+
+
+class _Search:
+    def __init__(self, problem, seed):
+        self.problem = problem
+        self.rng = random.Random(seed)
+        n = len(problem.sessions)
+        self.slot = [-1] * n
+        self.room = [-1] * n
+        self.occupants = [[[] for _ in range(SLOT_COUNT)] for _ in problem.rooms]
+        self.tabu = {}
+
+    def _place(self, i, t, r):
+        self.slot[i], self.room[i] = t, r
+        self.occupants[r][t].append(i)
+
+    def _remove(self, i):
+        t, r = self.slot[i], self.room[i]
+        if t >= 0:
+            self.occupants[r][t].remove(i)
+            self.slot[i] = self.room[i] = -1
+        return t, r
+
+    def _slot_costs(self, i):
+        """تكلفة كل خانة للمحاضرة i (بدون القاعة): التعارضات الصلبة والقيد المرن"""
+        costs = [0] * SLOT_COUNT
+        slot = self.slot
+        for j in self.problem.conflicts[i]:
+            if slot[j] >= 0:
+                costs[slot[j]] += HARD
+        days = {_day(slot[j]) for j in self.problem.siblings[i] if slot[j] >= 0}
+        if days:
+            for t in range(SLOT_COUNT):
+                if _day(t) in days:
+                    costs[t] += 1
+        return costs
+
+    def _best_room(self, i, t):
+        best, best_load = None, None
+        for r in self.problem.allowed_rooms[i]:
+            load = len(self.occupants[r][t])
+            if load == 0:
+                return r, 0
+            if best is None or load < best_load:
+                best, best_load = r, load
+        return best, best_load
+
+    def _best_move(self, i, step=None):
+        costs = self._slot_costs(i)
+        # الحد الأدنى لكل خانة معروف قبل اختيار القاعة، فنقف عندما يتجاوز أفضل ما وجدناه
+        order = sorted(range(SLOT_COUNT), key=lambda t: (costs[t], self.rng.random()))
+        best, best_cost = None, None
+        for t in order:
+            if best_cost is not None and costs[t] > best_cost:
+                break
+            if step is not None and self.tabu.get((i, t), -1) > step:
+                continue
+            r, load = self._best_room(i, t)
+            cost = costs[t] + load * HARD
+            if best_cost is None or cost < best_cost:
+                best, best_cost = (t, r), cost
+        if best is None:  # كل الخانات tabu
+            t = order[0]
+            best = (t, self._best_room(i, t)[0])
+        return best
+
+    def _violations(self, i):
+        t, r = self.slot[i], self.room[i]
+        slot = self.slot
+        count = sum(1 for j in self.problem.conflicts[i] if slot[j] == t)
+        return count + len(self.occupants[r][t]) - 1
+
+    def greedy(self):
+        p = self.problem
+        order = sorted(range(len(p.sessions)),
+                       key=lambda i: (len(p.allowed_rooms[i]), -len(p.conflicts[i]), self.rng.random()))
+        for i in order:
+            self._place(i, *self._best_move(i))
+
+    def local_search(self, max_steps, deadline):
+        pending = [i for i in range(len(self.slot)) if self._violations(i) > 0]
+        queued = set(pending)
+        step = 0
+        while pending and step < max_steps and time.perf_counter() < deadline:
+            k = self.rng.randrange(len(pending))
+            i = pending[k]
+            if self._violations(i) == 0:
+                pending[k] = pending[-1]
+                pending.pop()
+                queued.discard(i)
+                continue
+
+            step += 1
+            old_t, old_r = self._remove(i)
+            if self.rng.random() < RANDOM_WALK:
+                t = self.rng.randrange(SLOT_COUNT)
+                move = (t, self._best_room(i, t)[0])
+            else:
+                move = self._best_move(i, step)
+            self.tabu[(i, old_t)] = step + TABU_TENURE
+            self._place(i, *move)
+
+            # المحاضرات التي قد تتأثر بالنقل: المتعارضة معها والمشاركة في القاعة
+            affected = [j for j in self.problem.conflicts[i] if self.slot[j] in (old_t, move[0])]
+            affected += self.occupants[old_r][old_t] + self.occupants[move[1]][move[0]]
+            for j in affected:
+                if j not in queued and self._violations(j) > 0:
+                    pending.append(j)
+                    queued.add(j)
+        return step
+
+
+def evaluate(problem, slots, rooms):
+    """عدد أزواج القيود الصلبة المكسورة، وعدد المحاضرات المكررة في نفس اليوم لنفس المجموعة"""
+    violations = 0
+    for i, neighbours in enumerate(problem.conflicts):
+        violations += sum(1 for j in neighbours if j > i and slots[j] == slots[i])
+    load = defaultdict(int)
+    for t, r in zip(slots, rooms):
+        load[(r, t)] += 1
+    violations += sum(k * (k - 1) // 2 for k in load.values())
+
+    spread = 0
+    for i, siblings in enumerate(problem.siblings):
+        spread += sum(1 for j in siblings if j > i and _day(slots[j]) == _day(slots[i]))
+    return violations, spread
+
+
+def solve_once(problem, seed, max_steps=200_000, time_limit=30.0, deadline=None):
+    """deadline: وقت انتهاء التشغيل كله (time.time())، يقصّر time_limit إذا كان أقرب"""
+    started = time.perf_counter()
+    search = _Search(problem, seed)
+    search.greedy()
+    stop = started + time_limit
+    if deadline is not None:
+        stop = min(stop, time.perf_counter() + max(deadline - time.time(), 0))
+    steps = search.local_search(max_steps, stop)
+    violations, spread = evaluate(problem, search.slot, search.room)
+    return Solution(slots=search.slot, rooms=search.room, violations=violations, spread_penalty=spread,
+                    seed=seed, elapsed=time.perf_counter() - started, steps=steps)
+
+
+def _solve_task(args):
+    problem, seed, max_steps, deadline, required = args
+    # المحاولة التي يأتي دورها بعد انتهاء الوقت لا تبدأ، إلا الأولى حتى يوجد حل دائمًا
+    if not required and time.time() >= deadline:
+        return None
+    return solve_once(problem, seed, max_steps, time_limit=max(deadline - time.time(), 0), deadline=deadline)
+
+
+def solve(problem, restarts=4, workers=1, seed=0, max_steps=200_000, time_limit=30.0):
+    """
+    تشغّل restarts محاولات ببذور مختلفة (على workers عملية، 0 = عدد المعالجات) وترجع أفضل
+    حل: الأقل كسرًا للقيود الصلبة ثم الأقل تكرارًا في نفس اليوم.
+    time_limit حد للتشغيل كله وليس لكل محاولة: المحاولات التي لا تبدأ قبله تُتخطى.
+    """
+    started = time.perf_counter()
+    if not problem.sessions:
+        return Solution(slots=[], rooms=[], violations=0, spread_penalty=0, seed=seed, elapsed=0.0)
+
+    deadline = time.time() + time_limit
+    tasks = [(problem, seed + k, max_steps, deadline, k == 0) for k in range(max(restarts, 1))]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        # العمليات الفرعية لا تستخدم قاعدة البيانات، فلا نورّثها اتصالات مفتوحة
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            solutions = list(pool.map(_solve_task, tasks))
+    else:
+        solutions = [_solve_task(task) for task in tasks]
+    best = min((s for s in solutions if s is not None), key=lambda s: (s.violations, s.spread_penalty, s.elapsed))
+    best.total_elapsed = time.perf_counter() - started
+    return best
+
+
+def parse_rooms(text):
+    """"A101:40, B2:120, Lab" -> [('A101', 40), ('B2', 120), ('Lab', None)]"""
+    rooms = []
+    for item in text.replace('\n', ',').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, capacity = item.partition(':')
+        try:
+            rooms.append((name.strip(), int(capacity) if capacity.strip() else None))
+        except ValueError:
+            raise SchedulingError(f"سعة غير صحيحة للقاعة {name.strip()}")
+    return rooms
+
+
+def existing_rooms():
+    """القاعات المستخدمة في الجدول الحالي، بدون حد للسعة"""
+    names = Lecture.objects.order_by('room').values_list('room', flat=True).distinct()
+    return [(name, None) for name in names]
+
+
+def build_problem(rooms=None, semester=None, year=None, material_ids=None):
+    """
+    تبني المسألة من قاعدة البيانات للسمستر المعطى (الحالي افتراضيًا):
+    مجموعات LectureGroup بسعتها، والمواد المنزّلة بدون مجموعات كمجموعة واحدة "1" بعدد المنزّلين.
+    """
+    if semester is None or year is None:
+        semester, year = current_term()
+    rooms = rooms if rooms is not None else existing_rooms()
+
+    enrollments = Enrollment.objects.filter(semester=semester, year=year)
+    if material_ids is not None:
+        enrollments = enrollments.filter(material_id__in=material_ids)
+
+    groups = defaultdict(dict)  # {مادة: {مجموعة: الحجم}}
+    lecture_groups = LectureGroup.objects.all()
+    if material_ids is not None:
+        lecture_groups = lecture_groups.filter(material_id__in=material_ids)
+    for material_id, group, capacity in lecture_groups.values_list('material_id', 'group', 'capacity'):
+        groups[material_id][group] = capacity
+
+    enrolled_counts = defaultdict(int)
+    per_student = defaultdict(set)
+    for student_id, material_id, group in enrollments.values_list('student_id', 'material_id', 'group')\
+            .iterator(chunk_size=5000):
+        enrolled_counts[material_id] += 1
+        per_student[student_id].add((material_id, group))
+
+    for material_id, count in enrolled_counts.items():
+        if material_id not in groups:
+            groups[material_id]['1'] = count
+
+    materials = Material.objects.in_bulk(list(groups))
+    sessions = []
+    for material_id in sorted(groups):
+        material = materials.get(material_id)
+        if material is None:
+            continue
+        per_week = max(1, material.hours // SLOT_HOURS)
+        for group, size in sorted(groups[material_id].items()):
+            # مادة بلا قسم لا تشترك مجموعتها مع مواد أخرى (كما في clashes._keys)
+            cohort = (material.section_id, group) if material.section_id is not None \
+                else ('material', material_id, group)
+            sessions.extend(Session(material_id, group, size, cohort) for _ in range(per_week))
+
+    # الطالب يحضر مجموعته فقط؛ إذا لم تُسجّل مجموعته نعرفها فقط عندما للمادة مجموعة واحدة
+    single_group = {m: next(iter(g)) for m, g in groups.items() if len(g) == 1}
+    shared = set()
+    for taken in per_student.values():
+        keys = set()
+        for material_id, group in taken:
+            group = group or single_group.get(material_id)
+            if group is not None and group in groups.get(material_id, ()):
+                keys.add((material_id, group))
+        shared.update(combinations(sorted(keys), 2))
+
+    return make_problem(sessions, rooms, shared)
+
+
+def assignments(problem, solution):
+    """الحل كقائمة قواميس (مادة، مجموعة، يوم، وقت، قاعة) مرتبة حسب الخانة"""
+    rows = []
+    for i, session in enumerate(problem.sessions):
+        day, time_slot = slot_from_index(solution.slots[i])
+        rows.append({
+            'material_id': session.material_id,
+            'group': session.group,
+            'day': day,
+            'time': time_slot,
+            'room': problem.rooms[solution.rooms[i]][0],
+        })
+    rows.sort(key=lambda row: (row['day'], row['time'], row['room']))
+    return rows
+
+
+@transaction.atomic
+def apply_solution(problem, solution):
+    """يستبدل محاضرات المواد المجدولة بالحل. ترجع عدد المحاضرات المكتوبة"""
+    material_ids = {s.material_id for s in problem.sessions}
+    Lecture.objects.filter(material_id__in=material_ids).delete()
+    lectures = Lecture.objects.bulk_create([Lecture(**row) for row in assignments(problem, solution)])
+    page_cache.bump(Lecture)  # bulk_create لا يرسل إشارات
+    return len(lectures)
@@ -0,0 +1,84 @@
+"""
+البحث في المواد
+
+نخزن لكل مادة نصًا موحّدًا (search_name) من الرمز والاسم بعد إزالة التشكيل وتوحيد
+أشكال الألف والياء والتاء المربوطة، فيطابق البحث "الاحصاء" و "الإحصاء" مثلًا.
+على Postgres يخدم فهرس trigram (GIN) على search_name البحث بـ contains (LIKE) والبحث
+التقريبي بالعامل % (trigram_similar)، ودرجة التشابه للترتيب فقط: دالة similarity في
+WHERE لا يخدمها الفهرس وتمسح كل المواد.
+"""
+import re
+
+from django.apps import apps
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from courses.models import Material
+
+_TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+_TATWEEL = '\u0640'
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+})
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_arabic(text):
+    """توحيد النص للبحث: حروف صغيرة، بدون تشكيل أو تطويل، وأشكال موحدة للحروف"""
+    if not text:
+        return ''
+    text = _TASHKEEL.sub('', str(text)).replace(_TATWEEL, '')
+    text = text.translate(_LETTERS).lower()
+    return _SPACES.sub(' ', text).strip()
+
+
+def material_search_text(code, name):
+    return normalize_arabic(f"{code or ''} {name or ''}")
+
+
+def filter_materials(queryset, text):
+    """فلتر بالنص الموحّد (يطابق الرمز أو الاسم)"""
+    normalized = normalize_arabic(text)
+    if not normalized:
+        return queryset
+    return queryset.filter(search_name__contains=normalized)
+
+
+def search_materials(query, limit=10):
+    """
+    ترجع أفضل limit مادة للنص المعطى، مرتبة حسب:
+    تطابق الرمز تمامًا، ثم بداية الرمز، ثم بداية الاسم، ثم التشابه (على Postgres).
+    """
+    normalized = normalize_arabic(query)
+    if not normalized:
+        return []
+
+    raw = str(query).strip()
+    materials = Material.objects.annotate(
+        rank=Case(
+            When(code__iexact=raw, then=Value(3)),
+            When(code__istartswith=raw, then=Value(2)),
+            When(search_name__contains=f" {normalized}", then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+    ordering = ['-rank', 'name']
+    condition = Q(search_name__contains=normalized)
+    if connections[materials.db].vendor == 'postgresql' and apps.is_installed('django.contrib.postgres'):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # العامل % يستخدم حد pg_trgm.similarity_threshold (0.3 افتراضيًا)
+        condition |= Q(search_name__trigram_similar=normalized)
+        materials = materials.annotate(similarity=TrigramSimilarity('search_name', normalized))
+        ordering = ['-rank', '-similarity', 'name']
+
+    return list(
+        materials.filter(condition)
+        .only('id', 'code', 'name', 'hours')
+        .order_by(*ordering)[:limit]
+    )
@@ -0,0 +1,219 @@
+"""
+توليد بيانات تجريبية بأحجام حقيقية لقياس أداء الصفحات
+
+كل شيء يُكتب بـ bulk_create على دفعات، والبيانات قابلة للتكرار (نفس seed = نفس البيانات).
+الأسبقيات رسم بياني بلا دورات: كل مادة تعتمد فقط على مواد أقدم منها في نفس القسم.
+لأن bulk_create لا يرسل إشارات ولا يستدعي save، نعيد بعد الكتابة بناء الجداول المشتقة
+(إغلاق الأسبقيات، ملخص المعدلات، التقارير) ونبطل الكاش يدويًا.
+
+الصفوف المولدة معلّمة (أقسام seed-، مواد SEED، بريد seed.invalid) ولا يُسمح بتشغيل
+ثانٍ فوقها؛ استخدم قاعدة بيانات جديدة أو manage.py flush.
+"""
+import random
+import time
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Max
+
+from courses import gpa, page_cache, prerequisites, reference, reports
+from courses.models import (
+    Enrollment, GradeRecord, Lecture, LectureGroup, Material, MaterialPrerequisite, Section, Student,
+)
+from courses.search import material_search_text
+from courses.timetable import DAYS, TIME_SLOTS
+
+SECTION_PREFIX = 'seed-'
+MATERIAL_PREFIX = 'SEED'
+EMAIL_DOMAIN = 'seed.invalid'
+BATCH_SIZE = 2000
+
+
+class SeedError(Exception):
+    """لا يمكن توليد البيانات (بيانات من تشغيل سابق موجودة مثلًا)"""
+
+
+@dataclass
+class SeedConfig:
+    sections: int = 10
+    students: int = 10000
+    materials: int = 400
+    max_prerequisites: int = 2      # أقصى عدد أسبقيات مباشرة للمادة
+    terms: int = 6                  # سمسترات سابقة مرصودة لكل طالب
+    per_term: int = 5               # مواد كل طالب في السمستر
+    groups: int = 2                 # مجموعات المحاضرات لكل مادة
+    capacity: int = 60
+    year: int = 2025                # سنة السمستر الحالي (غير مرصود)
+    seed: int = 1
+    batch_size: int = BATCH_SIZE
+
+
+@dataclass
+class SeedStats:
+    counts: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+
+
+def _terms(config):
+    """السمسترات من الأقدم للأحدث: [(السمستر، السنة)]، والأخير هو الحالي"""
+    terms = []
+    for i in range(config.terms, -1, -1):
+        year, semester = divmod(config.year * 2 + 1 - i, 2)
+        terms.append((str(semester + 1), str(year)))
+    return terms
+
+
+def _grade(rng):
+    return float(min(100, max(0, round(rng.gauss(68, 16)))))
+
+
+def _create_sections(config):
+    first = (Section.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+    Section.objects.bulk_create([
+        Section(id=first + i, name=f"{SECTION_PREFIX}{first + i}") for i in range(config.sections)
+    ])
+    return list(range(first, first + config.sections))
+
+
+def _create_materials(config, rng, section_ids):
+    materials = []
+    for i in range(config.materials):
+        code, name = f"{MATERIAL_PREFIX}{i:05d}", f"مادة تجريبية {i}"
+        materials.append(Material(
+            code=code, name=name, hours=rng.choice((2, 3, 3, 4)),
+            section_id=section_ids[i % len(section_ids)],
+            search_name=material_search_text(code, name),
+        ))
+    Material.objects.bulk_create(materials, batch_size=config.batch_size)
+    rows = Material.objects.filter(code__startswith=MATERIAL_PREFIX).order_by('code').values_list('id', 'section_id')
+    by_section = {}
+    for material_id, section_id in rows:
+        by_section.setdefault(section_id, []).append(material_id)
+    return by_section
+
+
+def _create_prerequisites(config, rng, by_section):
+    rows = []
+    for material_ids in by_section.values():
+        for i, material_id in enumerate(material_ids):
+            count = min(i, rng.randint(0, config.max_prerequisites))
+            for prerequisite_id in rng.sample(material_ids[:i], count):
+                rows.append(MaterialPrerequisite(material_id=material_id, prerequisite_id=prerequisite_id))
+    MaterialPrerequisite.objects.bulk_create(rows, batch_size=config.batch_size)
+    prerequisites.rebuild_closure()
+    return len(rows)
+
+
+def _create_lectures(config, rng, by_section):
+    groups, lectures = [], []
+    rooms = [f"R{n}" for n in range(1, max(2, config.materials * config.groups // 10) + 1)]
+    slots = [(day, slot) for day in DAYS for slot in TIME_SLOTS]
+    for material_ids in by_section.values():
+        for material_id in material_ids:
+            for g in range(1, config.groups + 1):
+                groups.append(LectureGroup(material_id=material_id, group=str(g), capacity=config.capacity))
+                for day, slot in rng.sample(slots, 2):
+                    lectures.append(Lecture(
+                        material_id=material_id, group=str(g), room=rng.choice(rooms), day=day, time=slot,
+                    ))
+    LectureGroup.objects.bulk_create(groups, batch_size=config.batch_size)
+    Lecture.objects.bulk_create(lectures, batch_size=config.batch_size)
+    return len(groups), len(lectures)
+
+
+def _create_students(config, rng, section_ids):
+    for offset in range(0, config.students, config.batch_size):
+        Student.objects.bulk_create([
+            Student(
+                name=f"طالب تجريبي {i}", section_id=rng.choice(section_ids),
+                email=f"student{i}@{EMAIL_DOMAIN}", password='-',
+            )
+            for i in range(offset, min(offset + config.batch_size, config.students))
+        ])
+    return list(
+        Student.objects.filter(email__endswith='@' + EMAIL_DOMAIN).order_by('id_student')
+        .values_list('id_student', 'section_id')
+    )
+
+
+def _create_records(config, rng, students, by_section):
+    """تنزيلات ودرجات كل الطلاب، تُكتب كل batch_size طالب حتى تبقى الذاكرة محدودة"""
+    terms = _terms(config)
+    current = terms[-1]
+    enrollments, grades = [], []
+    counts = {'enrollments': 0, 'grade_records': 0}
+
+    def flush():
+        Enrollment.objects.bulk_create(enrollments, batch_size=config.batch_size)
+        GradeRecord.objects.bulk_create(grades, batch_size=config.batch_size)
+        counts['enrollments'] += len(enrollments)
+        counts['grade_records'] += len(grades)
+        enrollments.clear()
+        grades.clear()
+
+    for n, (student_id, section_id) in enumerate(students, 1):
+        material_ids = by_section[section_id]
+        picked = rng.sample(material_ids, min(len(material_ids), len(terms) * config.per_term))
+        # السمستر الحالي أولًا حتى يكون لكل طالب تنزيلات حالية مهما قلّت مواد قسمه
+        for t, (semester, year) in enumerate(reversed(terms)):
+            for material_id in picked[t * config.per_term:(t + 1) * config.per_term]:
+                grade = None if (semester, year) == current else _grade(rng)
+                enrollments.append(Enrollment(
+                    student_id=student_id, material_id=material_id, semester=semester, year=year, grade=grade,
+                    group=str(rng.randint(1, config.groups)) if (semester, year) == current else None,
+                ))
+                if grade is not None:
+                    grades.append(GradeRecord(
+                        student_id=student_id, material_id=material_id, semester=semester, year=year, grade=grade,
+                    ))
+        if n % config.batch_size == 0:
+            flush()
+    flush()
+    return counts
+
+
+def seed(config, progress=None):
+    """
+    يولد البيانات حسب SeedConfig ويرجع SeedStats.
+    progress(رسالة) تُستدعى بعد كل مرحلة.
+    """
+    if Section.objects.filter(name__startswith=SECTION_PREFIX).exists() or \
+            Material.objects.filter(code__startswith=MATERIAL_PREFIX).exists():
+        raise SeedError("توجد بيانات تجريبية من تشغيل سابق؛ استخدم قاعدة بيانات جديدة أو manage.py flush")
+    if config.sections < 1 or config.materials < 1:
+        raise SeedError("يلزم قسم واحد ومادة واحدة على الأقل")
+
+    rng = random.Random(config.seed)
+    stats = SeedStats()
+    started = time.perf_counter()
+
+    def step(name, value):
+        stats.counts[name] = value
+        stats.elapsed = time.perf_counter() - started
+        if progress:
+            progress(f"{name}: {value} ({stats.elapsed:.1f} ث)")
+
+    with transaction.atomic():
+        section_ids = _create_sections(config)
+        step('sections', len(section_ids))
+        by_section = _create_materials(config, rng, section_ids)
+        step('materials', config.materials)
+        step('prerequisites', _create_prerequisites(config, rng, by_section))
+        lecture_groups, lectures = _create_lectures(config, rng, by_section)
+        step('lecture_groups', lecture_groups)
+        step('lectures', lectures)
+        students = _create_students(config, rng, section_ids)
+        step('students', config.students)
+        for name, value in _create_records(config, rng, students, by_section).items():
+            step(name, value)
+
+    step('semester_gpas', gpa.rebuild_all())
+    seeded = Student.objects.filter(email__endswith='@' + EMAIL_DOMAIN).values('id_student')
+    step('stored_gpas', gpa.refresh_stored_gpas(student_ids=seeded))
+    step('report_rows', reports.refresh_reports().rows)
+
+    reference.invalidate()
+    for model in (Section, Material, MaterialPrerequisite, Lecture):
+        page_cache.bump(model)
+    stats.elapsed = time.perf_counter() - started
+    return stats
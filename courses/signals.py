@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses import gpa, metrics, page_cache, prerequisites, reference, registration
+from courses.models import Enrollment, GradeRecord, Lecture, Material, MaterialPrerequisite, Section
+
+
+# عند حذف درجة نطرح أثرها من ملخص المعدل
+@receiver(post_delete, sender=GradeRecord)
+def remove_grade_from_gpa(sender, instance, **kwargs):
+    state = instance.gpa_state()
+    if state is None:
+        gpa.recompute_semester(instance.student_id, instance.semester, instance.year)
+        return
+    gpa.apply_grade_change(state, None)
+
+
+# أي تغيير في الأسبقيات يعيد حساب الإغلاق المتعدي للمادة وما يعتمد عليها
+@receiver(post_save, sender=MaterialPrerequisite)
+def refresh_prerequisite_closure(sender, instance, **kwargs):
+    prerequisites.refresh_closure(instance.material_id)
+
+
+@receiver(post_delete, sender=MaterialPrerequisite)
+def refresh_prerequisite_closure_after_delete(sender, instance, **kwargs):
+    # بعد الـ commit حتى لا نكتب صفوفًا لمادة تُحذف في نفس العملية
+    material_id = instance.material_id
+    transaction.on_commit(lambda: prerequisites.refresh_closure(material_id))
+
+
+# الأقسام والمواد والأسبقيات محفوظة في كاش البيانات المرجعية وفي كاش الصفحات
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Material)
+@receiver(post_delete, sender=Material)
+@receiver(post_save, sender=MaterialPrerequisite)
+@receiver(post_delete, sender=MaterialPrerequisite)
+def invalidate_reference_cache(sender, **kwargs):
+    reference.invalidate()
+    page_cache.bump(sender)
+
+
+@receiver(post_save, sender=Lecture)
+@receiver(post_delete, sender=Lecture)
+def invalidate_lecture_pages(sender, **kwargs):
+    page_cache.bump(Lecture)
+
+
+# حذف تنزيل محجوز من أي مكان (لوحة الإدارة، حذف طالب أو مادة) يحرر مقعده في المجموعة
+@receiver(post_delete, sender=Enrollment)
+def free_enrollment_seat(sender, instance, **kwargs):
+    registration.seat_freed(instance)
+
+
+# عدادات الكتابة لمقاييس Prometheus؛ الكتابة بـ bulk_create تُعد في مكانها (grading)
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: metrics.inc('enrollments_created_total', {'source': 'save'}))
+
+
+@receiver(post_save, sender=GradeRecord)
+def count_grade(sender, instance, **kwargs):
+    transaction.on_commit(lambda: metrics.inc('grades_written_total', {'source': 'save'}))
+
+
+@receiver(connection_created)
+def count_db_connection(sender, connection, **kwargs):
+    metrics.inc('db_connections_opened_total', {'alias': connection.alias})
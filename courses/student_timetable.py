@@ -0,0 +1,157 @@
+"""
+الجدول الأسبوعي للطالب وتعارضات مواده
+
+نربط تنزيلات الطالب في السمستر بمحاضرات مجموعاتها باستعلامين ثابتين (التنزيلات ثم
+المحاضرات) مهما كان عدد المواد. لكل (مادة، مجموعة) قناع بتات لخاناتها، والتعارض هو
+تقاطع أقنعة مواد الطالب. إذا لم تُسجّل مجموعة الطالب نعتمد المجموعة الوحيدة للمادة إن
+وُجدت، وإلا نعرض المادة كغير محددة المجموعة ولا ندخلها في فحص التعارض.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from courses.clashes import SLOT_COUNT, slot_bit, slot_from_index
+from courses.enrollment import current_term
+from courses.models import Enrollment, Lecture, Student
+from courses.timetable import DAY_LABELS, TIME_LABELS, build_grid
+
+
+@dataclass
+class StudentTimetable:
+    grid: list
+    conflicts: list = field(default_factory=list)       # [{'day', 'time', ..., 'materials': [...]}]
+    unresolved: list = field(default_factory=list)      # مواد بدون مجموعة محددة
+    unscheduled: list = field(default_factory=list)     # مواد بلا محاضرات في الجدول
+
+
+def _lectures_by_group(material_ids):
+    """{(مادة، مجموعة): [محاضرات]} و {مادة: {مجموعات}} باستعلام واحد"""
+    by_group = defaultdict(list)
+    groups = defaultdict(set)
+    for lecture in Lecture.objects.filter(material_id__in=material_ids).select_related('material'):
+        by_group[(lecture.material_id, lecture.group)].append(lecture)
+        groups[lecture.material_id].add(lecture.group)
+    return by_group, groups
+
+
+def resolve_group(material_id, group, groups):
+    """مجموعة الطالب في المادة: المسجلة في التنزيل أو المجموعة الوحيدة للمادة"""
+    if group:
+        return group if group in groups.get(material_id, ()) else None
+    options = groups.get(material_id, ())
+    return next(iter(options)) if len(options) == 1 else None
+
+
+def _slot_conflicts(mask_items):
+    """
+    mask_items: [(مفتاح، قناع)]. ترجع {رقم الخانة: [مفاتيح]} للخانات التي تجمع أكثر من مفتاح.
+    """
+    seen = duplicated = 0
+    for _, mask in mask_items:
+        duplicated |= seen & mask
+        seen |= mask
+    if not duplicated:
+        return {}
+    slots = {}
+    for index in range(SLOT_COUNT):
+        bit = 1 << index
+        if duplicated & bit:
+            slots[index] = [key for key, mask in mask_items if mask & bit]
+    return slots
+
+
+def _describe(slots, names):
+    conflicts = []
+    for index, keys in sorted(slots.items()):
+        day, time = slot_from_index(index)
+        conflicts.append({
+            'day': day,
+            'day_label': DAY_LABELS[day],
+            'time': time,
+            'time_label': TIME_LABELS[time],
+            'materials': [{'material_id': m, 'material': names.get(m), 'group': g} for m, g in keys],
+        })
+    return conflicts
+
+
+def student_timetable(student, semester=None, year=None):
+    """جدول الطالب في السمستر (الحالي افتراضيًا) مع التعارضات"""
+    if semester is None or year is None:
+        semester, year = current_term()
+
+    enrollments = list(
+        Enrollment.objects.filter(student=student, semester=semester, year=year)
+        .select_related('material').only('material', 'group', 'material__name')
+    )
+    by_group, groups = _lectures_by_group([e.material_id for e in enrollments])
+
+    result = StudentTimetable(grid=[])
+    lectures = []
+    masks = []
+    for enrollment in enrollments:
+        material = enrollment.material
+        if material.id not in groups:
+            result.unscheduled.append(material)
+            continue
+        group = resolve_group(material.id, enrollment.group, groups)
+        if group is None:
+            result.unresolved.append(material)
+            continue
+        mask = 0
+        for lecture in by_group[(material.id, group)]:
+            mask |= slot_bit(lecture.day, lecture.time)
+            lectures.append(lecture)
+        masks.append(((material.id, group), mask))
+
+    slots = _slot_conflicts(masks)
+    clashing = {(slot_from_index(i), key) for i, keys in slots.items() for key in keys}
+    for lecture in lectures:
+        lecture.conflict = ((lecture.day, lecture.time), (lecture.material_id, lecture.group)) in clashing
+
+    result.grid = build_grid(lectures)
+    result.conflicts = _describe(slots, {e.material_id: e.material.name for e in enrollments})
+    return result
+
+
+def section_conflict_report(section_id, semester=None, year=None):
+    """
+    تقرير التعارضات لكل طلاب القسم دفعة واحدة: استعلام للطلاب، واستعلام للتنزيلات،
+    واستعلام للمحاضرات. الطلاب الذين لهم نفس مجموعة المواد يُحسبون مرة واحدة.
+    """
+    if semester is None or year is None:
+        semester, year = current_term()
+
+    names = dict(Student.objects.filter(section_id=section_id).values_list('id_student', 'name'))
+    taken = defaultdict(list)
+    material_names = {}
+    for student_id, material_id, group, material_name in Enrollment.objects.filter(
+        student__section_id=section_id, semester=semester, year=year,
+    ).values_list('student_id', 'material_id', 'group', 'material__name').iterator(chunk_size=5000):
+        taken[student_id].append((material_id, group))
+        material_names[material_id] = material_name
+
+    masks = defaultdict(int)
+    groups = defaultdict(set)
+    for material_id, group, day, time in Lecture.objects.filter(material_id__in=list(material_names))\
+            .values_list('material_id', 'group', 'day', 'time'):
+        masks[(material_id, group)] |= slot_bit(day, time)
+        groups[material_id].add(group)
+
+    memo = {}
+    report = []
+    for student_id, items in taken.items():
+        keys = set()
+        for material_id, group in items:
+            group = resolve_group(material_id, group, groups)
+            if group is not None:
+                keys.add((material_id, group))
+        signature = frozenset(keys)
+        if signature not in memo:
+            memo[signature] = _slot_conflicts(sorted((key, masks[key]) for key in keys))
+        if memo[signature]:
+            report.append({
+                'student_id': student_id,
+                'name': names.get(student_id),
+                'conflicts': _describe(memo[signature], material_names),
+            })
+    report.sort(key=lambda row: row['student_id'])
+    return {'students': len(names), 'enrolled': len(taken), 'with_conflicts': len(report), 'report': report}
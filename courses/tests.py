@@ -1,3 +1,896 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from datetime import date
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from courses import (
+    benchmarks, clashes, database, enrollment, exports, gpa, grade_import, grading, instrumentation, log_handlers,
+    metrics, reference, registration, reports, routing, scheduling, student_timetable, transcripts,
+)
+from courses.instrumentation import budget_for
+from courses.models import (
+    Enrollment, GPADistributionReport, GradeRecord, Lecture, LectureGroup, Material, MaterialPrerequisite,
+    MaterialPrerequisiteClosure, MaterialTermReport, Section, SectionTermReport, SemesterGPA, Student, WaitlistEntry,
+)
+from courses.pagination import encode_cursor, keyset_page
+from courses.prerequisites import check_no_cycle
+from courses.seeding import SeedConfig, seed
+
+
+def _gpa_rows():
+    return {
+        (r.student_id, r.semester, r.year): (round(r.total_points, 6), r.total_hours, r.grades_count)
+        for r in SemesterGPA.objects.all()
+    }
+
+
+class QueryBudgetTests(TestCase):
+    """كل صفحة لها حد في QUERY_BUDGETS تُطلب بالكاش فارغًا، والتجاوز يُفشل الطلب"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(SeedConfig(sections=2, students=30, materials=12, terms=2, per_term=2, capacity=5))
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @override_settings(QUERY_BUDGETS_ENFORCE=True)
+    def test_budgeted_pages_stay_within_budget(self):
+        covered = set()
+        for name, url_name, url in benchmarks.build_urls():
+            if budget_for(url_name) is None:
+                continue
+            covered.add(url_name)
+            with self.subTest(name=name):
+                cache.clear()
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+        self.assertEqual(covered, set(settings.QUERY_BUDGETS))
+
+    def test_render_time_is_recorded_per_page(self):
+        instrumentation.reset()
+        self.client.get(reverse('sections_page'))
+        row = next(r for r in instrumentation.snapshot() if r['url_name'] == 'sections_page')
+        self.assertGreater(row['avg_render_ms'], 0)
+        self.assertLessEqual(row['avg_render_ms'], row['avg_ms'])
+
+    def test_request_log_directory_is_created_on_first_line(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'logs', 'requests.log')
+            handler = log_handlers.RotatingFileHandler(path, encoding='utf-8')
+            self.assertFalse(os.path.exists(os.path.dirname(path)))
+            handler.emit(logging.makeLogRecord({'msg': '{}'}))
+            handler.close()
+            self.assertTrue(os.path.exists(path))
+
+    def test_cold_benchmark_refuses_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with override_settings(CACHES=shared), mock.patch.object(benchmarks.cache, 'clear') as clear:
+                with self.assertRaises(benchmarks.BenchmarkError):
+                    benchmarks.run(cold=True, only={'sections_page'})
+                clear.assert_not_called()
+                with override_settings(BENCHMARK_CLEAR_CACHE=True):
+                    benchmarks.run(repeat=1, cold=True, only={'sections_page'})
+                clear.assert_called()
+
+        result = benchmarks.run(repeat=1, cold=True, only={'sections_page'})
+        self.assertEqual(result['views']['sections_page']['status'], 200)
+
+
+class GPATests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        cls.materials = [
+            Material.objects.create(code=f'CS{i}', name=f"مادة {i}", hours=hours, section=section)
+            for i, hours in enumerate((2, 3, 4))
+        ]
+
+    def test_delta_updates_match_recompute(self):
+        """تحديث المجاميع بفرق الدرجة يساوي إعادة الحساب من سجلات الدرجات"""
+        records = [
+            GradeRecord.objects.create(student=self.student, material=m, semester='1', year='2024', grade=grade)
+            for m, grade in zip(self.materials, (70, 85.5, 40))
+        ]
+        GradeRecord.objects.create(student=self.student, material=self.materials[0], semester='2', year='2024',
+                                   grade=90)
+        record = GradeRecord.objects.get(pk=records[1].pk)
+        record.grade = 60
+        record.save()
+        records[2].delete()
+
+        incremental = _gpa_rows()
+        gpa.recompute_semesters(incremental)
+        self.assertEqual(_gpa_rows(), incremental)
+        gpa.rebuild_all()
+        self.assertEqual(_gpa_rows(), incremental)
+
+        row = SemesterGPA.objects.get(student=self.student, semester='1', year='2024')
+        self.assertEqual(row.gpa, round((70 * 2 + 60 * 3) / 5, 2))
+
+    def test_deferred_save_moving_term_updates_both_terms(self):
+        GradeRecord.objects.create(student=self.student, material=self.materials[0], semester='1', year='2024',
+                                   grade=80)
+        record = GradeRecord.objects.only('id', 'semester').get()
+        record.semester = '2'
+        record.save()
+
+        self.assertEqual(
+            _gpa_rows(),
+            {(self.student.pk, '1', '2024'): (0, 0, 0), (self.student.pk, '2', '2024'): (160, 2, 1)},
+        )
+
+    def test_stored_gpas_match_service(self):
+        for m, grade in zip(self.materials, (55, 75, 95)):
+            GradeRecord.objects.create(student=self.student, material=m, semester='1', year='2024', grade=grade)
+        GradeRecord.objects.filter(student=self.student).update(semester_gpa=None, cumulative_gpa=None)
+
+        gpa.refresh_stored_gpas(student_ids=[self.student.pk])
+        semester_gpa, cumulative_gpa = gpa.student_gpas(self.student.pk, '1', '2024')
+        for record in GradeRecord.objects.filter(student=self.student):
+            self.assertEqual(record.semester_gpa, semester_gpa)
+            self.assertEqual(record.cumulative_gpa, cumulative_gpa)
+
+
+class SubmitGradesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        cls.enrollments = [
+            Enrollment.objects.create(
+                student=cls.student, semester='1', year='2024',
+                material=Material.objects.create(code=f'CS{i}', name=f"مادة {i}", hours=3, section=section),
+            )
+            for i in range(3)
+        ]
+
+    def test_invalid_grade_saves_nothing(self):
+        first, second, third = self.enrollments
+        with self.assertRaises(grading.GradeValidationError) as ctx:
+            grading.submit_grades(self.student, {first.id: '80', second.id: '120', third.id: 'abc'})
+        self.assertEqual(set(ctx.exception.errors), {second.id, third.id})
+        self.assertFalse(GradeRecord.objects.exists())
+        self.assertFalse(Enrollment.objects.filter(grade__isnull=False).exists())
+
+    def test_grades_are_upserted_and_cleared(self):
+        first, second, _ = self.enrollments
+        self.assertEqual(grading.submit_grades(self.student, {first.id: '80', second.id: ' 60 '}), 2)
+        self.assertEqual(grading.submit_grades(self.student, {first.id: '90'}), 1)
+        self.assertEqual(
+            dict(GradeRecord.objects.values_list('material_id', 'grade')),
+            {first.material_id: 90, second.material_id: 60},
+        )
+        self.assertEqual(gpa.student_gpas(self.student.pk, '1', '2024'), (75.0, 75.0))
+
+        grading.submit_grades(self.student, {first.id: '', second.id: '60'}, clear_blank=True)
+        self.assertEqual(list(GradeRecord.objects.values_list('material_id', flat=True)), [second.material_id])
+        self.assertIsNone(Enrollment.objects.get(pk=first.pk).grade)
+        record = GradeRecord.objects.get()
+        self.assertEqual((record.semester_gpa, record.cumulative_gpa), (60.0, 60.0))
+
+    def test_enrollment_without_term_is_not_duplicated(self):
+        """ON CONFLICT لا يطابق NULL: الحفظ مرتين بلا سمستر يبقى سجلًا وصف معدل واحدًا"""
+        enrollment = self.enrollments[0]
+        Enrollment.objects.filter(pk=enrollment.pk).update(semester=None)
+        grading.submit_grades(self.student, {enrollment.id: '70'})
+        grading.submit_grades(self.student, {enrollment.id: '80'})
+
+        self.assertEqual(list(GradeRecord.objects.values_list('semester', 'grade')), [(None, 80)])
+        self.assertEqual(_gpa_rows(), {(self.student.pk, None, '2024'): (240, 3, 1)})
+        record = GradeRecord.objects.get()
+        self.assertEqual((record.semester_gpa, record.cumulative_gpa), (80.0, 80.0))
+
+    def test_legacy_grade_without_record_is_shown(self):
+        """درجة قديمة في Enrollment.grade فقط تظهر في صفحة الطالب ولا تُمسح عند الحفظ"""
+        first = self.enrollments[0]
+        Enrollment.objects.filter(pk=first.pk).update(grade=77)
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(reverse('student_detail', args=[self.student.pk]))
+        self.assertContains(response, f'name="grade_{first.id}" value="77.0"')
+
+    def test_backfill_migration_refreshes_stored_gpas(self):
+        first, second, _ = self.enrollments
+        grading.submit_grades(self.student, {first.id: '80'})
+        Enrollment.objects.filter(pk=second.pk).update(grade=60)
+        cache.set(gpa.VERSION_KEY, 5, None)
+
+        backfill = import_module('courses.migrations.0017_backfill_grade_records')
+        with self.captureOnCommitCallbacks(execute=True):
+            backfill.backfill_grade_records(django_apps, None)
+
+        self.assertEqual(
+            set(GradeRecord.objects.values_list('material_id', 'grade', 'semester_gpa', 'cumulative_gpa')),
+            {(first.material_id, 80, 70.0, 70.0), (second.material_id, 60, 70.0, 70.0)},
+        )
+        self.assertEqual(_gpa_rows(), {(self.student.pk, '1', '2024'): (420, 6, 2)})
+        self.assertEqual(cache.get(gpa.VERSION_KEY), 6)
+
+
+class GradeImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        Material.objects.create(code='CS1', name="برمجة", hours=3, section=section)
+        Material.objects.create(code='CS2', name="شبكات", hours=2, section=section)
+
+    def csv_file(self, encoding, rows):
+        lines = ['id_student,code,semester,year,grade'] + [','.join(map(str, row)) for row in rows]
+        return io.BytesIO(('\r\n'.join(lines) + '\r\n').encode(encoding))
+
+    def test_valid_rows_are_saved_and_bad_rows_reported(self):
+        f = self.csv_file('utf-8-sig', [
+            (self.student.pk, 'CS1', 'الأول', 2024, 80),
+            (self.student.pk, 'CS2', 'الأول', 2024, 50),
+            (self.student.pk, 'XX9', 'الأول', 2024, 70),
+            (999999, 'CS1', 'الأول', 2024, 70),
+        ])
+        report = grade_import.import_grades(f, 'grades.csv', chunk_size=1)
+        self.assertEqual((report.total_rows, report.imported, report.error_count), (4, 2, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertEqual(gpa.student_gpas(self.student.pk, 'الأول', '2024'), (68.0, 68.0))
+        self.assertEqual(Enrollment.objects.filter(grade__isnull=False).count(), 2)
+
+    def test_cp1256_file_from_excel(self):
+        f = self.csv_file('cp1256', [(self.student.pk, 'CS1', 'الأول', 2024, 90)])
+        report = grade_import.import_grades(f, 'grades.csv')
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(list(GradeRecord.objects.values_list('semester', flat=True)), ['الأول'])
+
+    def test_missing_columns_rejected(self):
+        with self.assertRaises(grade_import.GradeImportError):
+            grade_import.import_grades(io.BytesIO(b'id_student,grade\r\n1,50\r\n'), 'grades.csv')
+
+    def test_corrupt_xlsx_rejected_without_saving(self):
+        with self.assertRaises(grade_import.GradeImportError):
+            grade_import.import_grades(io.BytesIO(b'PK\x03\x04 not a workbook'), 'grades.xlsx')
+        self.assertFalse(GradeRecord.objects.exists())
+
+    def test_upload_page_reports_errors_instead_of_failing(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        upload = SimpleUploadedFile('grades.csv', self.csv_file('cp1256', [
+            (self.student.pk, 'CS1', 'الأول', 2024, 75),
+        ]).getvalue())
+        response = self.client.post(reverse('import_grades'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report'].imported, 1)
+
+        response = self.client.post(reverse('import_grades'), {
+            'file': SimpleUploadedFile('grades.xlsx', b'not a zip file'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['error'])
+
+
+class MaterialSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Material.objects.create(code='MATH101', name="تفاضل", hours=3)
+        Material.objects.create(code='CS101', name="Discrete math", hours=3)
+        Material.objects.create(code='CS102', name="الإحصاء", hours=3)
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def codes(self, **params):
+        response = self.client.get(reverse('materials_page'), params)
+        return sorted(m.code for m in response.context['materials'])
+
+    def test_code_filter_matches_code_prefix_only(self):
+        self.assertEqual(self.codes(code='math'), ['MATH101'])
+        self.assertEqual(self.codes(code='cs'), ['CS101', 'CS102'])
+        self.assertEqual(self.codes(code='101'), [])
+
+    def test_name_filter_is_normalized(self):
+        self.assertEqual(self.codes(name='الاحصاء'), ['CS102'])
+
+
+class KeysetPaginationTests(TestCase):
+    ordering = ['-created_at', 'id_student']
+
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        for i in range(7):
+            Student.objects.create(name=f"طالب {i}", section=section, email=f's{i}@example.com', password='-')
+
+    def test_pages_cover_all_rows_in_order(self):
+        expected = list(Student.objects.order_by(*self.ordering).values_list('pk', flat=True))
+        seen, pages = [], []
+        page = keyset_page(Student.objects.all(), self.ordering, 3)
+        while True:
+            pages.append(page)
+            seen += [s.pk for s in page]
+            if not page.has_next:
+                break
+            page = keyset_page(Student.objects.all(), self.ordering, 3, after=page.next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous)
+
+        back = keyset_page(Student.objects.all(), self.ordering, 3, before=pages[2].prev_cursor)
+        self.assertEqual([s.pk for s in back], [s.pk for s in pages[1]])
+
+    def test_tampered_cursor_returns_first_page(self):
+        first = [s.pk for s in keyset_page(Student.objects.all(), self.ordering, 3)]
+        for cursor in ('not-a-cursor', encode_cursor(['yesterday', 'x']), encode_cursor([1])):
+            with self.subTest(cursor=cursor):
+                page = keyset_page(Student.objects.all(), self.ordering, 3, after=cursor)
+                self.assertEqual([s.pk for s in page], first)
+                self.assertFalse(page.has_previous)
+
+
+class PrerequisiteClosureTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a, cls.b, cls.c = [
+            Material.objects.create(code=code, name=code, hours=3) for code in ('A', 'B', 'C')
+        ]
+        MaterialPrerequisite.objects.create(material=cls.b, prerequisite=cls.a)
+        MaterialPrerequisite.objects.create(material=cls.c, prerequisite=cls.b)
+
+    def test_closure_is_transitive(self):
+        self.assertEqual(
+            set(MaterialPrerequisiteClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')),
+            {(self.a.id, self.b.id, 1), (self.b.id, self.c.id, 1), (self.a.id, self.c.id, 2)},
+        )
+
+    def test_cycles_are_rejected(self):
+        for material, prerequisite in ((self.a, self.c), (self.a, self.b), (self.a, self.a)):
+            with self.subTest(material=material.code, prerequisite=prerequisite.code):
+                with self.assertRaises(ValidationError):
+                    check_no_cycle(material.id, prerequisite.id)
+                with self.assertRaises(ValidationError):
+                    MaterialPrerequisite.objects.create(material=material, prerequisite=prerequisite)
+        self.assertEqual(MaterialPrerequisite.objects.count(), 2)
+
+
+class EnrollMaterialsTests(TestCase):
+    today = date(2025, 2, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        cls.materials = [
+            Material.objects.create(code=f'CS{i}', name=f"مادة {i}", hours=3, section=section) for i in range(3)
+        ]
+        MaterialPrerequisite.objects.create(material=cls.materials[2], prerequisite=cls.materials[0])
+
+    def enroll(self, materials):
+        return enrollment.enroll_materials(self.student, [m.id for m in materials] + ['x', 999999], today=self.today)
+
+    def test_enrolls_and_reports_existing_blocked_and_unknown(self):
+        first, second, third = self.materials
+        result = self.enroll([first, third])
+        self.assertEqual((result.enrolled, result.unknown), ([first], [999999]))
+        self.assertEqual(result.blocked, {third.id: [first.id]})
+
+        result = self.enroll([first, second])
+        self.assertEqual((result.enrolled, result.already_enrolled), ([second], [first]))
+        self.assertEqual(Enrollment.objects.count(), 2)
+
+    def test_concurrent_insert_is_reported_as_already_enrolled(self):
+        """مادة نزّلها طلب آخر بين الفحص والإدخال لا تُعد ضمن ما نُزّل الآن"""
+        first, second, _ = self.materials
+        create = Enrollment.objects.create
+
+        def racing_create(**kwargs):
+            if kwargs['material'] == first:
+                Enrollment.objects.bulk_create([Enrollment(**kwargs)])
+            return create(**kwargs)
+
+        with mock.patch.object(Enrollment.objects, 'create', side_effect=racing_create):
+            result = self.enroll([first, second])
+        self.assertEqual((result.enrolled, result.already_enrolled), ([second], [first]))
+        self.assertTrue(Enrollment.objects.filter(material=second).exists())
+
+
+class SeatCapacityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.students = [
+            Student.objects.create(name=f"طالب {i}", section=section, email=f's{i}@example.com', password='-')
+            for i in range(3)
+        ]
+        material = Material.objects.create(code='CS1', name="برمجة", hours=3, section=section)
+        cls.group = LectureGroup.objects.create(material=material, group='1', capacity=2)
+
+    def reserve(self, student):
+        return registration.reserve_seat(student, self.group, enforce_window=False, today=date(2025, 2, 1))
+
+    def test_full_group_goes_to_waitlist_and_promotes_on_release(self):
+        first, second, third = self.students
+        self.assertEqual(self.reserve(first).status, registration.ENROLLED)
+        self.assertEqual(self.reserve(second).status, registration.ENROLLED)
+        self.assertEqual(self.reserve(first).status, registration.ALREADY_ENROLLED)
+        waitlisted = self.reserve(third)
+        self.assertEqual((waitlisted.status, waitlisted.waitlist_position), (registration.WAITLISTED, 1))
+
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.seats_taken, 2)
+        self.assertEqual(Enrollment.objects.count(), 2)
+
+        promoted = registration.release_seat(Enrollment.objects.get(student=first))
+        self.assertEqual(promoted.student_id, third.pk)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.seats_taken, 2)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_deleting_enrollment_elsewhere_frees_the_seat(self):
+        first, second, third = self.students
+        self.reserve(first)
+        self.reserve(second)
+        self.reserve(third)
+
+        # من لوحة الإدارة: المقعد ينتقل لأول طالب في الانتظار بعد الـ commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.get(student=first).delete()
+        self.assertTrue(Enrollment.objects.filter(student=third).exists())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.seats_taken, 2)
+
+        # delete على queryset وحذف الطالب نفسه بلا انتظار: العداد ينقص
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(student=second).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.get(pk=third.pk).delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.seats_taken, 0)
+
+    def test_reconcile_recomputes_seats_taken(self):
+        self.reserve(self.students[0])
+        LectureGroup.objects.filter(pk=self.group.pk).update(seats_taken=2)
+        changed = registration.reconcile_seats('2/2025', '2025')
+        self.assertEqual([(old, new) for _, old, new in changed], [(2, 1)])
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.seats_taken, 1)
+
+    def test_closed_window_rejects(self):
+        with self.assertRaises(registration.RegistrationClosed):
+            registration.reserve_seat(self.students[0], self.group)
+
+
+class ClashDetectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.math = Material.objects.create(code='M1', name="رياضيات", hours=3, section=section)
+        cls.physics = Material.objects.create(code='P1', name="فيزياء", hours=3, section=section)
+        Lecture.objects.create(material=cls.math, group='1', room='R1', day=1, time=0)
+
+    def test_room_and_group_clashes(self):
+        conflicts, free = clashes.check_lecture(self.physics, '1', 'R1', 1, 0)
+        self.assertEqual({c['type'] for c in conflicts}, {clashes.ROOM, clashes.GROUP})
+        self.assertNotIn((1, 0), free)
+        self.assertEqual(len(free), clashes.SLOT_COUNT - 1)
+
+        self.assertEqual(clashes.check_lecture(self.physics, '2', 'R2', 1, 0), ([], []))
+
+        Lecture.objects.create(material=self.physics, group='2', room='R1', day=1, time=0)
+        Lecture.objects.create(material=self.physics, group='1', room='R2', day=2, time=1)
+        count, conflicts = clashes.validate_timetable()
+        self.assertEqual(count, 3)
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual((conflicts[0]['type'], conflicts[0]['room']), (clashes.ROOM, 'R1'))
+
+    def test_materials_without_section_only_clash_on_room(self):
+        first = Material.objects.create(code='X1', name="اختيارية 1", hours=3)
+        second = Material.objects.create(code='X2', name="اختيارية 2", hours=3)
+        Lecture.objects.create(material=first, group='1', room='R5', day=3, time=2)
+
+        self.assertEqual(clashes.check_lecture(second, '1', 'R6', 3, 2), ([], []))
+        Lecture.objects.create(material=second, group='1', room='R6', day=3, time=2)
+        conflicts, _ = clashes.check_lecture(second, '1', 'R5', 3, 2, exclude_id=None)
+        self.assertEqual([c['type'] for c in conflicts], [clashes.ROOM])
+        self.assertEqual(clashes.validate_timetable()[1], [])
+
+    def test_validate_view_requires_staff(self):
+        user = get_user_model().objects.create_user('student', password='pw')
+        self.client.force_login(user)
+        response = self.client.get(reverse('validate_timetable'))
+        self.assertEqual(response.status_code, 403)
+
+
+class SchedulingTests(TestCase):
+    today = date(2025, 2, 1)
+
+    def test_small_problem_is_solved_without_clashes(self):
+        sessions = [
+            scheduling.Session(material_id, group, 30, (1, group))
+            for material_id in (1, 2, 3) for group in ('1', '2') for _ in range(2)
+        ]
+        problem = scheduling.make_problem(sessions, [('R1', 40), ('R2', 40)], shared_pairs=[((1, '1'), (2, '2'))])
+        solution = scheduling.solve(problem, restarts=2, time_limit=5)
+        self.assertTrue(solution.feasible)
+        self.assertEqual(scheduling.evaluate(problem, solution.slots, solution.rooms)[0], 0)
+
+        rows = scheduling.assignments(problem, solution)
+        self.assertEqual(len({(r['room'], r['day'], r['time']) for r in rows}), len(rows))
+        shared = [(r['day'], r['time']) for r in rows if (r['material_id'], r['group']) in ((1, '1'), (2, '2'))]
+        self.assertEqual(len(set(shared)), len(shared))
+
+    def test_infeasible_inputs(self):
+        with self.assertRaises(scheduling.SchedulingError):
+            scheduling.make_problem([scheduling.Session(1, '1', 90, (1, '1'))], [('R1', 40)])
+        # مجموعة واحدة تحتاج خانات أكثر من الأسبوع كله
+        sessions = [scheduling.Session(1, '1', 10, (1, '1'))] * (clashes.SLOT_COUNT + 1)
+        solution = scheduling.solve(scheduling.make_problem(sessions, [('R1', None), ('R2', None)]), time_limit=1)
+        self.assertFalse(solution.feasible)
+
+    def test_build_and_apply_from_database(self):
+        section = Section.objects.create(id=1, name="حاسوب")
+        student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        semester, year = enrollment.current_term(self.today)
+        materials = [
+            Material.objects.create(code='CS1', name="برمجة", hours=4, section=section),
+            Material.objects.create(code='X1', name="اختيارية 1", hours=2),
+            Material.objects.create(code='X2', name="اختيارية 2", hours=2),
+        ]
+        for material in materials:
+            Enrollment.objects.create(student=student, material=material, semester=semester, year=year)
+
+        problem = scheduling.build_problem(rooms=[('R1', 10), ('R2', 10)], semester=semester, year=year)
+        self.assertEqual(len(problem.sessions), 4)
+        # المادتان بلا قسم لا تتعارضان بسبب اسم المجموعة، بل لأن نفس الطالب نزّلهما
+        x1, x2 = [i for i, s in enumerate(problem.sessions) if s.material_id in (materials[1].id, materials[2].id)]
+        self.assertNotEqual(problem.sessions[x1].cohort, problem.sessions[x2].cohort)
+        self.assertIn(x2, problem.conflicts[x1])
+
+        solution = scheduling.solve(problem, time_limit=5)
+        self.assertTrue(solution.feasible)
+        self.assertEqual(scheduling.apply_solution(problem, solution), 4)
+        self.assertEqual(clashes.validate_timetable(), (4, []))
+
+
+class StudentTimetableTests(TestCase):
+    semester, year = '2/2025', '2025'
+
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(id=1, name="حاسوب")
+        cls.student = Student.objects.create(name="طالب", section=section, email='s@example.com', password='-')
+        cls.other = Student.objects.create(name="طالب 2", section=section, email='t@example.com', password='-')
+        cls.math, cls.physics, cls.lab, cls.draft = [
+            Material.objects.create(code=code, name=code, hours=3, section=section)
+            for code in ('MATH', 'PHYS', 'LAB', 'DRAFT')
+        ]
+        Lecture.objects.create(material=cls.math, group='1', room='R1', day=1, time=0)
+        Lecture.objects.create(material=cls.math, group='2', room='R1', day=2, time=0)
+        Lecture.objects.create(material=cls.physics, group='1', room='R2', day=1, time=0)
+        Lecture.objects.create(material=cls.lab, group='1', room='R3', day=1, time=1)
+        Lecture.objects.create(material=cls.lab, group='2', room='R3', day=1, time=2)
+
+        def enroll(student, material, group):
+            Enrollment.objects.create(student=student, material=material, semester=cls.semester, year=cls.year,
+                                      group=group)
+
+        enroll(cls.student, cls.math, '1')
+        enroll(cls.student, cls.physics, None)   # المجموعة الوحيدة للمادة
+        enroll(cls.student, cls.lab, None)       # مجموعتان: غير محددة
+        enroll(cls.student, cls.draft, None)     # بلا محاضرات
+        enroll(cls.other, cls.math, '2')
+        enroll(cls.other, cls.physics, '1')
+
+    def test_student_conflicts(self):
+        result = student_timetable.student_timetable(self.student, self.semester, self.year)
+        self.assertEqual(len(result.conflicts), 1)
+        conflict = result.conflicts[0]
+        self.assertEqual((conflict['day'], conflict['time']), (1, 0))
+        self.assertEqual({m['material_id'] for m in conflict['materials']}, {self.math.id, self.physics.id})
+        self.assertEqual(result.unresolved, [self.lab])
+        self.assertEqual(result.unscheduled, [self.draft])
+
+        other = student_timetable.student_timetable(self.other, self.semester, self.year)
+        self.assertEqual(other.conflicts, [])
+
+    def test_section_report_matches_per_student(self):
+        report = student_timetable.section_conflict_report(1, self.semester, self.year)
+        self.assertEqual((report['students'], report['enrolled'], report['with_conflicts']), (2, 2, 1))
+        row = report['report'][0]
+        self.assertEqual(row['student_id'], self.student.pk)
+        self.assertEqual(
+            row['conflicts'],
+            student_timetable.student_timetable(self.student, self.semester, self.year).conflicts,
+        )
+
+
+class ReportRefreshTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.section = Section.objects.create(id=1, name="حاسوب")
+        cls.students = [
+            Student.objects.create(name=f"طالب {i}", section=cls.section, email=f's{i}@example.com', password='-')
+            for i in range(3)
+        ]
+        cls.math = Material.objects.create(code='MATH', name="رياضيات", hours=3, section=cls.section)
+        cls.physics = Material.objects.create(code='PHYS', name="فيزياء", hours=2, section=cls.section)
+        for student, math, physics in zip(cls.students, (90, 40, None), (70, 60, 55)):
+            for material, grade in ((cls.math, math), (cls.physics, physics)):
+                Enrollment.objects.create(student=student, material=material, semester='1', year='2024')
+                if grade is not None:
+                    GradeRecord.objects.create(student=student, material=material, semester='1', year='2024',
+                                               grade=grade)
+
+    def test_refresh_builds_report_tables(self):
+        self.assertTrue(reports.is_stale(60))
+        refresh = reports.refresh_reports()
+        self.assertFalse(reports.is_stale(60))
+        self.assertEqual(reports.last_refresh(), refresh)
+
+        math = MaterialTermReport.objects.get(material=self.math)
+        self.assertEqual((math.enrolled_count, math.graded_count, math.passed_count, math.grade_sum), (3, 2, 1, 130))
+
+        section = SectionTermReport.objects.get(section=self.section, semester='1', year='2024')
+        self.assertEqual(
+            (section.students_count, section.enrollments_count, section.graded_count, section.passed_count),
+            (3, 6, 5, 4),
+        )
+        self.assertEqual(section.gpa_count, 3)
+        self.assertAlmostEqual(section.gpa_sum, (90 * 3 + 70 * 2) / 5 + (40 * 3 + 60 * 2) / 5 + 55)
+        self.assertEqual(
+            dict(GPADistributionReport.objects.values_list('bucket', 'students_count')), {40: 1, 50: 1, 80: 1},
+        )
+        self.assertEqual(
+            refresh.rows,
+            MaterialTermReport.objects.count() + SectionTermReport.objects.count()
+            + GPADistributionReport.objects.count(),
+        )
+        self.assertEqual(reports.available_terms(), [('2024', '1')])
+
+    def test_refresh_replaces_previous_rows(self):
+        reports.refresh_reports()
+        GradeRecord.objects.filter(student=self.students[2]).delete()
+        Enrollment.objects.filter(student=self.students[2]).delete()
+        reports.refresh_reports()
+
+        self.assertEqual(MaterialTermReport.objects.get(material=self.physics).enrolled_count, 2)
+        section = SectionTermReport.objects.get(section=self.section)
+        self.assertEqual((section.students_count, section.gpa_count), (2, 2))
+        self.assertEqual(dict(GPADistributionReport.objects.values_list('bucket', 'students_count')), {40: 1, 80: 1})
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(SeedConfig(sections=2, students=20, materials=6, terms=2, per_term=2, capacity=50))
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def test_csv_is_streamed_row_by_row(self):
+        rows = iter([(1, "أحمد"), (2, 'a,"b"')])
+        lines = exports.iter_csv(['id', 'name'], rows)
+        self.assertEqual(next(lines), '\ufeffid,name\r\n')
+        self.assertEqual(next(rows, None), (1, "أحمد"))   # الصفوف تُقرأ عند الطلب فقط
+        self.assertEqual(list(lines), ['2,"a,""b"""\r\n'])
+
+    def test_xlsx_is_streamed_in_chunks(self):
+        rows = [(i, f"صف {i}", None) for i in range(25)] + [(25, 'x\x01<&>', 1.5)]
+        chunks = list(exports.iter_xlsx(['id', 'name', 'grade'], rows, rows_per_chunk=10))
+        self.assertGreater(len(chunks), 2)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 27)
+        self.assertIn('<t xml:space="preserve">x&lt;&amp;&gt;</t>', sheet)
+        self.assertIn('<c t="n"><v>1.5</v></c>', sheet)
+
+    def test_export_view_streams_transcripts(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_records', args=['transcripts']), {'section': 1})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transcripts_1.csv"')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(','), transcripts.TRANSCRIPT_HEADER)
+        self.assertEqual(len(lines) - 1, GradeRecord.objects.filter(student__section_id=1).count())
+
+        response = self.client.get(reverse('export_records', args=['enrollments']), {'format': 'xlsx'})
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            archive.read('xl/worksheets/sheet1.xml').decode().count('<row>'), Enrollment.objects.count() + 1,
+        )
+
+    def test_export_view_requires_staff(self):
+        self.client.force_login(get_user_model().objects.create_user('student', password='pw'))
+        response = self.client.get(reverse('export_records', args=['transcripts']))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('export_records', args=['unknown'])).status_code, 404)
+
+
+class MetricsTests(TestCase):
+    DEAD_PID = 4194305   # أكبر من أقصى pid في لينكس
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_process_files_are_aggregated(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, f'{self.DEAD_PID}.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'pid': self.DEAD_PID,
+                    'counters': [['grades_written_total', [['source', 'import']], 4]],
+                    'histograms': [['db_queries_per_request', [['view', 'v']], [1] + [0] * 9 + [1.0]]],
+                    'gauges': [['db_connections_open', [['alias', 'old']], 1]],
+                }, f)
+            metrics.inc('grades_written_total', {'source': 'import'}, 2)
+            metrics.observe('db_queries_per_request', 3, {'view': 'v'})
+            text = metrics.render()
+
+        self.assertIn('# TYPE grades_written_total counter', text)
+        self.assertIn('grades_written_total{source="import"} 6', text)
+        self.assertIn('db_queries_per_request_bucket{view="v",le="1"} 1', text)
+        self.assertIn('db_queries_per_request_bucket{view="v",le="5"} 2', text)
+        self.assertIn('db_queries_per_request_count{view="v"} 2', text)
+        self.assertIn('db_queries_per_request_sum{view="v"} 4', text)
+        # gauges العمليات المنتهية لا تُجمع
+        self.assertIn('db_connections_open{alias="default"}', text)
+        self.assertNotIn('alias="old"', text)
+
+    def test_cache_counter_survives_stats_reset(self):
+        reference.sections()
+        reference.sections()
+        reference.reset_stats()
+        reference.sections()
+        text = metrics.render()
+        self.assertIn('cache_requests_total{cache="reference",name="sections",result="hits"} 2', text)
+        self.assertIn('cache_requests_total{cache="reference",name="sections",result="misses"} 1', text)
+
+    def test_access(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.9').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+
+@override_settings(STATEMENT_TIMEOUTS={'default': 5000, 'reporting': 60000, 'bulk': 0})
+class StatementTimeoutTests(TestCase):
+    """على SQLite نتظاهر بأن الاتصال Postgres ونراقب ضبط المهلة وإرجاعها"""
+    reset_for_real = staticmethod(database._reset_timeout)
+
+    def setUp(self):
+        self.connection = connections['default']
+        self.connection.ensure_connection()
+        patchers = [
+            mock.patch.object(self.connection, 'vendor', 'postgresql'),
+            mock.patch.object(database, '_set_timeout'),
+            mock.patch.object(database, '_reset_timeout'),
+        ]
+        _, self.set_timeout, self.reset_timeout = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def _view(self, response):
+        return database.statement_timeout('reporting')(lambda request: response)
+
+    def test_view_timeout_is_reset_after_response(self):
+        self._view(HttpResponse('ok'))(RequestFactory().get('/'))
+        self.set_timeout.assert_called_once_with(self.connection, 60000)
+        self.reset_timeout.assert_called_once_with(self.connection)
+
+    def test_streaming_view_keeps_timeout_until_closed(self):
+        response = self._view(StreamingHttpResponse(iter(['a', 'b'])))(RequestFactory().get('/'))
+        self.reset_timeout.assert_not_called()
+        list(response.streaming_content)
+        response.close()
+        self.reset_timeout.assert_called_once_with(self.connection)
+
+    def test_view_timeout_is_reset_on_error(self):
+        def view(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            database.statement_timeout('reporting')(view)(RequestFactory().get('/'))
+        self.reset_timeout.assert_called_once_with(self.connection)
+
+    def test_command_timeout_covers_new_connections(self):
+        with database.command_timeout():
+            self.set_timeout.assert_called_once_with(self.connection, 0)
+            connection_created.send(sender=type(self.connection), connection=self.connection)
+            self.assertEqual(self.set_timeout.call_count, 2)
+        self.reset_timeout.assert_called_once_with(self.connection)
+
+        connection_created.send(sender=type(self.connection), connection=self.connection)
+        self.assertEqual(self.set_timeout.call_count, 2)
+
+    def test_failed_reset_closes_connection(self):
+        broken = mock.Mock()
+        broken.cursor.side_effect = DatabaseError
+        self.reset_for_real(broken)
+        broken.close.assert_called_once_with()
+
+
+@override_settings(REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    """بدون قاعدة replica حقيقية: نعرّفها في replica_alias ونسجل قرار الموجّه داخل الصفحة"""
+
+    def setUp(self):
+        patcher = mock.patch.object(routing, 'replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routing.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _read_alias_in_view(self, request):
+        seen = []
+
+        @routing.read_from_replica
+        def view(request):
+            seen.append(self.router.db_for_read(Material))
+            with routing.primary():
+                seen.append(self.router.db_for_read(Material))
+            return HttpResponse()
+
+        view(request)
+        return seen
+
+    def test_get_reads_from_replica_except_cached_reads(self):
+        self.assertEqual(self._read_alias_in_view(self.factory.get('/')), ['replica', None])
+        self.assertIsNone(self.router.db_for_read(Material))
+        self.assertEqual(self.router.db_for_write(Material), 'default')
+
+    def test_writes_and_sticky_requests_stay_on_primary(self):
+        self.assertEqual(self._read_alias_in_view(self.factory.post('/')), [None, None])
+        request = self.factory.get('/')
+        request.db_sticky = True
+        self.assertEqual(self._read_alias_in_view(request), [None, None])
+
+    def test_streaming_chunks_read_from_replica(self):
+        def chunks():
+            for _ in range(2):
+                yield self.router.db_for_read(Material) or 'default'
+
+        @routing.read_from_replica
+        def view(request):
+            return StreamingHttpResponse(chunks())
+
+        response = view(self.factory.get('/'))
+        self.assertEqual(b''.join(response.streaming_content), b'replicareplica')
+        self.assertIsNone(self.router.db_for_read(Material))
+
+    def test_stickiness_cookie_after_write(self):
+        middleware = routing.ReplicaStickinessMiddleware(lambda request: HttpResponse())
+        response = middleware(self.factory.post('/'))
+        cookie = response.cookies[routing.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertAlmostEqual(float(cookie.value), time.time() + 5, delta=2)
+        self.assertNotIn(routing.STICKY_COOKIE, middleware(self.factory.get('/')).cookies)
+
+        for value, sticky in ((cookie.value, True), (f"{time.time() - 1:.0f}", False), ('x', False)):
+            request = self.factory.get('/')
+            request.COOKIES[routing.STICKY_COOKIE] = value
+            middleware(request)
+            self.assertEqual(request.db_sticky, sticky, value)
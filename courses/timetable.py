@@ -0,0 +1,82 @@
+"""
+جدول المحاضرات الأسبوعي
+
+نبني الجدول مرة واحدة كمصفوفة (5 أوقات × 6 أيام) من قوائم المحاضرات بمرور واحد على
+المحاضرات، بدل أن يمر القالب على كل المحاضرات داخل كل خانة. الجدول المرسوم (HTML) يُخزّن
+في الكاش لكل فلتر، ومفتاحه يتضمن إصدارات المحاضرات والمواد والأقسام من page_cache (الجدول
+يعرض اسم المادة ويفلتر بقسمها)، فيتغير بعد أي حفظ أو حذف في كل العمليات (workers).
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from courses import page_cache
+from courses.models import Lecture, Material, Section
+
+DAYS = [value for value, _ in Lecture._meta.get_field('day').choices]
+TIME_SLOTS = [value for value, _ in Lecture._meta.get_field('time').choices]
+TIME_LABELS = dict(Lecture._meta.get_field('time').choices)
+DAY_LABELS = dict(Lecture._meta.get_field('day').choices)
+
+COLORS = ["#ef4444", "#3b82f6", "#10b981", "#f59e0b", "#6366f1", "#06b6d4", "#8b5cf6"]
+
+GRID_CACHE_TIMEOUT = 60 * 60
+
+
+def filter_lectures(section=None, room=None, group=None):
+    lectures = Lecture.objects.select_related('material')
+    if section:
+        lectures = lectures.filter(material__section_id=section)
+    if room:
+        lectures = lectures.filter(room=room)
+    if group:
+        lectures = lectures.filter(group=group)
+    return lectures
+
+
+def build_grid(lectures):
+    """
+    ترجع قائمة صفوف، كل صف: {'time', 'label', 'cells'} و cells قائمة بطول الأيام
+    كل عنصر فيها قائمة محاضرات تلك الخانة.
+    """
+    day_index = {day: i for i, day in enumerate(DAYS)}
+    time_index = {time: i for i, time in enumerate(TIME_SLOTS)}
+    cells = [[[] for _ in DAYS] for _ in TIME_SLOTS]
+
+    for lecture in lectures:
+        row = time_index.get(lecture.time)
+        col = day_index.get(lecture.day)
+        if row is None or col is None:
+            continue
+        # لون ثابت لكل مادة بدل لون عشوائي في كل عرض
+        lecture.color = COLORS[lecture.material_id % len(COLORS)]
+        cells[row][col].append(lecture)
+
+    return [
+        {'time': time, 'label': TIME_LABELS[time], 'cells': cells[i]}
+        for i, time in enumerate(TIME_SLOTS)
+    ]
+
+
+def data_version():
+    """نسخة بيانات الجدول من الكاش بدون استعلام: تتغير مع أي تعديل في المحاضرات أو المواد أو الأقسام"""
+    return page_cache.version(Lecture, Material, Section)
+
+
+def _cache_key(version, filters):
+    raw = json.dumps([version, filters], sort_keys=True, ensure_ascii=False)
+    return 'timetable:grid:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_grid_html(section=None, room=None, group=None):
+    """HTML جدول المحاضرات للفلتر المعطى، من الكاش إن وُجد"""
+    filters = {'section': section or '', 'room': room or '', 'group': group or ''}
+    key = _cache_key(data_version(), filters)
+    html = cache.get(key)
+    if html is None:
+        grid = build_grid(filter_lectures(section, room, group))
+        html = render_to_string('timetable_grid.html', {'grid': grid, 'day_labels': [DAY_LABELS[d] for d in DAYS]})
+        cache.set(key, html, GRID_CACHE_TIMEOUT)
+    return html
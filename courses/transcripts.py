@@ -0,0 +1,78 @@
+"""
+كشوف الدرجات وقوائم التنزيل لقسم أو سنة كاملة
+
+الصفوف تُقرأ بـ iterator على دفعات مرتبة حسب الطالب، ونجمع صفوف طالب واحد فقط في الذاكرة
+لحساب معدل كل سمستر والمعدل التراكمي (بنفس معادلة gpa.from_totals) ثم نخرجها.
+"""
+from courses import gpa
+from courses.models import Enrollment, GradeRecord
+
+CHUNK_SIZE = 2000
+
+TRANSCRIPT_HEADER = [
+    'رقم القيد', 'الاسم', 'القسم', 'السنة', 'السمستر', 'رمز المادة', 'المادة', 'الساعات', 'الدرجة',
+    'معدل السمستر', 'المعدل التراكمي',
+]
+ENROLLMENT_HEADER = ['رقم القيد', 'الاسم', 'القسم', 'السنة', 'السمستر', 'رمز المادة', 'المادة', 'المجموعة', 'تاريخ التنزيل']
+
+
+def _student_rows(rows):
+    """صفوف طالب واحد مع معدل كل سمستر والمعدل التراكمي"""
+    terms = {}
+    for row in rows:
+        grade, hours = row[8], row[7] or 0
+        if grade is not None:
+            points, term_hours = terms.get((row[4], row[3]), (0, 0))
+            terms[(row[4], row[3])] = (points + grade * hours, term_hours + hours)
+    gpas = gpa.from_totals((semester, year, points, hours) for (semester, year), (points, hours) in terms.items())
+    for row in rows:
+        yield row + (gpas.semester(row[4], row[3]), gpas.cumulative)
+
+
+def transcript_rows(section_id=None, year=None, chunk_size=CHUNK_SIZE, student_ids=None):
+    """
+    كشف درجات كامل لكل طالب في القسم، أو لكل طالب له درجات في السنة المعطاة.
+    """
+    records = GradeRecord.objects.all()
+    if student_ids is not None:
+        records = records.filter(student_id__in=student_ids)
+    if section_id:
+        records = records.filter(student__section_id=section_id)
+    if year:
+        records = records.filter(student_id__in=GradeRecord.objects.filter(year=year).values('student_id'))
+
+    records = records.order_by('student_id', 'year', 'semester', 'material__code').values_list(
+        'student_id', 'student__name', 'student__section__name', 'year', 'semester',
+        'material__code', 'material__name', 'material__hours', 'grade',
+    )
+
+    current, buffered = None, []
+    for row in records.iterator(chunk_size=chunk_size):
+        if row[0] != current and buffered:
+            yield from _student_rows(buffered)
+            buffered = []
+        current = row[0]
+        buffered.append(row)
+    if buffered:
+        yield from _student_rows(buffered)
+
+
+def enrollment_rows(section_id=None, year=None, chunk_size=CHUNK_SIZE):
+    enrollments = Enrollment.objects.all()
+    if section_id:
+        enrollments = enrollments.filter(student__section_id=section_id)
+    if year:
+        enrollments = enrollments.filter(year=year)
+
+    rows = enrollments.order_by('student_id', 'year', 'semester', 'material__code').values_list(
+        'student_id', 'student__name', 'student__section__name', 'year', 'semester',
+        'material__code', 'material__name', 'group', 'date_registered',
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield row[:-1] + (row[-1].strftime('%Y-%m-%d %H:%M') if row[-1] else '',)
+
+
+EXPORTS = {
+    'transcripts': (TRANSCRIPT_HEADER, transcript_rows),
+    'enrollments': (ENROLLMENT_HEADER, enrollment_rows),
+}
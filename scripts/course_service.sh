@@ -7,7 +7,10 @@ VENV_DIR="$PROJECT_DIR/.venv"
 GUNICORN_BIN="$VENV_DIR/bin/gunicorn"
 SERVICE_FILE="/etc/systemd/system/${SERVICE_NAME}.service"
 LOG_DIR="$PROJECT_DIR/logs"
+METRICS_DIR="/run/${SERVICE_NAME}/metrics"
 WORKERS=4
+# مهلة الطلب في gunicorn؛ أطول الصفحات (توليد الجدول) محدودة بـ 20 ثانية داخل التطبيق
+TIMEOUT=60
 
 usage(){
   cat <<EOF
@@ -43,7 +46,11 @@ User=${owner_user}
 Group=${owner_group}
 WorkingDirectory=${PROJECT_DIR}
 Environment=PATH=${VENV_DIR}/bin
-ExecStart=${GUNICORN_BIN} course_registration.wsgi:application --bind 0.0.0.0:8000 --workers ${WORKERS}
+Environment=METRICS_DIR=${METRICS_DIR}
+RuntimeDirectory=${SERVICE_NAME}
+ExecStartPre=/bin/rm -rf ${METRICS_DIR}
+ExecStartPre=/bin/mkdir -p ${METRICS_DIR}
+ExecStart=${GUNICORN_BIN} course_registration.wsgi:application --bind 0.0.0.0:8000 --workers ${WORKERS} --timeout ${TIMEOUT}
 Restart=always
 RestartSec=3
 